@@ -0,0 +1,149 @@
+"""This module contains a benchmark comparing the former sequential image downloads to the concurrent downloader.
+
+A local HTTP stub serves synthetic images with an artificial latency per response, spread across several loopback
+addresses that act as distinct hosts (CDNs). Both download engines fetch the same links, hence the benchmark needs
+neither a browser nor the data warehouse, e.g.
+
+    python benchmarks/download_benchmark.py --images 2000 --latency-ms 50 --hosts 4
+"""
+import argparse
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import perf_counter, sleep
+from typing import Callable, List
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downloader import ImageDownloader  # noqa: E402
+
+
+def _get_stub_handler(image: bytes, latency_seconds: float) -> type:
+    """Returns a request handler serving the passed image after the passed latency.
+
+    Parameters
+    ----------
+    image: bytes
+        Served image.
+    latency_seconds: float
+        Latency of every response.
+
+    Returns
+    -------
+    handler: type
+        Request handler class.
+    """
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, i.e. reused connections are possible
+
+        def do_GET(self):
+            sleep(latency_seconds)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(image)))
+            self.end_headers()
+            self.wfile.write(image)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def _download_sequentially(links: List[str]) -> int:
+    """Downloads the passed links like the former crawler, i.e. one at a time without session reuse.
+
+    Parameters
+    ----------
+    links: list[str]
+        Image links.
+
+    Returns
+    -------
+    success_count: int
+        Number of downloaded images.
+    """
+    success_count = 0
+    for link in links:
+        response = requests.get(link, stream=True)
+        success_count += 1 if response.raw.read() else 0
+
+    return success_count
+
+
+def _download_concurrently(links: List[str]) -> int:
+    """Downloads the passed links with the concurrent downloader of the crawler.
+
+    Parameters
+    ----------
+    links: list[str]
+        Image links.
+
+    Returns
+    -------
+    success_count: int
+        Number of downloaded images.
+    """
+    with ImageDownloader() as downloader:
+        return sum(1 for _, _, image in downloader.iter_downloads(links) if image)
+
+
+def run_downloads(links: List[str], download: Callable[[List[str]], int]) -> float:
+    """Downloads the passed links with the passed engine.
+
+    Parameters
+    ----------
+    links: list[str]
+        Image links.
+    download: callable
+        Download engine to measure.
+
+    Returns
+    -------
+    duration_seconds: float
+        Duration of all downloads.
+    """
+    start = perf_counter()
+    n_downloaded_images = download(links)
+    duration_seconds = perf_counter() - start
+
+    if n_downloaded_images != len(links):
+        print("Warning: {} of {} images downloaded.".format(n_downloaded_images, len(links)))
+    return duration_seconds
+
+
+def main() -> None:
+    """Runs both download engines against the local HTTP stub and prints a comparison table."""
+    parser = argparse.ArgumentParser(description="Compares the sequential and the concurrent image downloads.")
+    parser.add_argument("--images", type=int, default=2000, help="number of served images")
+    parser.add_argument("--image-bytes", type=int, default=50000, help="size of every served image")
+    parser.add_argument("--latency-ms", type=float, default=50, help="latency of every response")
+    parser.add_argument("--hosts", type=int, default=4, help="number of distinct hosts serving the images")
+    args = parser.parse_args()
+
+    handler = _get_stub_handler(os.urandom(args.image_bytes), args.latency_ms / 1000)
+    servers = [ThreadingHTTPServer(("127.0.0.{}".format(host + 1), 0), handler) for host in range(args.hosts)]
+    for server in servers:
+        Thread(target=server.serve_forever, daemon=True).start()
+    links = [
+        "http://{}:{}/{}.jpg".format(*servers[index % len(servers)].server_address, index)
+        for index in range(args.images)
+    ]
+
+    try:
+        print("{:<12}{:>10}{:>10}{:>12}".format("engine", "images", "seconds", "images/s"))
+        for name, download in (("sequential", _download_sequentially), ("concurrent", _download_concurrently)):
+            duration_seconds = run_downloads(links, download)
+            print("{:<12}{:>10}{:>10.2f}{:>12.1f}".format(name, len(links), duration_seconds,
+                                                          len(links) / duration_seconds))
+    finally:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
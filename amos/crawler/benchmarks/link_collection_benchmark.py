@@ -0,0 +1,152 @@
+"""This module contains a benchmark comparing the former fixed-sleep scrolling to the adaptive link collection.
+
+A local HTTP stub replays an infinite scrolling image search (benchmarks/fixtures/infinite_scroll.html), which
+appends a batch of images some time after the bottom of the page has been reached. Both collectors scroll the same
+fixture in a headless browser until the requested number of unique links is found, hence the benchmark is
+reproducible and independent of the search engines, e.g.
+
+    python benchmarks/link_collection_benchmark.py --links 50 200 500 --batch 25 --delay-ms 300
+"""
+import argparse
+import os
+import sys
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import perf_counter
+from typing import Callable, List, Tuple
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collect_links import CollectLinks  # noqa: E402
+
+_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# 1x1 transparent PNG served for every image of the fixture
+_IMAGE = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000001e221bc330000000049454e44ae426082"
+)
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        if not self.path.startswith("/images/"):
+            return super().do_GET()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(_IMAGE)))
+        self.end_headers()
+        self.wfile.write(_IMAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _collect_with_fixed_sleeps(collect: CollectLinks, limit: int) -> List[str]:
+    """Collects links like the former crawler, i.e. 60 page downs with fixed sleeps before scraping all images.
+
+    Parameters
+    ----------
+    collect: CollectLinks
+        Link collector whose browser shows the fixture.
+    limit: int
+        Number of links to collect.
+
+    Returns
+    -------
+    links: list[str]
+        Collected unique links.
+    """
+    time.sleep(1)
+    elem = collect.browser.find_element(By.TAG_NAME, "body")
+    for _ in range(60):
+        elem.send_keys(Keys.PAGE_DOWN)
+        time.sleep(0.2)
+
+    images = collect.browser.find_elements(By.TAG_NAME, "img")
+    links = collect.remove_duplicates(img.get_attribute("src") for img in images)
+    return links[:limit]
+
+
+def _collect_adaptively(collect: CollectLinks, limit: int) -> List[str]:
+    """Collects links with the adaptive link collection of the crawler.
+
+    Parameters
+    ----------
+    collect: CollectLinks
+        Link collector whose browser shows the fixture.
+    limit: int
+        Number of links to collect.
+
+    Returns
+    -------
+    links: list[str]
+        Collected unique links.
+    """
+    return collect.collect_image_links("img", limit)
+
+
+def run_collection(collect: CollectLinks, url: str, limit: int,
+                   collect_links: Callable[[CollectLinks, int], List[str]]) -> Tuple[float, int]:
+    """Loads the fixture and collects links with the passed collector.
+
+    Parameters
+    ----------
+    collect: CollectLinks
+        Link collector with a warm browser.
+    url: str
+        URL of the fixture.
+    limit: int
+        Number of links to collect.
+    collect_links: callable
+        Collector to measure.
+
+    Returns
+    -------
+    duration_seconds: float
+        Duration from loading the fixture until the links have been collected.
+    n_links: int
+        Number of collected links.
+    """
+    start = perf_counter()
+    collect.browser.get(url)
+    n_links = len(collect_links(collect, limit))
+    return perf_counter() - start, n_links
+
+
+def main() -> None:
+    """Runs both collectors for every passed number of links and prints a comparison table."""
+    parser = argparse.ArgumentParser(description="Compares the fixed-sleep scrolling and the adaptive link collection.")
+    parser.add_argument("--links", type=int, nargs="+", default=[50, 200, 500], help="numbers of links to collect")
+    parser.add_argument("--batch", type=int, default=25, help="images appended per scroll to the bottom")
+    parser.add_argument("--delay-ms", type=int, default=300, help="delay until a batch is appended")
+    parser.add_argument("--total", type=int, default=1000, help="total number of images of the fixture")
+    parser.add_argument("--no_driver", action="store_true", help="whether the preconfigured driver should not be used")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(FixtureHandler, directory=_FIXTURES_DIR))
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{}/infinite_scroll.html?batch={}&delay={}&total={}".format(
+        server.server_address[1], args.batch, args.delay_ms, args.total
+    )
+    collect = CollectLinks(no_gui=True, no_driver=args.no_driver)
+
+    try:
+        print("{:>8}{:>14}{:>10}{:>14}{:>10}".format("links", "fixed sleep s", "found", "adaptive s", "found"))
+        for limit in args.links:
+            fixed_seconds, fixed_links = run_collection(collect, url, limit, _collect_with_fixed_sleeps)
+            adaptive_seconds, adaptive_links = run_collection(collect, url, limit, _collect_adaptively)
+            print("{:>8}{:>14.2f}{:>10}{:>14.2f}{:>10}".format(
+                limit, fixed_seconds, fixed_links, adaptive_seconds, adaptive_links
+            ))
+    finally:
+        collect.quit()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""This module contains the pool of warm browsers shared by the link collection of all keywords."""
+from collections import deque
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+from typing import Callable, Iterator
+
+from collect_links import CollectLinks
+
+
+class BrowserPool:
+    """Keeps up to size browsers alive across keywords, since starting a browser takes seconds and lots of memory.
+
+    Browsers are reset after every use and health-checked before every use, crashed browsers are replaced by new ones.
+
+    Parameters
+    ----------
+    size: int, default=2
+        Maximum number of concurrently running browsers.
+    no_gui: bool, default=False
+        Whether to run the browsers headless.
+    no_driver: bool, default=False
+        Whether the preconfigured driver should not be used.
+    create_browser: callable, default=None
+        Factory of new browsers, by default a CollectLinks instance with the passed options.
+    """
+
+    def __init__(self, size=2, no_gui=False, no_driver=False, create_browser: Callable[[], CollectLinks] = None):
+        self.size = size
+        self._create_browser = create_browser or (lambda: CollectLinks(no_gui=no_gui, no_driver=no_driver))
+        self._slots = BoundedSemaphore(size)
+        self._idle_browsers = deque()
+        self._idle_browsers_lock = Lock()
+
+    @contextmanager
+    def browser(self) -> Iterator[CollectLinks]:
+        """Lends a healthy browser, blocking while all browsers are in use.
+
+        Returns
+        -------
+        collect: CollectLinks
+            Link collector with a reset browser, returned to the pool afterwards.
+        """
+        with self._slots:
+            collect = self._get_healthy_browser()
+            try:
+                yield collect
+            finally:
+                self._release_browser(collect)
+
+    def close(self):
+        """Quits all idle browsers."""
+        with self._idle_browsers_lock:
+            while self._idle_browsers:
+                self._idle_browsers.popleft().quit()
+
+    def _get_healthy_browser(self) -> CollectLinks:
+        """Returns an idle browser that is still alive, starts a new browser if there is none.
+
+        Returns
+        -------
+        collect: CollectLinks
+            Link collector with a healthy browser.
+        """
+        while True:
+            with self._idle_browsers_lock:
+                collect = self._idle_browsers.popleft() if self._idle_browsers else None
+            if collect is None:
+                return self._create_browser()
+            if collect.is_alive():
+                return collect
+
+            print("Recycling crashed browser")
+            collect.quit()
+
+    def _release_browser(self, collect: CollectLinks):
+        """Resets a lent browser and returns it to the pool, browsers failing to reset are quit.
+
+        Parameters
+        ----------
+        collect: CollectLinks
+            Link collector with the lent browser.
+        """
+        try:
+            collect.reset()
+        except Exception as e:
+            print("Recycling browser failing to reset - {}".format(e))
+            collect.quit()
+            return
+
+        with self._idle_browsers_lock:
+            self._idle_browsers.append(collect)
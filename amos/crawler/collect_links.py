@@ -14,17 +14,64 @@ Copyright 2018 YoongiKim
    limitations under the License.
 """
 
-import time
 from selenium import webdriver
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import ElementNotVisibleException, StaleElementReferenceException
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
 import platform
+from urllib.parse import urlsplit
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 import os.path as osp
 
+NEW_CONTENT_TIMEOUT_SECONDS = 3  # scrolls without new content for this long count as stalled
+SCROLL_PATIENCE = 3  # consecutive stalled scrolls until the end of the results is assumed
+CLICK_TIMEOUT_SECONDS = 15
+CLICK_ATTEMPTS = 3
+POLL_SECONDS = 0.05
+
+# returns the unique links of all images matched by a CSS selector in a single round trip, google preloads some
+# images as base64 and keeps their actual link in data-iurl
+_IMAGE_LINKS_SCRIPT = """
+var links = [];
+document.querySelectorAll(arguments[0]).forEach(function (img) {
+    var src = img.src;
+    if (src && src.startsWith("data:") && img.getAttribute("data-iurl")) {
+        src = img.getAttribute("data-iurl");
+    }
+    if (src) {
+        links.push(src);
+    }
+});
+return Array.from(new Set(links));
+"""
+# scrolls to the bottom and waits until images are added or their links change, false after the passed timeout
+_SCROLL_AND_WAIT_SCRIPT = """
+var timeoutMs = arguments[0];
+var done = arguments[arguments.length - 1];
+var timer = null;
+var observer = new MutationObserver(function () {
+    observer.disconnect();
+    clearTimeout(timer);
+    done(true);
+});
+observer.observe(document.body, {childList: true, subtree: true, attributes: true, attributeFilter: ["src"]});
+timer = setTimeout(function () {
+    observer.disconnect();
+    done(false);
+}, timeoutMs);
+window.scrollTo(0, document.body.scrollHeight);
+"""
+
+
+def get_origin(url):
+    # scheme, host and port of a URL, None for URLs without an origin like about:blank
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return None
+    return "{}://{}".format(parts.scheme, parts.netloc)
+
 
 class CollectLinks:
     def __init__(self, no_gui=False, no_driver=False):
@@ -55,6 +102,8 @@ class CollectLinks:
             self.browser = webdriver.Chrome(chrome_options=chrome_options)
         else:
             self.browser = webdriver.Chrome(executable, chrome_options=chrome_options)
+        self.browser.set_script_timeout(NEW_CONTENT_TIMEOUT_SECONDS + 1)
+        self.visited_origins = set()  # storage to clear once the browser is reset
 
         browser_version = "Failed to detect version"
         chromedriver_version = "Failed to detect version"
@@ -81,25 +130,98 @@ class CollectLinks:
             )
         print("_________________________________")
 
+    def is_alive(self):
+        # health check of pooled browsers, fails if the browser or the driver crashed
+        try:
+            return self.browser.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def reset(self):
+        # leaves no state behind for the next keyword of a pooled browser, the cookies of all domains and the
+        # storage of all visited origins are cleared via the DevTools protocol (delete_all_cookies only clears the
+        # cookies of the current domain)
+        self.visited_origins.add(get_origin(self.browser.current_url))  # the search may have been redirected
+        self.browser.get("about:blank")
+        self.browser.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        for origin in self.visited_origins - {None}:
+            self.browser.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+        self.visited_origins.clear()
+
+    def open(self, url):
+        self.visited_origins.add(get_origin(url))
+        self.browser.get(url)
+
+    def quit(self):
+        try:
+            self.browser.quit()
+        except Exception as e:
+            print("Quitting browser failed - {}".format(e))
+
     def get_scroll(self):
         pos = self.browser.execute_script("return window.pageYOffset;")
         return pos
 
     def wait_and_click(self, xpath):
-        #  Sometimes click fails unreasonably. So tries to click at all cost.
+        #  Sometimes click fails unreasonably. So tries to click a few times, refreshing the browser in between.
+        for attempt in range(CLICK_ATTEMPTS):
+            try:
+                w = WebDriverWait(self.browser, CLICK_TIMEOUT_SECONDS, poll_frequency=POLL_SECONDS)
+                elem = w.until(EC.element_to_be_clickable((By.XPATH, xpath)))
+                elem.click()
+                self.highlight(elem)
+                return elem
+            except Exception:
+                print("Click time out - {}".format(xpath))
+                if attempt + 1 < CLICK_ATTEMPTS:
+                    print("Refreshing browser...")
+                    self.browser.refresh()
+
+        return None
+
+    def click_if_displayed(self, xpath):
+        # unlike wait_and_click, this does not wait for the element to appear
         try:
-            w = WebDriverWait(self.browser, 15)
-            elem = w.until(EC.element_to_be_clickable((By.XPATH, xpath)))
-            elem.click()
-            self.highlight(elem)
+            for elem in self.browser.find_elements(By.XPATH, xpath):
+                if elem.is_displayed():
+                    elem.click()
+                    return True
         except Exception:
-            print("Click time out - {}".format(xpath))
-            print("Refreshing browser...")
-            self.browser.refresh()
-            time.sleep(2)
-            return self.wait_and_click(xpath)
+            pass
+
+        return False
+
+    def get_image_links(self, css_selector):
+        return self.browser.execute_script(_IMAGE_LINKS_SCRIPT, css_selector) or []
 
-        return elem
+    def scroll_and_wait_for_new_content(self):
+        try:
+            return self.browser.execute_async_script(_SCROLL_AND_WAIT_SCRIPT, NEW_CONTENT_TIMEOUT_SECONDS * 1000)
+        except TimeoutException:
+            return False
+
+    def collect_image_links(self, css_selector, limit=0, more_results_xpath=None):
+        """Scrolls down until limit unique image links are found (0: infinite) or no new images appear anymore.
+
+        Instead of sleeping for fixed durations, every scroll waits for images to be added to the page. Links are
+        accumulated across scrolls, hence images removed from the page again (virtualized lists) are kept.
+        """
+        links = self.get_image_links(css_selector)
+        stalled_scrolls = 0
+
+        while (limit <= 0 or len(links) < limit) and stalled_scrolls < SCROLL_PATIENCE:
+            n_links = len(links)
+            self.scroll_and_wait_for_new_content()
+            links = self.remove_duplicates(links + self.get_image_links(css_selector))
+
+            if len(links) > n_links:
+                stalled_scrolls = 0
+            else:
+                stalled_scrolls += 1
+                if more_results_xpath is not None:
+                    self.click_if_displayed(more_results_xpath)
+
+        return links[:limit] if limit > 0 else links
 
     def highlight(self, element):
         self.browser.execute_script(
@@ -113,98 +235,26 @@ class CollectLinks:
     def pinterest(self, keyword, region, add_url="", limit=5000):
         sight_keyword = str(region + " " + keyword)
         url = "https://www.pinterest.de/search/pins/?q="
-        self.browser.get("{0}{1}".format(url, sight_keyword))
-
-        time.sleep(1)
+        self.open("{0}{1}".format(url, sight_keyword))
 
-        print("Scrolling down")
-
-        elem = self.browser.find_element_by_tag_name("body")
-
-        try:
-            for i in range(60):
-                elem.send_keys(Keys.PAGE_DOWN)
-                time.sleep(0.2)
-
-        except ElementNotVisibleException:
-            pass
-
-        print("Scraping links")
-
-        links = []
-        count = 0
-        for img in self.browser.find_elements(By.TAG_NAME, "img"):
-            count += 1
-            if count == limit:
-                break
-            try:
-
-                # self.highlight(img)
-                src: str = img.get_attribute("src")
-
-                # Google seems to preload 20 images as base64
-                src = src.replace("/236x/", "/564x/")
-                links.append(src)
-
-            except Exception as e:
-                print("[Exception occurred while collecting links from google] {}".format(e))
+        print("Scrolling down and scraping links")
 
+        links = [link.replace("/236x/", "/564x/") for link in self.collect_image_links("img", limit)]
         links = self.remove_duplicates(links)
 
         print("Collect links done. Site: {}, Keyword: {}, Total: {}".format("Pinterest", keyword, len(links)))
-        self.browser.close()
         return links
 
-    def google(self, keyword, region, add_url=""):
+    def google(self, keyword, region, add_url="", limit=0):
         sight_keyword = str(region + " " + keyword)
-        self.browser.get("https://www.google.com/search?q={}&source=lnms&tbm=isch{}".format(sight_keyword, add_url))
-
-        time.sleep(1)
-
-        print("Scrolling down")
+        self.open("https://www.google.com/search?q={}&source=lnms&tbm=isch{}".format(sight_keyword, add_url))
 
-        elem = self.browser.find_element_by_tag_name("body")
+        print("Scrolling down and scraping links")
 
-        for i in range(60):
-            elem.send_keys(Keys.PAGE_DOWN)
-            time.sleep(0.2)
-
-        try:
-            # You may need to change this. Because google image changes rapidly.
-            # btn_more = self.browser.find_element(By.XPATH, '//input[@value="결과 더보기"]')
-            # self.wait_and_click('//input[@id="smb"]')
-            self.wait_and_click('//input[@type="button"]')
-
-            for i in range(60):
-                elem.send_keys(Keys.PAGE_DOWN)
-                time.sleep(0.2)
-
-        except ElementNotVisibleException:
-            pass
-
-        photo_grid_boxes = self.browser.find_elements(By.XPATH, '//div[@class="bRMDJf islir"]')
-
-        print("Scraping links")
-
-        links = []
-
-        for box in photo_grid_boxes:
-            try:
-                imgs = box.find_elements(By.TAG_NAME, "img")
-
-                for img in imgs:
-                    # self.highlight(img)
-                    src = img.get_attribute("src")
-
-                    # Google seems to preload 20 images as base64
-                    if str(src).startswith("data:"):
-                        src = img.get_attribute("data-iurl")
-                    links.append(src)
-
-            except Exception as e:
-                print("[Exception occurred while collecting links from google] {}".format(e))
-
-        links = self.remove_duplicates(links)
+        # You may need to change these. Because google image changes rapidly.
+        links = self.collect_image_links(
+            'div[class="bRMDJf islir"] img', limit, more_results_xpath='//input[@type="button"]'
+        )
 
         print("Collect links done. Site: {}, Keyword: {}, Total: {}".format("google", keyword, len(links)))
 
@@ -213,69 +263,59 @@ class CollectLinks:
     def google_full(self, keyword, region, add_url="", limit=5000):
         print("[Full Resolution Mode]")
         sight_keyword = str(region + " " + keyword)
-        self.browser.get("https://www.google.com/search?q={}&tbm=isch{}".format(sight_keyword, add_url))
-        time.sleep(1)
+        self.open("https://www.google.com/search?q={}&tbm=isch{}".format(sight_keyword, add_url))
 
-        elem = self.browser.find_element_by_tag_name("body")
+        elem = self.browser.find_element(By.TAG_NAME, "body")
 
         print("Scraping links")
 
         self.wait_and_click('//div[@data-ri="0"]')
-        time.sleep(1)
+        wait = WebDriverWait(
+            self.browser,
+            NEW_CONTENT_TIMEOUT_SECONDS,
+            poll_frequency=POLL_SECONDS,
+            ignored_exceptions=(StaleElementReferenceException,),
+        )
 
         links = []
-        count = 1
+        src = None
+        stalled_images = 0
 
-        last_scroll = 0
-        scroll_patience = 0
-
-        for i in range(limit):
+        while (limit <= 0 or len(links) < limit) and stalled_images < SCROLL_PATIENCE:
             try:
                 xpath = '//div[@id="islsp"]//div[@class="v4dQwb"]'
-                div_box = self.browser.find_element(By.XPATH, xpath)
+                div_box = wait.until(EC.presence_of_element_located((By.XPATH, xpath)))
                 self.highlight(div_box)
 
-                xpath = '//img[@class="n3VNCb"]'
-                img = div_box.find_element(By.XPATH, xpath)
-                self.highlight(img)
-
-                xpath = '//div[@class="k7O2sd"]'
-                loading_bar = div_box.find_element(By.XPATH, xpath)
-
-                # Wait for image to load. If not it will display base64 code.
-                while str(loading_bar.get_attribute("style")) != "display: none;":
-                    time.sleep(0.1)
-
-                src = img.get_attribute("src")
+                # Wait for the next image to load. If not it will display base64 code or the previous image.
+                src = wait.until(lambda _: self._get_loaded_full_image_link(div_box, src))
+                links = self.remove_duplicates(links + [src])
+                stalled_images = 0
 
-                if src is not None:
-                    links.append(src)
-                    count += 1
-
-            except StaleElementReferenceException:
-                # print('[Expected Exception - StaleElementReferenceException]')
-                pass
+            except (StaleElementReferenceException, TimeoutException):
+                stalled_images += 1
             except Exception as e:
                 print("[Exception occurred while collecting links from google_full] {}".format(e))
-
-            scroll = self.get_scroll()
-            if scroll == last_scroll:
-                scroll_patience += 1
-            else:
-                scroll_patience = 0
-                last_scroll = scroll
-
-            if scroll_patience >= 30:
-                break
+                stalled_images += 1
 
             elem.send_keys(Keys.RIGHT)
 
-        links = self.remove_duplicates(links)
-
         print("Collect links done. Site: {}, Keyword: {}, Total: {}".format("google_full", keyword, len(links)))
 
         return links
 
+    @staticmethod
+    def _get_loaded_full_image_link(div_box, previous_src):
+        # returns the link of the full resolution image once it has been loaded and differs from the previous one
+        xpath = '//div[@class="k7O2sd"]'
+        loading_bar = div_box.find_element(By.XPATH, xpath)
+        if str(loading_bar.get_attribute("style")) != "display: none;":
+            return None
+
+        xpath = '//img[@class="n3VNCb"]'
+        src = div_box.find_element(By.XPATH, xpath).get_attribute("src")
+        return src if src is not None and src != previous_src else None
+
 
 if __name__ == "__main__":
     collect = CollectLinks()
@@ -0,0 +1,209 @@
+"""This module contains the buffered writer pushing crawled images into the DWH in batches."""
+from collections import Counter
+from hashlib import sha256
+from queue import Empty, Queue
+from threading import Lock, Thread
+from time import perf_counter, sleep
+from typing import List, Optional, Tuple, Union
+
+from data_crawler.config import config
+from psycopg2 import connect
+from psycopg2.extras import execute_values
+
+BACKPRESSURE_REPORT_SECONDS = 1  # blocked writes of at least this duration are reported
+
+_PERSISTED_CONTENT_HASHES_QUERY = (
+    "SELECT image_content_hash FROM integration_layer.dim_sights_images WHERE image_content_hash = ANY(%s)"
+)
+_IMAGES_DML_QUERY = """INSERT INTO load_layer.sight_images (sight_image, sight_city, sight_image_width,
+            sight_image_height, sight_image_data_source, sight_image_content_hash) VALUES %s"""
+
+ImageRow = Tuple[str, Optional[str], Tuple[bytes, str, int, int, str, str]]
+
+
+class ImageWriter:
+    """Buffers crawled images and pushes them into the load layer in batches through a single long-lived connection.
+
+    Batches are pushed by a background thread, hence crawling continues while a batch is written. Writes block once
+    max_pending_batches batches wait for the DWH, which is reported as backpressure. Failed batches are retried through
+    a new connection and only dropped (counted as failed_images) once all retries failed. Writes are thread-safe, hence
+    a single writer is shared by all keywords of a crawler run.
+
+    Parameters
+    ----------
+    batch_size: int, default=50
+        Number of images pushed per insert statement.
+    flush_interval_seconds: float, default=5
+        Maximum time buffered images wait for their batch to fill up.
+    max_pending_batches: int, default=2
+        Maximum number of full batches waiting for the DWH.
+    max_retries: int, default=3
+        Maximum number of retries per batch, each one through a new connection.
+    retry_backoff_seconds: float, default=0.5
+        Delay before the first retry, doubled for every further retry.
+    """
+
+    def __init__(self, batch_size=50, flush_interval_seconds=5.0, max_pending_batches=2, max_retries=3,
+                 retry_backoff_seconds=0.5):
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.pushed_images = 0
+        self.failed_images = 0
+        self.pushed_images_by_tag: Counter = Counter()  # only updated by the background thread
+        self.skipped_duplicates = 0
+        self.blocked_seconds = 0.0
+
+        self._rows: List[ImageRow] = []
+        self._rows_lock = Lock()
+        self._batches = Queue(maxsize=max_pending_batches)
+        self._connection = None
+        self._flusher = Thread(target=self._flush_batches, daemon=True)
+        self._flusher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(
+        self,
+        sight_image: Union[bytes, memoryview],
+        sight_image_width: int,
+        sight_image_height: int,
+        sight_image_data_source: str,
+        sight_city: str = "Berlin",
+        tag: Optional[str] = None,
+    ) -> None:
+        """Buffers a crawled image, the buffer is pushed into the load layer once it holds batch_size images.
+
+        The image is copied, since downloads are only lent until the next one is requested. Inserted images are counted
+        per passed tag (e.g. the crawled keyword) in pushed_images_by_tag.
+        """
+        sight_image = bytes(sight_image)
+        content_hash = sha256(sight_image).hexdigest()
+        row = (
+            content_hash,
+            tag,
+            (
+                sight_image,
+                sight_city.replace(" ", "_"),  # DWH does not accept spaces in city names
+                sight_image_width,
+                sight_image_height,
+                sight_image_data_source,
+                content_hash,
+            ),
+        )
+
+        with self._rows_lock:
+            self._rows.append(row)
+            batch = self._take_rows() if len(self._rows) >= self.batch_size else None
+        if batch:
+            self._put_batch(batch)
+
+    def close(self) -> None:
+        """Pushes all buffered images, waits for the DWH and closes the connection."""
+        with self._rows_lock:
+            batch = self._take_rows()
+        if batch:
+            self._put_batch(batch)
+        self._batches.put(None)
+        self._flusher.join()
+
+        if self._connection is not None:
+            self._connection.close()
+        print(
+            "Pushed {} images, skipped {} duplicates, dropped {} images, waited {:.2f} s for the DWH".format(
+                self.pushed_images, self.skipped_duplicates, self.failed_images, self.blocked_seconds
+            )
+        )
+
+    def _take_rows(self) -> List[ImageRow]:
+        """Empties the buffer and returns its images, the caller holds the buffer lock."""
+        rows, self._rows = self._rows, []
+        return rows
+
+    def _put_batch(self, batch: List[ImageRow]) -> None:
+        """Hands a batch over to the background thread, blocking while the DWH is behind."""
+        start = perf_counter()
+        self._batches.put(batch)
+        blocked_seconds = perf_counter() - start
+
+        with self._rows_lock:  # writes of several threads may be blocked at the same time
+            self.blocked_seconds += blocked_seconds
+        if blocked_seconds >= BACKPRESSURE_REPORT_SECONDS:
+            print("Backpressure: waited {:.2f} s for the DWH to accept {} images".format(blocked_seconds, len(batch)))
+
+    def _flush_batches(self) -> None:
+        """Pushes handed over batches and periodically the buffer until close() is called."""
+        while True:
+            try:
+                batch = self._batches.get(timeout=self.flush_interval_seconds)
+            except Empty:
+                with self._rows_lock:
+                    batch = self._take_rows()
+            if batch is None:
+                return
+            if batch:
+                self._push_batch(batch)
+
+    def _push_batch(self, batch: List[ImageRow]) -> None:
+        """Pushes a batch, retrying failed attempts with exponential backoff through a new connection.
+
+        Parameters
+        ----------
+        batch: list[tuple[str, str or None, tuple]]
+            Content hash, tag and load layer row per image.
+        """
+        for n_retries in range(self.max_retries + 1):
+            if n_retries > 0:
+                sleep(self.retry_backoff_seconds * 2 ** (n_retries - 1))
+            try:
+                self._insert_batch(batch)
+                return
+            except Exception as exc:
+                print("Error executing SQL: %s" % exc)
+                self._close_connection()  # reconnect on the next attempt
+
+        self.failed_images += len(batch)
+        print("Dropped {} images after {} attempts".format(len(batch), self.max_retries + 1))
+
+    def _insert_batch(self, batch: List[ImageRow]) -> None:
+        """Inserts all images of a batch whose content has not been persisted yet in a single transaction.
+
+        Parameters
+        ----------
+        batch: list[tuple[str, str or None, tuple]]
+            Content hash, tag and load layer row per image.
+        """
+        if self._connection is None or self._connection.closed:
+            self._connection = connect(**config())
+
+        with self._connection as connection:  # commits the batch or rolls it back
+            with connection.cursor() as cursor:
+                # identical images are served by several sources (e.g. CDNs) and may be part of the same batch
+                cursor.execute(_PERSISTED_CONTENT_HASHES_QUERY, ([content_hash for content_hash, _, _ in batch],))
+                known_content_hashes = {content_hash for content_hash, in cursor.fetchall()}
+                rows, tags = [], []
+                for content_hash, tag, row in batch:
+                    if content_hash not in known_content_hashes:
+                        known_content_hashes.add(content_hash)
+                        rows.append(row)
+                        tags.append(tag)
+
+                if rows:
+                    execute_values(cursor, _IMAGES_DML_QUERY, rows, page_size=len(rows))
+        self.pushed_images += len(rows)
+        self.pushed_images_by_tag.update(tag for tag in tags if tag is not None)
+        self.skipped_duplicates += len(batch) - len(rows)
+
+    def _close_connection(self) -> None:
+        """Closes the connection, which may be broken after a failed batch."""
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception as exc:
+                print("Closing the DWH connection failed: %s" % exc)
+            self._connection = None
@@ -0,0 +1,71 @@
+from hashlib import sha256
+from mock import MagicMock, patch
+from data_crawler.image_writer import ImageWriter
+
+
+def get_connection_mock(persisted_images):
+    connection = MagicMock()
+    connection.closed = 0
+    connection.__enter__.return_value = connection
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [(sha256(image).hexdigest(),) for image in persisted_images]
+    return connection
+
+
+def test_image_writer_batches():
+    connection = get_connection_mock([b"image 1"])
+    with patch("data_crawler.image_writer.connect", return_value=connection) as connect_mock, patch(
+        "data_crawler.image_writer.execute_values"
+    ) as execute_values_mock:
+        with ImageWriter(batch_size=2, flush_interval_seconds=60) as image_writer:
+            for image in [b"image 1", b"image 2", b"image 3", b"image 3", b"image 4"]:
+                image_writer.write(memoryview(image), 10, 10, "https://cdn.test.com/a.jpg", "New York", tag="Tor")
+
+        connect_mock.assert_called_once()  # single long-lived connection
+        assert execute_values_mock.call_count == 3  # two full batches and one flushed on close
+        pushed_rows = [row for call in execute_values_mock.call_args_list for row in call[0][2]]
+        assert [row[0] for row in pushed_rows] == [b"image 2", b"image 3", b"image 4"]
+        assert pushed_rows[0][1] == "New_York"
+        assert pushed_rows[0][-1] == sha256(b"image 2").hexdigest()  # hash of the downloaded file
+        assert image_writer.pushed_images == 3 and image_writer.skipped_duplicates == 2
+        assert image_writer.pushed_images_by_tag == {"Tor": 3}
+
+
+def test_image_writer_flush_interval():
+    connection = get_connection_mock([])
+    with patch("data_crawler.image_writer.connect", return_value=connection), patch(
+        "data_crawler.image_writer.execute_values"
+    ) as execute_values_mock:
+        with ImageWriter(batch_size=100, flush_interval_seconds=0.01) as image_writer:
+            image_writer.write(b"image 1", 10, 10, "https://cdn.test.com/a.jpg")
+            for _ in range(100):
+                if execute_values_mock.called:
+                    break
+                image_writer._flusher.join(0.01)
+            assert execute_values_mock.call_count == 1  # flushed before the batch was full
+
+
+def test_image_writer_sql_error():
+    connection = get_connection_mock([])
+    connection.cursor.return_value.__enter__.return_value.execute.side_effect = Exception("connection lost")
+    with patch("data_crawler.image_writer.connect", return_value=connection) as connect_mock:
+        with ImageWriter(batch_size=1, max_retries=2, retry_backoff_seconds=0) as image_writer:
+            image_writer.write(b"image 1", 10, 10, "https://cdn.test.com/a.jpg")
+
+        assert image_writer.pushed_images == 0
+        assert image_writer.failed_images == 1
+        assert connect_mock.call_count == 3  # every retry reconnects
+
+
+def test_image_writer_retry():
+    connection = get_connection_mock([])
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.execute.side_effect = [Exception("connection lost"), None]
+    with patch("data_crawler.image_writer.connect", return_value=connection), patch(
+        "data_crawler.image_writer.execute_values"
+    ) as execute_values_mock:
+        with ImageWriter(batch_size=1, retry_backoff_seconds=0) as image_writer:
+            image_writer.write(b"image 1", 10, 10, "https://cdn.test.com/a.jpg")
+
+        assert execute_values_mock.call_count == 1
+        assert (image_writer.pushed_images, image_writer.failed_images) == (1, 0)
@@ -0,0 +1,205 @@
+"""This module contains the concurrent image downloader of the crawler."""
+import base64
+import mmap
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+from threading import BoundedSemaphore, Lock
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT_SECONDS = 5
+READ_TIMEOUT_SECONDS = 15
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class ImageDownloader:
+    """Downloads images concurrently through a single session, i.e. connections to a host are reused across images.
+
+    Parameters
+    ----------
+    max_in_flight: int, default=16
+        Maximum number of concurrent downloads.
+    max_per_host: int, default=4
+        Maximum number of concurrent downloads per host, which keeps single CDNs from being flooded.
+    max_retries: int, default=2
+        Maximum number of retries per image on connection errors, read errors and retryable status codes.
+    backoff_factor: float, default=0.5
+        Delay before the first retry in seconds, doubled per further retry.
+    spool_bytes: int, default=0
+        Size from which on a download is spilled to a memory-mapped temporary file instead of being kept in memory,
+        0 keeps all downloads in memory.
+    """
+
+    def __init__(self, max_in_flight=16, max_per_host=4, max_retries=2, backoff_factor=0.5, spool_bytes=0):
+        self.max_in_flight = max_in_flight
+        self.max_per_host = max_per_host
+        self.spool_bytes = spool_bytes
+        self._host_semaphores: Dict[str, BoundedSemaphore] = {}
+        self._host_semaphores_lock = Lock()
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=max_in_flight, pool_maxsize=max_per_host)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        """Closes all pooled connections."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def iter_downloads(self, links: Iterable[str]) -> Iterator[Tuple[int, str, Optional[memoryview]]]:
+        """Downloads the passed links concurrently and yields them in the order of their completion.
+
+        Parameters
+        ----------
+        links: iterable[str]
+            Image links, either URLs or base64 encoded data URIs.
+
+        Returns
+        -------
+        downloads: iterator[tuple[int, str, memoryview or None]]
+            Index of the link, the link itself and the downloaded image, None if the download failed.
+
+        Notes
+        -----
+        At most twice as many links as downloads in flight are submitted at a time. Links not yet downloaded are
+        cancelled once the iteration is stopped early, e.g. as soon as enough images have been downloaded.
+
+        Every image is only lent until the next download is requested: its view is released and spilled downloads are
+        unmapped, hence consumers keeping an image have to copy it.
+        """
+        indexed_links = enumerate(links)
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            pending = {
+                executor.submit(self._download, index, link)
+                for index, link in islice(indexed_links, 2 * self.max_in_flight)
+            }
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for index, link in islice(indexed_links, len(done)):
+                        pending.add(executor.submit(self._download, index, link))
+                    for future in done:
+                        index, link, image = future.result()
+                        with _lend_image(image):
+                            yield index, link, image
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _download(self, index: int, link: str) -> Tuple[int, str, Optional[memoryview]]:
+        """Downloads a single link, respecting the concurrency limit of its host.
+
+        Parameters
+        ----------
+        index: int
+            Index of the link.
+        link: str
+            Image URL or base64 encoded data URI.
+
+        Returns
+        -------
+        download: tuple[int, str, memoryview or None]
+            Index of the link, the link itself and the downloaded image, None if the download failed.
+        """
+        if link.startswith("data:image/"):
+            try:
+                return index, link, memoryview(base64.b64decode(link.split(",", 1)[1]))
+            except (IndexError, ValueError) as e:
+                print("Download failed - {}".format(e))
+                return index, link, None
+
+        with self._get_host_semaphore(urlparse(link).netloc):
+            try:
+                timeout = (CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS)
+                with self.session.get(link, timeout=timeout, stream=True) as response:
+                    response.raise_for_status()
+                    return index, link, self._read_content(response)
+            except requests.RequestException as e:
+                print("Download failed - {}".format(e))
+                return index, link, None
+
+    def _read_content(self, response: requests.Response) -> memoryview:
+        """Reads the content of a streamed response, spilling it to disk once it exceeds the spool size.
+
+        Parameters
+        ----------
+        response: Response
+            Streamed response of an image download.
+
+        Returns
+        -------
+        content: memoryview
+            View on the in-memory buffer or on the memory-mapped temporary file, i.e. the content is not copied again.
+        """
+        content, spill_file = bytearray(), None
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+            if spill_file is not None:
+                spill_file.write(chunk)
+                continue
+
+            content += chunk
+            if 0 < self.spool_bytes < len(content):
+                spill_file = tempfile.TemporaryFile()
+                spill_file.write(content)
+                content = None
+
+        if spill_file is None:
+            return memoryview(content)
+
+        with spill_file:  # the mapping outlives the file object, it is closed once the image has been consumed
+            spill_file.flush()
+            return memoryview(mmap.mmap(spill_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _get_host_semaphore(self, host: str) -> BoundedSemaphore:
+        """Returns the semaphore limiting the concurrent downloads from the passed host.
+
+        Parameters
+        ----------
+        host: str
+            Network location of a link.
+
+        Returns
+        -------
+        semaphore: BoundedSemaphore
+            Semaphore of the host.
+        """
+        with self._host_semaphores_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = BoundedSemaphore(self.max_per_host)
+            return self._host_semaphores[host]
+
+
+@contextmanager
+def _lend_image(image: Optional[memoryview]) -> Iterator[None]:
+    """Releases a downloaded image once it has been consumed and closes the memory-mapped file of a spilled download.
+
+    Parameters
+    ----------
+    image: memoryview or None
+        Downloaded image, None if the download failed.
+    """
+    if image is None:
+        yield
+        return
+
+    with image.obj if isinstance(image.obj, mmap.mmap) else nullcontext(), image:  # the view is released first
+        yield
@@ -15,19 +15,22 @@ Copyright 2018 YoongiKim
 """
 
 import argparse
-import base64
 import imghdr
 import os
 import shutil
-from multiprocessing import Pool
+from functools import partial
+from io import BytesIO
+from multiprocessing.pool import ThreadPool
 
-import requests
 from PIL import Image
 
-from collect_links import CollectLinks
-from data_crawler.image import insert_image
+from browser_pool import BrowserPool
+from data_crawler.image_writer import ImageWriter
+from downloader import ImageDownloader
 from google_sight_collector import get_sights
 
+IMAGE_HEADER_BYTES = 32  # imghdr only inspects the first bytes of an image
+
 
 class Sites:
     GOOGLE = 1
@@ -60,6 +63,12 @@ class AutoCrawler:
         no_driver=False,
         keyword_list="['Brandenburger Tor', 'Alexanderplatz']",
         region="Berlin",
+        download_workers=16,
+        downloads_per_host=4,
+        download_spool_bytes=0,
+        db_batch_size=50,
+        db_flush_seconds=5.0,
+        n_browsers=4,
     ):
         """
         :param skip_already_exist: Skips keyword already downloaded before. This is needed when re-downloading.
@@ -72,6 +81,12 @@ class AutoCrawler:
         :param limit: Maximum count of images to download. (0: infinite)
         :param no_driver: If the default drivers shouldnt be used
         :param keyword_list: List of keywords that will be downloaded
+        :param download_workers: Maximum number of concurrent image downloads per keyword
+        :param downloads_per_host: Maximum number of concurrent image downloads per host
+        :param download_spool_bytes: Image size from which on downloads are spilled to disk (0: kept in memory)
+        :param db_batch_size: Number of images pushed into the DWH per insert statement
+        :param db_flush_seconds: Maximum time crawled images are buffered before being pushed into the DWH
+        :param n_browsers: Maximum number of browsers reused for the link collection of all keywords
         """
 
         self.skip = skip_already_exist
@@ -85,6 +100,12 @@ class AutoCrawler:
         self.no_driver = no_driver
         self.keyword_list = keyword_list
         self.region = region
+        self.download_workers = download_workers
+        self.downloads_per_host = downloads_per_host
+        self.download_spool_bytes = download_spool_bytes
+        self.db_batch_size = db_batch_size
+        self.db_flush_seconds = db_flush_seconds
+        self.browser_pool = BrowserPool(size=n_browsers, no_gui=no_gui, no_driver=no_driver)
 
         os.makedirs("./{}".format(self.download_path), exist_ok=True)
 
@@ -108,157 +129,88 @@ class AutoCrawler:
         return paths
 
     @staticmethod
-    def get_extension_from_link(link, default="jpg"):
-        splits = str(link).split(".")
-        if len(splits) == 0:
-            return default
-        ext = splits[-1].lower()
-        if ext == "jpg" or ext == "jpeg":
-            return "jpg"
-        elif ext == "gif":
-            return "gif"
-        elif ext == "png":
-            return "png"
-        else:
-            return default
-
-    @staticmethod
-    def validate_image(path):
-        ext = imghdr.what(path)
+    def validate_image(image):
+        ext = imghdr.what(None, h=bytes(image[:IMAGE_HEADER_BYTES]))
         if ext == "jpeg":
             ext = "jpg"
         return ext  # returns None if not valid
 
     @staticmethod
-    def make_dir(dirname):
-        current_path = os.getcwd()
-        path = os.path.join(current_path, dirname)
-        if not os.path.exists(path):
-            os.makedirs(path)
+    def save_image(link, image, region, image_writer, tag=None):
+        """Validates a downloaded image in memory and buffers it for the DWH. Returns whether the image is buffered.
+
+        The image is inserted asynchronously, the inserted images are counted per tag by the writer once committed.
+        """
+        if AutoCrawler.validate_image(image) is None:
+            print("Unreadable file - {}".format(link))
+            return False
 
-    @staticmethod
-    def save_object_to_file(link, site_name, object, file_path, region, is_base64=False):
         try:
-            with open("{}".format(file_path), "wb") as file:
-                if is_base64:
-                    file.write(object)
-                else:
-                    shutil.copyfileobj(object.raw, file)
-            im = Image.open(file_path)
-            width, height = im.size
-            with open("{}".format(file_path), "rb") as file:
-                insert_image(file.read(), width, height, link, region)
-            try:
-                os.remove("{}".format(file_path))
-            except FileNotFoundError:
-                print("Image not found, can't be deleted")
+            with Image.open(BytesIO(image)) as im:  # lazily opened, i.e. only the header is parsed
+                width, height = im.size
+            image_writer.write(image, width, height, link, region, tag=tag)
+            return True
         except Exception as e:
             print("Save failed - {}".format(e))
+            return False
 
-    @staticmethod
-    def base64_to_object(src):
-        header, encoded = str(src).split(",", 1)
-        data = base64.b64decode(bytes(encoded, encoding="utf-8"))
-        return data
-
-    def download_images(self, keyword, links, site_name, max_count=0):
-        self.make_dir("{}/{}".format(self.download_path, keyword.replace('"', "").replace(" ", "_")))
+    def download_images(self, keyword, links, site_name, image_writer, max_count=0):
         total = len(links)
-        success_count = 0
 
         if max_count == 0:
             max_count = total
 
-        for index, link in enumerate(links):
-            if success_count >= max_count:
-                break
-
-            try:
-                print("Downloading {} from {}: {} / {}".format(keyword, site_name, success_count + 1, max_count))
-
-                if str(link).startswith("data:image/jpeg;base64"):
-                    response = self.base64_to_object(link)
-                    ext = "jpg"
-                    is_base64 = True
-                elif str(link).startswith("data:image/png;base64"):
-                    response = self.base64_to_object(link)
-                    ext = "png"
-                    is_base64 = True
-                else:
-                    response = requests.get(link, stream=True)
-                    ext = self.get_extension_from_link(link)
-                    is_base64 = False
-
-                no_ext_path = "{}/{}/{}_{}".format(
-                    self.download_path.replace('"', ""),
-                    keyword.replace(" ", "_"),
-                    site_name,
-                    str(index).zfill(4),
-                )
-                path = no_ext_path + "." + ext
-                self.save_object_to_file(
-                    str(link),
-                    site_name,
-                    response,
-                    path,
-                    is_base64=is_base64,
-                    region=self.region,
-                )
-
-                success_count += 1
-                del response
-
-                ext2 = self.validate_image(path)
-                if ext2 is None:
-                    print("Unreadable file - {}".format(link))
-                    os.remove(path)
-                    success_count -= 1
-                else:
-                    if ext != ext2:
-                        path2 = no_ext_path + "." + ext2
-                        os.rename(path, path2)
-                        print("Renamed extension {} -> {}".format(ext, ext2))
-
-            except Exception as e:
-                print("Download failed - ", e)
-                continue
-
-    def download_from_site(self, keyword, region, site_code):
+        with ImageDownloader(
+            max_in_flight=self.download_workers,
+            max_per_host=self.downloads_per_host,
+            spool_bytes=self.download_spool_bytes,
+        ) as downloader:
+            # the remaining downloads are cancelled as soon as max_count images have been handed over to the writer,
+            # which inserts them asynchronously, hence its own counters trail the downloads
+            n_saved = 0
+            for _, link, image in downloader.iter_downloads(str(link) for link in links):
+                if image is None:
+                    continue
+
+                print("Downloading {} from {}: {} saved / {}".format(keyword, site_name, n_saved, max_count))
+                if self.save_image(link, image, region=self.region, image_writer=image_writer, tag=keyword):
+                    n_saved += 1
+                    if n_saved >= max_count:
+                        break
+
+    def download_from_site(self, keyword, region, site_code, image_writer):
         site_name = Sites.get_text(site_code)
         add_url = Sites.get_face_url(site_code) if self.face else ""
 
         try:
-            collect = CollectLinks(no_gui=self.no_gui, no_driver=self.no_driver)  # initialize chrome driver
-        except Exception as e:
-            print("Error occurred while initializing chromedriver - {}".format(e))
-            return
+            # the browser is only lent for the link collection, the downloads do not need it
+            with self.browser_pool.browser() as collect:
+                print("Collecting links... {} from {}".format(keyword, site_name))
 
-        try:
-            print("Collecting links... {} from {}".format(keyword, site_name))
+                if site_code == Sites.GOOGLE:
+                    links = collect.google(keyword, region, add_url, self.limit)
 
-            if site_code == Sites.GOOGLE:
-                links = collect.google(keyword, region, add_url)
+                elif site_code == Sites.GOOGLE_FULL:
+                    links = collect.google_full(keyword, region, add_url, self.limit)
 
-            elif site_code == Sites.GOOGLE_FULL:
-                links = collect.google_full(keyword, region, add_url, self.limit)
+                else:
+                    print("Invalid Site Code")
+                    links = []
 
-            else:
-                print("Invalid Site Code")
-                links = []
+                print("Google Links:", len(links))
+                links = links + collect.pinterest(keyword, region, add_url, self.limit)
 
-            print("Google Links:", len(links))
-            links = links + collect.pinterest(keyword, region, add_url, self.limit)
             print("Total Links:", len(links))
             print("Downloading images from {} collected links... {} from {}".format(len(links), keyword, site_name))
-            self.download_images(keyword, links, site_name, max_count=len(links))
+            self.download_images(keyword, links, site_name, image_writer, max_count=len(links))
 
             print("Done {} : {}".format(site_name, keyword))
 
         except Exception as e:
             print("Exception {}:{} - {}".format(site_name, keyword, e))
 
-    def download(self, args):
-        self.download_from_site(keyword=args[0], region=self.region, site_code=args[1])
+    def download(self, args, image_writer):
+        self.download_from_site(keyword=args[0], region=self.region, site_code=args[1], image_writer=image_writer)
 
     def do_crawling(self):
         keywords = self.keyword_list
@@ -277,10 +229,14 @@ class AutoCrawler:
                 else:
                     tasks.append([keyword, Sites.GOOGLE])
 
-        pool = Pool(self.n_threads)
-        pool.map_async(self.download, tasks)
-        pool.close()
-        pool.join()
+        # threads instead of processes, i.e. all keywords share the warm browsers of the browser pool and a single
+        # writer, which pushes the images of all keywords through one DWH connection
+        with ImageWriter(batch_size=self.db_batch_size, flush_interval_seconds=self.db_flush_seconds) as image_writer:
+            pool = ThreadPool(self.n_threads)
+            pool.map_async(partial(self.download, image_writer=image_writer), tasks)
+            pool.close()
+            pool.join()
+        self.browser_pool.close()
         print("Task ended. Pool join.")
 
         self.imbalance_check()
@@ -374,6 +330,42 @@ if __name__ == "__main__":
         default="Berlin",
         help="The region sights need to be found for",
     )
+    parser.add_argument(
+        "--download_workers",
+        type=int,
+        default=16,
+        help="Maximum number of concurrent image downloads per keyword",
+    )
+    parser.add_argument(
+        "--downloads_per_host",
+        type=int,
+        default=4,
+        help="Maximum number of concurrent image downloads per host",
+    )
+    parser.add_argument(
+        "--download_spool_bytes",
+        type=int,
+        default=0,
+        help="Image size from which on downloads are spilled to disk instead of being kept in memory (0: never)",
+    )
+    parser.add_argument(
+        "--db_batch_size",
+        type=int,
+        default=50,
+        help="Number of images pushed into the DWH per insert statement",
+    )
+    parser.add_argument(
+        "--db_flush_seconds",
+        type=float,
+        default=5.0,
+        help="Maximum time crawled images are buffered before being pushed into the DWH",
+    )
+    parser.add_argument(
+        "--browsers",
+        type=int,
+        default=4,
+        help="Maximum number of browsers reused for the link collection of all keywords",
+    )
     parser.add_argument(
         "--sights_limit",
         type=int,
@@ -391,6 +383,12 @@ if __name__ == "__main__":
     _limit = int(args.limit)
     _region = args.region
     _sights_limit = args.sights_limit
+    _download_workers = args.download_workers
+    _downloads_per_host = args.downloads_per_host
+    _download_spool_bytes = args.download_spool_bytes
+    _db_batch_size = args.db_batch_size
+    _db_flush_seconds = args.db_flush_seconds
+    _browsers = args.browsers
 
     no_gui_input = str(args.no_gui).lower()
     if no_gui_input == "auto":
@@ -430,6 +428,12 @@ if __name__ == "__main__":
         keyword_list=sights,
         no_driver=_no_driver,
         region=_region_escaped,
+        download_workers=_download_workers,
+        downloads_per_host=_downloads_per_host,
+        download_spool_bytes=_download_spool_bytes,
+        db_batch_size=_db_batch_size,
+        db_flush_seconds=_db_flush_seconds,
+        n_browsers=_browsers,
     )
     crawler.do_crawling()
     # clear and remove download directory after crawling images
@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+from browser_pool import BrowserPool
+
+
+class FakeCollectLinks:
+    started = 0
+
+    def __init__(self):
+        FakeCollectLinks.started += 1
+        self.alive = True
+        self.resets = 0
+        self.quit_called = False
+
+    def is_alive(self):
+        return self.alive
+
+    def reset(self):
+        self.resets += 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+def collect(browser_pool):
+    with browser_pool.browser() as browser:
+        sleep(0.01)
+        return browser
+
+
+def test_browser_pool_reuses_browsers():
+    FakeCollectLinks.started = 0
+    browser_pool = BrowserPool(size=2, create_browser=FakeCollectLinks)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        browsers = set(executor.map(collect, [browser_pool] * 20))
+
+    assert FakeCollectLinks.started == len(browsers) <= 2  # 20 keywords on at most 2 browsers
+    assert sum(browser.resets for browser in browsers) == 20  # reset after every use
+
+    browser_pool.close()
+    assert all(browser.quit_called for browser in browsers)
+
+
+def test_browser_pool_recycles_crashed_browsers():
+    browser_pool = BrowserPool(size=1, create_browser=FakeCollectLinks)
+    crashed_browser = collect(browser_pool)
+    crashed_browser.alive = False
+
+    browser = collect(browser_pool)
+    assert browser is not crashed_browser
+    assert crashed_browser.quit_called
+    assert collect(browser_pool) is browser
@@ -1,5 +1,5 @@
-from collect_links import CollectLinks
-from mock import patch, PropertyMock
+from collect_links import SCROLL_PATIENCE, CollectLinks, get_origin
+from mock import MagicMock, patch, PropertyMock
 
 
 class Chrome:
@@ -26,6 +26,12 @@ class Chrome:
     def find_element_by_tag_name(self, name):
         return Element()
 
+    def execute_script(self, script, *args):
+        return ["http://www.test.com"]
+
+    def execute_async_script(self, script, *args):
+        return False  # no new images appear
+
     def find_elements(self, by, value):
         return [Image()]
 
@@ -52,3 +58,66 @@ def test_pinterest():
     with patch("collect_links.CollectLinks.browser", create=True, new_callable=PropertyMock, return_value=Chrome()):
         result = collect.pinterest("test", "Berlin")
         assert result == ["http://www.test.com"]
+
+
+class InfiniteScrollChrome:
+    def __init__(self, images_per_scroll, max_images):
+        self.images_per_scroll = images_per_scroll
+        self.max_images = max_images
+        self.n_images = images_per_scroll
+        self.scrolls = 0
+
+    def execute_script(self, script, *args):
+        return ["http://www.test.com/{}.jpg".format(index) for index in range(self.n_images)]
+
+    def execute_async_script(self, script, *args):
+        self.scrolls += 1
+        is_loaded = self.n_images < self.max_images
+        self.n_images = min(self.n_images + self.images_per_scroll, self.max_images)
+        return is_loaded
+
+
+def get_collect_links(browser):
+    collect = CollectLinks.__new__(CollectLinks)  # skips starting a browser
+    collect.browser = browser
+    collect.visited_origins = set()
+    return collect
+
+
+def test_collect_image_links_stops_at_limit():
+    browser = InfiniteScrollChrome(images_per_scroll=20, max_images=1000)
+    links = get_collect_links(browser).collect_image_links("img", limit=50)
+    assert links == ["http://www.test.com/{}.jpg".format(index) for index in range(50)]
+    assert browser.scrolls == 2  # no scrolling beyond the limit
+
+
+def test_collect_image_links_stops_at_end():
+    browser = InfiniteScrollChrome(images_per_scroll=20, max_images=60)
+    links = get_collect_links(browser).collect_image_links("img")
+    assert len(links) == 60
+    assert browser.scrolls == 2 + SCROLL_PATIENCE
+
+
+def test_reset_clears_all_origins():
+    browser = MagicMock()
+    browser.current_url = "https://consent.google.com/ml?continue=x"
+    collect = get_collect_links(browser)
+    collect.open("https://www.google.com/search?q=Berlin")
+    collect.open("https://www.pinterest.de/search/pins/?q=Berlin")
+    collect.reset()
+
+    assert browser.get.call_args_list[-1][0] == ("about:blank",)
+    cdp_commands = [call[0] for call in browser.execute_cdp_cmd.call_args_list]
+    assert cdp_commands[0] == ("Network.clearBrowserCookies", {})  # cookies of all domains
+    assert sorted(params["origin"] for command, params in cdp_commands[1:]) == [
+        "https://consent.google.com",  # redirected to
+        "https://www.google.com",
+        "https://www.pinterest.de",
+    ]
+    assert collect.visited_origins == set()
+
+
+def test_get_origin():
+    assert get_origin("https://www.google.com:443/search?q=x") == "https://www.google.com:443"
+    assert get_origin("about:blank") is None
+    assert get_origin("data:image/png;base64,AAAA") is None
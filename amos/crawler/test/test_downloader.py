@@ -0,0 +1,74 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from mmap import mmap
+from threading import Thread
+
+from downloader import ImageDownloader
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/missing"):
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.end_headers()
+        self.wfile.write(self.path.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_images():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_iter_downloads():
+    server = serve_images()
+    url = "http://127.0.0.1:{}".format(server.server_address[1])
+    links = ["{}/{}.png".format(url, index) for index in range(50)] + [
+        "{}/missing.png".format(url),
+        "data:image/png;base64,dGVzdA==",
+    ]
+    try:
+        with ImageDownloader(max_in_flight=8, max_per_host=2, max_retries=0) as downloader:
+            downloads = {
+                index: (link, bytes(image) if image is not None else None)  # lent until the next download
+                for index, link, image in downloader.iter_downloads(links)
+            }
+    finally:
+        server.shutdown()
+
+    assert sorted(downloads) == list(range(52))
+    assert downloads[7] == (links[7], b"/7.png")
+    assert downloads[50] == (links[50], None)  # failed downloads are yielded as well
+    assert downloads[51] == (links[51], b"test")
+
+
+def test_iter_downloads_stopped_early():
+    server = serve_images()
+    links = ["http://127.0.0.1:{}/{}.png".format(server.server_address[1], index) for index in range(1000)]
+    try:
+        with ImageDownloader(max_in_flight=4) as downloader:
+            downloads = downloader.iter_downloads(links)
+            assert len([next(downloads) for _ in range(5)]) == 5
+            downloads.close()  # cancels the pending downloads
+    finally:
+        server.shutdown()
+
+
+def test_iter_downloads_spilled():
+    server = serve_images()
+    links = ["http://127.0.0.1:{}/{}.png".format(server.server_address[1], "a" * 100)]
+    try:
+        with ImageDownloader(spool_bytes=10) as downloader:
+            for _, _, image in downloader.iter_downloads(links):
+                spill_mapping = image.obj
+                assert isinstance(spill_mapping, mmap)  # spilled to a memory-mapped file
+                assert image == "/{}.png".format("a" * 100).encode()
+    finally:
+        server.shutdown()
+
+    assert spill_mapping.closed  # unmapped once the next download has been requested
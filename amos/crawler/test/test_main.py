@@ -0,0 +1,55 @@
+from collections import Counter
+from io import BytesIO
+
+from mock import MagicMock, patch
+from PIL import Image
+
+from main import AutoCrawler
+
+
+def get_image(size=(64, 48)):
+    image_file = BytesIO()
+    Image.new("RGB", size).save(image_file, format="JPEG")
+    return memoryview(image_file.getvalue())
+
+
+def test_save_image():
+    image = get_image()
+    image_writer = MagicMock()
+    assert AutoCrawler.save_image("https://cdn.test.com/a.jpg", image, "Berlin", image_writer, tag="Tor") is True
+    image_writer.write.assert_called_once_with(image, 64, 48, "https://cdn.test.com/a.jpg", "Berlin", tag="Tor")
+
+
+def test_save_image_unreadable():
+    image_writer = MagicMock()
+    image = memoryview(b"<html></html>")
+    assert AutoCrawler.save_image("https://cdn.test.com/a.jpg", image, "Berlin", image_writer) is False
+    assert not image_writer.write.called
+
+
+def test_validate_image():
+    image_file = BytesIO()
+    Image.new("RGB", (8, 8)).save(image_file, format="PNG")
+    assert AutoCrawler.validate_image(memoryview(image_file.getvalue())) == "png"
+
+
+def test_download_images_stops_at_max_count():
+    links = ["https://cdn.test.com/{}.jpg".format(index) for index in range(10)]
+    # like the real writer, images are only counted once a batch is flushed, which never happens during the downloads
+    image_writer = MagicMock()
+    image_writer.pushed_images_by_tag = Counter()
+    downloaded_images = [get_image() for _ in links]
+    downloaded_images[1] = memoryview(b"<html></html>")  # not saved, hence not counted
+    downloader = MagicMock()
+    downloader.__enter__.return_value = downloader
+    downloader.iter_downloads.return_value = ((index, link, image)
+                                              for index, (link, image) in enumerate(zip(links, downloaded_images)))
+
+    with patch("main.ImageDownloader", return_value=downloader):
+        crawler = AutoCrawler.__new__(AutoCrawler)
+        crawler.download_workers, crawler.downloads_per_host, crawler.download_spool_bytes = 4, 2, 0
+        crawler.region = "Berlin"
+        crawler.download_images("Tor", links, "google", image_writer, max_count=3)
+
+    assert image_writer.write.call_count == 3  # no image beyond max_count is written
+    assert [call[0][3] for call in image_writer.write.call_args_list] == [links[0], links[2], links[3]]
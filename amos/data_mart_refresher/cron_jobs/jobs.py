@@ -107,9 +107,12 @@ def _get_city_name_for_training() -> Optional[str]:
 
 
 def trigger_data_marts_refresh() -> None:
-    """Triggers an update of all data marts included in the DWH."""
-    postgres_fct_call = "SELECT RefreshAllMaterializedViews('data_mart_layer')"
-    exec_sql(postgres_fct_call)
+    """Triggers an incremental update of the DWH data marts, i.e. only images changed since the last refresh are
+    rewritten in the data marts of their cities."""
+    postgres_fct_call = "SELECT refresh_dirty_data_marts()"
+    n_refreshed_images = exec_sql(postgres_fct_call, return_result=True)
+    if n_refreshed_images:
+        print(f"Refreshed {n_refreshed_images} data mart images.")
 
 
 def _notify_external_ils(dwh_sql: str, post_base_url: str, optional_path_param=None) -> bool:
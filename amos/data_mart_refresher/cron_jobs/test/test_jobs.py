@@ -31,11 +31,11 @@ def test_trigger_city_image_labelling(no_city_label_yet):
 def test_trigger_data_marts_refresh():
     from cron_jobs.jobs import trigger_data_marts_refresh
 
-    with patch("cron_jobs.jobs.exec_sql") as exec_sql:
+    with patch("cron_jobs.jobs.exec_sql", return_value=3) as exec_sql:
         assert exec_sql.called is False
         trigger_data_marts_refresh()
         assert exec_sql.called
-        assert exec_sql.call_args[0][0] == "SELECT RefreshAllMaterializedViews('data_mart_layer')"
+        assert exec_sql.call_args[0][0] == "SELECT refresh_dirty_data_marts()"  # only changed images are rewritten
 
 
 @pytest.mark.parametrize(
@@ -0,0 +1,18 @@
+"""This module contains the URLs exposed by the api subapp when served asynchronously via ASGI."""
+from django.urls import path
+from . import async_views
+
+urlpatterns = [
+    path("cities/<city>/image", async_views.persist_sight_image, name="persist_sight_image"),
+    path("cities/<city>/images", async_views.persist_sight_images, name="persist_sight_images"),
+    path("cities/<city>/model", async_views.get_trained_city_model, name="get_trained_city_model"),
+    path("cities/<city>/model/meta", async_views.get_city_model_metadata, name="get_city_model_metadata"),
+    path("cities/<city>/model/version", async_views.get_latest_city_model_version,
+         name="get_latest_city_model_version"),
+    path("cities/", async_views.get_supported_cities, name="get_supported_cities"),
+    path("cities/<city>/add", async_views.add_new_city, name="add_new_city"),
+    path("crawler/jobs/<job_id>", async_views.get_crawler_job, name="get_crawler_job"),
+    path("models/meta", async_views.get_models_metadata, name="get_models_metadata"),
+    path("pool/stats", async_views.get_connection_pool_stats, name="get_connection_pool_stats"),
+    path("", async_views.get_index, name="get_index")
+]
@@ -0,0 +1,295 @@
+"""This module contains the asynchronous counterparts of the views exposed to the user, used when served via ASGI.
+
+The view handlers block on the pooled data warehouse connections and on the model cache, hence they are run in worker
+threads while the event loop keeps serving other requests. Model downloads are streamed chunk by chunk in the same way.
+"""
+from functools import partial, wraps
+from typing import AsyncIterator, BinaryIO, Callable, Iterator, List, Union
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest, HttpResponse, HttpResponseNotAllowed
+from django.http.response import HttpResponseBase
+from api.view_responses import (
+    respond_get_trained_city_model,
+    respond_persist_sight_image,
+    respond_persist_sight_images,
+    respond_add_new_city,
+    respond_get_supported_cities,
+    respond_get_latest_city_model_version,
+    respond_get_connection_pool_stats,
+    respond_get_city_model_metadata,
+    respond_get_models_metadata,
+    respond_get_crawler_job,
+    respond_get_index,
+)
+from data_django.handler import MODEL_DOWNLOAD_CHUNK_BYTES
+
+
+def _async_api_view(allowed_methods: List[str]) -> Callable:
+    """Restricts an async view to the given HTTP methods and exempts it from CSRF checks, like DRF's api_view.
+
+    Parameters
+    ----------
+    allowed_methods: list[str]
+        Allowed HTTP methods.
+
+    Returns
+    -------
+    decorator: callable
+        Decorator for async views.
+    """
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        async def wrapped_view(request: HttpRequest, *args, **kwargs) -> HttpResponseBase:
+            if request.method not in allowed_methods:
+                return HttpResponseNotAllowed(allowed_methods)
+            return await view(request, *args, **kwargs)
+
+        wrapped_view.csrf_exempt = True
+        return wrapped_view
+
+    return decorator
+
+
+def _run_in_thread(function: Callable) -> Callable:
+    """Returns an awaitable version of a blocking function that runs outside of the event loop.
+
+    Parameters
+    ----------
+    function: callable
+        Blocking function.
+
+    Returns
+    -------
+    async_function: callable
+        Awaitable function executed in a worker thread.
+    """
+    return sync_to_async(function, thread_sensitive=False)
+
+
+async def _iterate_in_thread(content: Union[Iterator[bytes], BinaryIO]) -> AsyncIterator[bytes]:
+    """Yields the chunks of a blocking model iterator or file without blocking the event loop.
+
+    Parameters
+    ----------
+    content: iterator[bytes] or BinaryIO
+        Model chunks or opened model file.
+
+    Yields
+    ------
+    chunk: bytes
+        Next model chunk.
+    """
+    chunks = iter(partial(content.read, MODEL_DOWNLOAD_CHUNK_BYTES), b'') if hasattr(content, 'read') \
+        else iter(content)
+    next_chunk = _run_in_thread(next)
+
+    try:
+        while True:
+            chunk = await next_chunk(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        if hasattr(content, 'close'):
+            content.close()
+
+
+@_async_api_view(["GET"])
+async def get_trained_city_model(request: HttpRequest, city: str) -> HttpResponseBase:
+    """Returns a trained city model as a .pt file.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    response: HttpResponseBase
+        Response object streaming the trained model as a .pt file.
+    """
+    return await _run_in_thread(respond_get_trained_city_model)(request, city, stream_content=_iterate_in_thread)
+
+
+@_async_api_view(["GET"])
+async def get_city_model_metadata(request: HttpRequest, city: str) -> HttpResponse:
+    """Returns the version, size, SHA-256 hash, id and class names of a city's current model.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the JSON serialized model metadata.
+    """
+    return await _run_in_thread(respond_get_city_model_metadata)(request, city)
+
+
+@_async_api_view(["GET"])
+async def get_models_metadata(request: HttpRequest) -> HttpResponse:
+    """Returns the current model metadata of all requested (by default: all supported) cities at once.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object, optionally carrying the comma-separated cities query parameter.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the JSON serialized model metadata.
+    """
+    return await _run_in_thread(respond_get_models_metadata)(request)
+
+
+@_async_api_view(["GET"])
+async def get_latest_city_model_version(request: HttpRequest, city: str) -> HttpResponse:
+    """Returns the latest version of the persisted city model.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the latest model version.
+    """
+    return await _run_in_thread(respond_get_latest_city_model_version)(request, city)
+
+
+@_async_api_view(["POST"])
+async def persist_sight_image(request: HttpRequest, city: str) -> HttpResponse:
+    """Persists an image of a given supported city in the data warehouse.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing a status message.
+    """
+    return await _run_in_thread(respond_persist_sight_image)(request, city)  # parsing the body blocks as well
+
+
+@_async_api_view(["POST"])
+async def persist_sight_images(request: HttpRequest, city: str) -> HttpResponse:
+    """Persists a batch of images of a given city, sent as multipart form data or as a tar or zip archive.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the outcome per image.
+    """
+    return await _run_in_thread(respond_persist_sight_images)(request, city)  # reading the body blocks as well
+
+
+@_async_api_view(["POST"])
+async def add_new_city(request: HttpRequest, city: str) -> HttpResponse:
+    """Adds a new city to the internally managed list of supported cities.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+    city: str
+        Name of the city to add.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the id of the city's crawler job, if any.
+    """
+    return await _run_in_thread(respond_add_new_city)(request, city)
+
+
+@_async_api_view(["GET"])
+async def get_crawler_job(request: HttpRequest, job_id: str) -> HttpResponse:
+    """Returns the status of a crawler job.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+    job_id: str
+        Id of the crawler job.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the JSON serialized job.
+    """
+    return await _run_in_thread(respond_get_crawler_job)(request, job_id)
+
+
+@_async_api_view(["GET"])
+async def get_supported_cities(request: HttpRequest) -> HttpResponse:
+    """Returns a list containing the currently supported cities.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the list of supported cities.
+    """
+    return await _run_in_thread(respond_get_supported_cities)(request)
+
+
+@_async_api_view(["GET"])
+async def get_connection_pool_stats(request: HttpRequest) -> HttpResponse:
+    """Returns the usage statistics of the data warehouse connection pool of the serving worker.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the connection pool statistics.
+    """
+    return respond_get_connection_pool_stats(request)  # in-memory only, no need to leave the event loop
+
+
+@_async_api_view(["GET"])
+async def get_index(request: HttpRequest) -> HttpResponse:
+    """Returns a default 200 HTTP code.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing a default 200 status code.
+    """
+    return respond_get_index(request)
@@ -0,0 +1,399 @@
+"""This module contains the background queue dispatching image crawler runs for newly requested cities.
+
+The state of the jobs is kept in the data warehouse, hence every worker reports every job and a city is crawled by at
+most one worker at a time. Jobs are run by the dispatch thread of the worker that created them.
+"""
+import os
+import shlex
+import subprocess
+from abc import ABC, abstractmethod
+from queue import Queue
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, Optional
+from uuid import uuid4
+import paramiko
+from data_django.crawler_jobs import create_crawler_job, update_crawler_job, get_crawler_job, \
+    get_latest_city_crawler_job
+
+JOB_STATUS_QUEUED = 'queued'
+JOB_STATUS_RUNNING = 'running'
+JOB_STATUS_SUCCEEDED = 'succeeded'
+JOB_STATUS_FAILED = 'failed'
+
+_DISPATCH_QUEUE: Optional['CrawlerDispatchQueue'] = None
+_DISPATCH_QUEUE_LOCK = Lock()
+
+
+class CrawlerExecutor(ABC):
+    """Runs crawler commands, raises an exception if a command could not be started successfully."""
+
+    @abstractmethod
+    def run(self, command: str) -> None:
+        """Runs the passed command.
+
+        Parameters
+        ----------
+        command: str
+            Shell command starting the crawler.
+        """
+
+    def close(self) -> None:
+        """Releases all resources held by the executor."""
+
+
+class SSHCrawlerExecutor(CrawlerExecutor):
+    """Runs crawler commands on the remote image crawler host via a single, reused SSH connection.
+
+    Parameters
+    ----------
+    hostname: str
+        Image crawler host.
+    username: str
+        SSH user.
+    key_file: str
+        Path of the private RSA key.
+    timeout_seconds: float, default=30
+        Connection and command timeout.
+    """
+
+    def __init__(self, hostname: str, username: str, key_file: str, timeout_seconds: float = 30.0):
+        self._hostname, self._username, self._key_file = hostname, username, key_file
+        self._timeout_seconds = timeout_seconds
+        self._ssh_client: Optional[paramiko.SSHClient] = None
+
+    def run(self, command: str) -> None:
+        """Runs the passed command remotely, reconnecting first if the connection has been lost.
+
+        Parameters
+        ----------
+        command: str
+            Shell command starting the crawler.
+
+        Raises
+        ------
+        RuntimeError
+            If the command exited with a non-zero status.
+        """
+        _, stdout, stderr = self._get_ssh_client().exec_command(command, timeout=self._timeout_seconds)
+        exit_status = stdout.channel.recv_exit_status()
+        if exit_status != 0:
+            raise RuntimeError(f'Crawler command exited with status {exit_status}: {stderr.read().decode()}')
+
+    def close(self) -> None:
+        """Closes the SSH connection."""
+        if self._ssh_client is not None:
+            self._ssh_client.close()
+            self._ssh_client = None
+
+    def _get_ssh_client(self) -> paramiko.SSHClient:
+        """Returns the connected SSH client, (re)connecting if needed.
+
+        Returns
+        -------
+        ssh_client: paramiko.SSHClient
+            Connected SSH client.
+        """
+        transport = self._ssh_client.get_transport() if self._ssh_client is not None else None
+        if transport is None or not transport.is_active():
+            self.close()
+            ssh_client = paramiko.SSHClient()
+            ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh_client.connect(hostname=self._hostname, username=self._username,
+                               pkey=paramiko.RSAKey.from_private_key_file(self._key_file),
+                               timeout=self._timeout_seconds)
+            self._ssh_client = ssh_client
+
+        return self._ssh_client
+
+
+class LocalSubprocessCrawlerExecutor(CrawlerExecutor):
+    """Runs crawler commands as local subprocesses, e.g. for tests or single-host setups.
+
+    Parameters
+    ----------
+    timeout_seconds: float, default=30
+        Command timeout.
+    """
+
+    def __init__(self, timeout_seconds: float = 30.0):
+        self._timeout_seconds = timeout_seconds
+
+    def run(self, command: str) -> None:
+        """Runs the passed command locally.
+
+        Parameters
+        ----------
+        command: str
+            Shell command starting the crawler.
+
+        Raises
+        ------
+        subprocess.CalledProcessError
+            If the command exited with a non-zero status.
+        """
+        subprocess.run(shlex.split(command), check=True, capture_output=True, timeout=self._timeout_seconds)
+
+
+class CrawlerJob:
+    """Crawler run of a single city, updated by the dispatch thread of the worker that created it.
+
+    Parameters
+    ----------
+    job_id: str
+        Id of the job.
+    city: str
+        Upper case name of the city to crawl.
+    status: str, default='queued'
+        One of queued, running, succeeded or failed.
+    n_attempts: int, default=0
+        Number of dispatch attempts so far.
+    last_error: str or None, default=None
+        Error of the last failed attempt.
+    """
+
+    def __init__(self, job_id: str, city: str, status: str = JOB_STATUS_QUEUED, n_attempts: int = 0,
+                 last_error: Optional[str] = None):
+        self.job_id = job_id
+        self.city = city
+        self.status = status
+        self.n_attempts = n_attempts
+        self.last_error = last_error
+
+    def to_dict(self) -> Dict[str, object]:
+        """Returns the JSON serializable representation of the job.
+
+        Returns
+        -------
+        job: dict[str, object]
+            Job id, city, status, number of attempts and the last error (if any).
+        """
+        return {'job_id': self.job_id, 'city': self.city, 'status': self.status, 'n_attempts': self.n_attempts,
+                'last_error': self.last_error}
+
+
+class CrawlerDispatchQueue:
+    """Background queue dispatching crawler runs one after another with retries and exponential backoff.
+
+    Parameters
+    ----------
+    executor: CrawlerExecutor
+        Executor running the crawler commands, only used by the dispatch thread.
+    command_factory: callable
+        Function returning the crawler command for a given city.
+    max_attempts: int, default=3
+        Maximum number of attempts per job.
+    backoff_seconds: float, default=5
+        Delay before the first retry, doubled for every further retry.
+    stale_seconds: float, default=600
+        Queued and running jobs not updated for this duration are considered lost, e.g. because their worker has been
+        restarted, and are replaced by the next submission for their city.
+    """
+
+    def __init__(self, executor: CrawlerExecutor, command_factory: Callable[[str], str], max_attempts: int = 3,
+                 backoff_seconds: float = 5.0, stale_seconds: float = 600.0):
+        self.pid = os.getpid()  # the dispatch thread does not survive forks
+        self._executor = executor
+        self._command_factory = command_factory
+        self._max_attempts = max_attempts
+        self._backoff_seconds = backoff_seconds
+        self._stale_seconds = stale_seconds
+        self._queue: 'Queue[Optional[CrawlerJob]]' = Queue()
+        self._stop_event = Event()
+        self._thread = Thread(target=self._dispatch_jobs, name='crawler-dispatch', daemon=True)
+        self._thread.start()
+
+    def submit(self, city: str) -> Optional[CrawlerJob]:
+        """Enqueues a crawler run for the passed city unless one is already queued, running or succeeded on any worker.
+
+        Parameters
+        ----------
+        city: str
+            Name of the city to crawl.
+
+        Returns
+        -------
+        job: CrawlerJob or None
+            New or already existing job of the city, None if the job could not be created.
+        """
+        job_id = uuid4().hex
+        job_row = create_crawler_job(job_id, city.upper(), self._stale_seconds)
+        if job_row is None:
+            print(f'Crawler job for {city.upper()} could not be created.')
+            return None
+
+        job = CrawlerJob(*job_row)
+        if job.job_id == job_id:  # otherwise the city's job is already handled
+            self._queue.put(job)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[CrawlerJob]:
+        """Returns the job with the passed id.
+
+        Parameters
+        ----------
+        job_id: str
+            Job id.
+
+        Returns
+        -------
+        job: CrawlerJob or None
+            Found job, None if it is unknown.
+        """
+        job_row = get_crawler_job(job_id)
+        return CrawlerJob(*job_row) if job_row is not None else None
+
+    def get_city_job(self, city: str) -> Optional[CrawlerJob]:
+        """Returns the latest job of the passed city.
+
+        Parameters
+        ----------
+        city: str
+            Name of the city.
+
+        Returns
+        -------
+        job: CrawlerJob or None
+            Latest job of the city, None if no crawler run has been dispatched yet.
+        """
+        job_row = get_latest_city_crawler_job(city.upper())
+        return CrawlerJob(*job_row) if job_row is not None else None
+
+    def close(self, timeout_seconds: Optional[float] = None) -> None:
+        """Stops the dispatch thread once all previously submitted jobs are done and closes the executor.
+
+        Parameters
+        ----------
+        timeout_seconds: float or None, default=None
+            Maximum time to wait for the remaining jobs, pending retries are cancelled afterwards.
+        """
+        self._queue.put(None)
+        self._thread.join(timeout_seconds)
+        self._stop_event.set()
+        self._executor.close()
+
+    def _dispatch_jobs(self) -> None:
+        """Runs the queued jobs until the queue is closed."""
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            self._run_job(job)
+
+    def _run_job(self, job: CrawlerJob) -> None:
+        """Runs a single job, retrying failed attempts with exponential backoff.
+
+        Parameters
+        ----------
+        job: CrawlerJob
+            Job to run.
+        """
+        command = self._command_factory(job.city)
+
+        while job.n_attempts < self._max_attempts and not self._stop_event.is_set():
+            job.status, job.n_attempts = JOB_STATUS_RUNNING, job.n_attempts + 1
+            if not self._save_job(job):
+                return
+            print(f'Dispatching crawler job {job.job_id} for {job.city} (attempt {job.n_attempts})...')
+            try:
+                self._executor.run(command)
+                job.status, job.last_error = JOB_STATUS_SUCCEEDED, None
+                self._save_job(job)
+                return
+            except Exception as exc:  # any executor failure is retried
+                job.last_error = str(exc)
+                self._executor.close()  # reconnect on the next attempt
+                print(f'Crawler job {job.job_id} for {job.city} failed: {exc}')
+
+            if job.n_attempts < self._max_attempts:
+                self._stop_event.wait(self._backoff_seconds * 2 ** (job.n_attempts - 1))
+
+        job.status = JOB_STATUS_FAILED
+        self._save_job(job)
+
+    @staticmethod
+    def _save_job(job: CrawlerJob) -> bool:
+        """Persists the state of a job in the data warehouse.
+
+        Parameters
+        ----------
+        job: CrawlerJob
+            Job to persist.
+
+        Returns
+        -------
+        is_saved: bool
+            Whether the job has been saved, False if it has been marked as lost in the meantime and must not run.
+        """
+        if update_crawler_job(job.job_id, job.status, job.n_attempts, job.last_error):
+            return True
+
+        print(f'Crawler job {job.job_id} for {job.city} could not be saved or has been marked as lost, skipping it.')
+        return False
+
+
+def get_crawler_dispatch_queue() -> CrawlerDispatchQueue:
+    """Returns the crawler dispatch queue of the current process, creating it lazily.
+
+    Returns
+    -------
+    dispatch_queue: CrawlerDispatchQueue
+        Process-wide crawler dispatch queue.
+
+    Notes
+    -----
+    The executor is selected via CRAWLER_EXECUTOR (ssh (default) or local), retries are configured via
+    CRAWLER_DISPATCH_MAX_ATTEMPTS (default: 3) and CRAWLER_DISPATCH_BACKOFF_SECONDS (default: 5), lost jobs are
+    detected after CRAWLER_JOB_STALE_SECONDS (default: 600).
+    """
+    global _DISPATCH_QUEUE
+
+    with _DISPATCH_QUEUE_LOCK:
+        if _DISPATCH_QUEUE is None or _DISPATCH_QUEUE.pid != os.getpid():
+            _DISPATCH_QUEUE = CrawlerDispatchQueue(
+                _create_crawler_executor(),
+                _get_crawler_docker_run_command,
+                max_attempts=int(os.getenv('CRAWLER_DISPATCH_MAX_ATTEMPTS', 3)),
+                backoff_seconds=float(os.getenv('CRAWLER_DISPATCH_BACKOFF_SECONDS', 5)),
+                stale_seconds=float(os.getenv('CRAWLER_JOB_STALE_SECONDS', 600)),
+            )
+
+    return _DISPATCH_QUEUE
+
+
+def _create_crawler_executor() -> CrawlerExecutor:
+    """Returns the crawler executor configured via the CRAWLER_EXECUTOR environment variable.
+
+    Returns
+    -------
+    executor: CrawlerExecutor
+        Configured crawler executor.
+    """
+    if os.getenv('CRAWLER_EXECUTOR', 'ssh').lower() == 'local':
+        return LocalSubprocessCrawlerExecutor()
+
+    return SSHCrawlerExecutor(hostname=os.getenv('IC_URL'), username='ubuntu', key_file='ec2key.pem')
+
+
+def _get_crawler_docker_run_command(city: str) -> str:
+    """Returns the docker run command needed to trigger the crawler.
+
+    Parameters
+    ----------
+    city: str
+        City to crawl sights for.
+
+    Returns
+    -------
+    run_command: str
+        Docker run command for the crawler.
+    """
+    return 'sudo docker run -d ' \
+           f'-e PGHOST={os.getenv("PGHOST")} ' \
+           f'-e PGDATABASE={os.getenv("PGDATABASE")} ' \
+           f'-e PGUSER={os.getenv("PGUSER")} ' \
+           f'-e PGPORT={os.getenv("PGPORT")} ' \
+           f'-e PGPASSWORD={os.getenv("PGPASSWORD")} ' \
+           f'-e MAPS_KEY={os.getenv("MAPS_KEY")} ' \
+           f'-it crawler {city} ' \
+           f'--sights_limit={os.getenv("MAX_SIGHTS_PER_CITY")} ' \
+           f'--limit={os.getenv("MAX_IMAGES_PER_SIGHT")}'
@@ -0,0 +1,154 @@
+"""This module contains the tests for the async_views module of the api sub-app."""
+import asyncio
+import json
+import os
+from io import BytesIO
+import django
+from mock import patch
+import pytest
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_orchestrator.settings')
+django.setup()
+
+from django.test import RequestFactory  # noqa: E402
+from api import async_views  # noqa: E402
+from api.async_views import _iterate_in_thread  # noqa: E402
+from api.view_handlers import HTTP_400_MESSAGE, HTTP_404_JOB_MESSAGE, HTTP_415_MESSAGE  # noqa: E402
+from data_django.handler import ModelMetadata  # noqa: E402
+
+MODULE_PATH = 'api.async_views'
+HANDLERS_PATH = 'api.view_handlers'
+
+
+async def _collect(content):
+    return [chunk async for chunk in _iterate_in_thread(content)]
+
+
+async def _read_streaming_content(response):
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+def test_iterate_in_thread_iterator():
+    assert asyncio.run(_collect(iter([b'0123', b'45']))) == [b'0123', b'45']
+
+
+def test_iterate_in_thread_file():
+    model_file = BytesIO(b'0123456789')
+    with patch(f'{MODULE_PATH}.MODEL_DOWNLOAD_CHUNK_BYTES', 4):
+        assert asyncio.run(_collect(model_file)) == [b'0123', b'4567', b'89']
+    assert model_file.closed
+
+
+def test_get_trained_city_model():
+    request = RequestFactory().get('/api/cities/berlin/model', HTTP_RANGE='bytes=2-5')
+    with patch(f'{HANDLERS_PATH}.is_valid_city', return_value=True), \
+         patch(f'{HANDLERS_PATH}.get_model_metadata', return_value=ModelMetadata(7, 3, 10)), \
+         patch(f'{HANDLERS_PATH}.get_cached_model_file', return_value=None), \
+         patch(f'{HANDLERS_PATH}.iter_model_chunks', return_value=iter([b'23', b'45'])):
+        response = asyncio.run(async_views.get_trained_city_model(request, 'berlin'))
+        assert response.status_code == 206
+        assert response['Content-Range'] == 'bytes 2-5/10'
+        assert asyncio.run(_read_streaming_content(response)) == b'2345'
+
+
+@pytest.mark.parametrize('is_valid, metadata, if_none_match, status', [
+    (False, None, None, 400),
+    (True, None, None, 404),
+    (True, ModelMetadata(7, 3, 10), '"7-3"', 304),
+])
+def test_get_trained_city_model_not_streamed(is_valid, metadata, if_none_match, status):
+    headers = {'HTTP_IF_NONE_MATCH': if_none_match} if if_none_match else {}
+    request = RequestFactory().get('/api/cities/berlin/model', **headers)
+    with patch(f'{HANDLERS_PATH}.is_valid_city', return_value=is_valid), \
+         patch(f'{HANDLERS_PATH}.get_model_metadata', return_value=metadata):
+        response = asyncio.run(async_views.get_trained_city_model(request, 'berlin'))
+        assert response.status_code == status
+        assert not response.streaming
+
+
+def test_get_city_model_metadata():
+    request = RequestFactory().get('/api/cities/berlin/model/meta')
+    with patch(f'{HANDLERS_PATH}.is_valid_city', return_value=True), \
+         patch(f'{HANDLERS_PATH}.get_model_metadata', return_value=ModelMetadata(7, 3, 10)):
+        response = asyncio.run(async_views.get_city_model_metadata(request, 'berlin'))
+        assert response.status_code == 200
+        assert response['ETag'] == '"7-3"'
+        assert json.loads(response.content)['version'] == 3
+
+
+def test_get_city_model_metadata_invalid_city():
+    request = RequestFactory().get('/api/cities/atlantis/model/meta')
+    with patch(f'{HANDLERS_PATH}.is_valid_city', return_value=False):
+        response = asyncio.run(async_views.get_city_model_metadata(request, 'atlantis'))
+        assert response.status_code == 400
+        assert response.content.decode() == HTTP_400_MESSAGE
+
+
+def test_get_models_metadata_invalid_city():
+    request = RequestFactory().get('/api/models/meta', {'cities': 'berlin,atlantis'})
+    with patch(f'{HANDLERS_PATH}.is_valid_city', side_effect=lambda city: city == 'berlin'):
+        response = asyncio.run(async_views.get_models_metadata(request))
+        assert response.status_code == 400
+
+
+def test_get_latest_city_model_version():
+    request = RequestFactory().get('/api/cities/berlin/model/version')
+    with patch(f'{HANDLERS_PATH}.is_valid_city', return_value=True), \
+         patch(f'{HANDLERS_PATH}.get_latest_model_version', return_value=4):
+        response = asyncio.run(async_views.get_latest_city_model_version(request, 'berlin'))
+        assert response.content == b'4'
+
+
+def test_persist_sight_image_missing_image():
+    request = RequestFactory().post('/api/cities/berlin/image', {})
+    with patch(f'{HANDLERS_PATH}.is_valid_image_upload', return_value=False) as is_valid_image_upload:
+        response = asyncio.run(async_views.persist_sight_image(request, 'berlin'))
+        assert response.status_code == 400
+        is_valid_image_upload.assert_called_with('berlin', None)
+
+
+def test_persist_sight_images_unsupported_format():
+    request = RequestFactory().post('/api/cities/berlin/images', b'{}', content_type='application/json')
+    with patch(f'{HANDLERS_PATH}.is_valid_city', return_value=True):
+        response = asyncio.run(async_views.persist_sight_images(request, 'berlin'))
+        assert response.status_code == 415
+        assert response.content.decode() == HTTP_415_MESSAGE
+
+
+def test_add_new_city():
+    request = RequestFactory().post('/api/cities/atlantis/add')
+    with patch(f'{HANDLERS_PATH}.is_city_existing', return_value=True), \
+         patch(f'{HANDLERS_PATH}.get_crawler_dispatch_queue') as dispatch_queue:
+        dispatch_queue.return_value.get_city_job.return_value = None
+        response = asyncio.run(async_views.add_new_city(request, 'atlantis'))
+        assert json.loads(response.content) == {'job_id': None}
+
+
+def test_get_crawler_job_unknown():
+    request = RequestFactory().get('/api/crawler/jobs/unknown')
+    with patch(f'{HANDLERS_PATH}.get_crawler_dispatch_queue') as dispatch_queue:
+        dispatch_queue.return_value.get_job.return_value = None
+        response = asyncio.run(async_views.get_crawler_job(request, 'unknown'))
+        assert response.status_code == 404
+        assert response.content.decode() == HTTP_404_JOB_MESSAGE
+
+
+def test_get_supported_cities_not_modified():
+    request = RequestFactory().get('/api/cities/', HTTP_IF_NONE_MATCH='"etag"')
+    with patch(f'{HANDLERS_PATH}.get_city_registry') as get_city_registry:
+        get_city_registry.return_value.etag = '"etag"'
+        response = asyncio.run(async_views.get_supported_cities(request))
+        assert response.status_code == 304
+        assert response['ETag'] == '"etag"'
+
+
+def test_get_connection_pool_stats():
+    with patch(f'{HANDLERS_PATH}.get_connection_pool_stats', return_value={'size': 4}):
+        response = asyncio.run(async_views.get_connection_pool_stats(RequestFactory().get('/api/pool/stats')))
+        assert json.loads(response.content) == {'size': 4}
+
+
+def test_method_not_allowed():
+    response = asyncio.run(async_views.get_index(RequestFactory().post('/api/')))
+    assert response.status_code == 405
+    assert asyncio.run(async_views.get_index(RequestFactory().get('/api/'))).status_code == 200
@@ -0,0 +1,163 @@
+"""This module contains the tests for the crawler_dispatch module of the api sub-app."""
+import sys
+from mock import patch
+import pytest
+from api.crawler_dispatch import CrawlerDispatchQueue, CrawlerExecutor, LocalSubprocessCrawlerExecutor, \
+    _get_crawler_docker_run_command, JOB_STATUS_FAILED, JOB_STATUS_SUCCEEDED
+
+MODULE_PATH = 'api.crawler_dispatch'
+
+
+class CrawlerJobsTableMock:
+    def __init__(self):
+        self.rows = {}
+
+    def create(self, job_id, city, stale_seconds):
+        for row in self.rows.values():
+            if row[1] == city and row[2] != JOB_STATUS_FAILED:
+                return tuple(row)
+        self.rows[job_id] = [job_id, city, 'queued', 0, None]
+        return tuple(self.rows[job_id])
+
+    def update(self, job_id, status, n_attempts, last_error):
+        row = self.rows.get(job_id)
+        if row is None or row[2] == JOB_STATUS_FAILED:
+            return False
+        row[2:] = [status, n_attempts, last_error]
+        return True
+
+    def get(self, job_id):
+        return tuple(self.rows[job_id]) if job_id in self.rows else None
+
+    def get_latest(self, city):
+        rows = [row for row in self.rows.values() if row[1] == city]
+        return tuple(rows[-1]) if rows else None
+
+
+class FlakyExecutorMock(CrawlerExecutor):
+    def __init__(self, n_failures):
+        self.n_failures, self.commands, self.n_closed = n_failures, [], 0
+
+    def run(self, command):
+        self.commands.append(command)
+        if len(self.commands) <= self.n_failures:
+            raise RuntimeError('crawler host unreachable')
+
+    def close(self):
+        self.n_closed += 1
+
+
+def _python_command(exit_code):
+    return lambda city: f'{sys.executable} -c "import sys; sys.exit({exit_code})"'
+
+
+@pytest.fixture(autouse=True)
+def crawler_jobs_table():
+    table = CrawlerJobsTableMock()
+    with patch(f'{MODULE_PATH}.create_crawler_job', side_effect=table.create), \
+         patch(f'{MODULE_PATH}.update_crawler_job', side_effect=table.update), \
+         patch(f'{MODULE_PATH}.get_crawler_job', side_effect=table.get), \
+         patch(f'{MODULE_PATH}.get_latest_city_crawler_job', side_effect=table.get_latest):
+        yield table
+
+
+@pytest.fixture
+def dispatch_queues():
+    created_queues = []
+    yield created_queues
+    for dispatch_queue in created_queues:
+        dispatch_queue.close(timeout_seconds=5)
+
+
+def _wait_for(dispatch_queue, job):
+    dispatch_queue.close(timeout_seconds=5)  # processes all previously queued jobs first
+    return job
+
+
+@pytest.mark.parametrize('exit_code, expected_status, expected_attempts', [(0, JOB_STATUS_SUCCEEDED, 1),
+                                                                           (1, JOB_STATUS_FAILED, 2)])
+def test_local_subprocess_executor(exit_code, expected_status, expected_attempts):
+    dispatch_queue = CrawlerDispatchQueue(LocalSubprocessCrawlerExecutor(), _python_command(exit_code),
+                                          max_attempts=2, backoff_seconds=0)
+    job = _wait_for(dispatch_queue, dispatch_queue.submit('kyoto'))
+
+    assert (job.status, job.n_attempts) == (expected_status, expected_attempts)
+
+
+def test_retries_with_reconnect():
+    executor = FlakyExecutorMock(n_failures=2)
+    dispatch_queue = CrawlerDispatchQueue(executor, lambda city: f'crawl {city}', max_attempts=3, backoff_seconds=0)
+    job = _wait_for(dispatch_queue, dispatch_queue.submit('kyoto'))
+
+    assert job.status == JOB_STATUS_SUCCEEDED
+    assert executor.commands == ['crawl KYOTO'] * 3
+    assert executor.n_closed >= 2  # broken connections are dropped before retrying
+    assert job.to_dict()['last_error'] is None
+
+
+def test_deduplicates_per_city(dispatch_queues):
+    executor = FlakyExecutorMock(n_failures=0)
+    dispatch_queue = CrawlerDispatchQueue(executor, lambda city: f'crawl {city}', backoff_seconds=0)
+    dispatch_queues.append(dispatch_queue)
+
+    first_job, second_job = dispatch_queue.submit('kyoto'), dispatch_queue.submit('KYOTO')
+    other_job = dispatch_queue.submit('osaka')
+
+    assert first_job.job_id == second_job.job_id
+    assert other_job.job_id != first_job.job_id
+    assert dispatch_queue.get_job(first_job.job_id).city == 'KYOTO'
+    assert dispatch_queue.get_city_job('Kyoto').job_id == first_job.job_id
+
+
+def test_failed_city_can_be_resubmitted():
+    dispatch_queue = CrawlerDispatchQueue(FlakyExecutorMock(n_failures=1), lambda city: city, max_attempts=1,
+                                          backoff_seconds=0)
+    failed_job = _wait_for(dispatch_queue, dispatch_queue.submit('kyoto'))
+
+    assert failed_job.status == JOB_STATUS_FAILED
+    assert dispatch_queue.submit('kyoto').job_id != failed_job.job_id
+
+
+def test_job_state_shared_across_workers(crawler_jobs_table):
+    executor = FlakyExecutorMock(n_failures=0)
+    dispatch_queue = CrawlerDispatchQueue(executor, lambda city: f'crawl {city}', backoff_seconds=0)
+    other_worker_queue = CrawlerDispatchQueue(FlakyExecutorMock(n_failures=0), lambda city: city, backoff_seconds=0)
+    job = dispatch_queue.submit('kyoto')
+    other_worker_queue.close(timeout_seconds=5)
+    _wait_for(dispatch_queue, job)
+
+    assert other_worker_queue.submit('kyoto').job_id == job.job_id  # not dispatched twice
+    assert other_worker_queue.get_job(job.job_id).status == JOB_STATUS_SUCCEEDED
+    assert executor.commands == ['crawl KYOTO']
+
+
+def test_lost_job_is_not_run(crawler_jobs_table):
+    executor = FlakyExecutorMock(n_failures=0)
+    dispatch_queue = CrawlerDispatchQueue(executor, lambda city: city, backoff_seconds=0)
+    with patch.object(dispatch_queue, '_queue'):  # keeps the job queued
+        job = dispatch_queue.submit('kyoto')
+    crawler_jobs_table.rows[job.job_id][2] = JOB_STATUS_FAILED  # marked as lost by another worker
+    dispatch_queue._run_job(job)
+    dispatch_queue.close(timeout_seconds=5)
+
+    assert executor.commands == []
+
+
+def test_submit_failed():
+    dispatch_queue = CrawlerDispatchQueue(FlakyExecutorMock(n_failures=0), lambda city: city)
+    with patch(f'{MODULE_PATH}.create_crawler_job', return_value=None):
+        assert dispatch_queue.submit('kyoto') is None
+    dispatch_queue.close(timeout_seconds=5)
+
+
+def test_executor_is_abstract():
+    with pytest.raises(TypeError):
+        CrawlerExecutor()
+
+
+def test_get_crawler_docker_run_command():
+    docker_run_command = _get_crawler_docker_run_command('shanghai')
+    assert docker_run_command.replace('\n', '') == 'sudo docker run -d -e PGHOST=test -e PGDATABASE=test ' \
+                                                   '-e PGUSER=test -e PGPORT=test -e PGPASSWORD=test ' \
+                                                   '-e MAPS_KEY=test_key -it crawler shanghai ' \
+                                                   '--sights_limit=test_max_sights --limit=test_max_images'
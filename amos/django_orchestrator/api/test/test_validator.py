@@ -1,8 +1,9 @@
 """This module contains the tests for the validator module of the api sub-app."""
 from mock import patch
 import pytest
-from api.validator import is_valid_image_upload, is_city_existing, _is_valid_image_file
+from api.validator import is_valid_image_upload, is_city_existing, _is_valid_image_file, is_valid_image_content
 from conftest import ImageMock
+from data_django.city_registry import invalidate_city_registry
 
 
 def test_is_valid_image_upload(in_memory_uploaded_file_mock):
@@ -13,10 +14,21 @@ def test_is_valid_image_upload(in_memory_uploaded_file_mock):
 
 @pytest.mark.parametrize('city', ['berlin', 'tokyo', 'shanghai'])
 def test_is_city_existing(city):
-    with patch('api.validator.exec_dql_query', return_value=[[city]]):
+    invalidate_city_registry()
+    with patch('data_django.city_registry.exec_dql_query', return_value=[[city.upper()]]):
         assert is_city_existing(city) is True
+        assert is_city_existing('atlantis') is False
 
 
 def test_is_faulty_image_file(image_mock: ImageMock) -> None:
     with pytest.raises(AttributeError):
         _is_valid_image_file(image_mock)
+
+
+@pytest.mark.parametrize('content, is_valid', [
+    (b'\x89PNG\r\n\x1a\n' + b'\x00' * 24, True),
+    (b'\xff\xd8\xff\xe0\x00\x10JFIF' + b'\x00' * 22, True),
+    (b'%PDF-1.4', False),
+])
+def test_is_valid_image_content(content, is_valid):
+    assert is_valid_image_content(content) is is_valid
@@ -1,29 +1,163 @@
 """This module contains the tests for the view_handler module of the api sub-app."""
-import os
-from mock import patch
+import json
+import tarfile
+import zipfile
+from io import BytesIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils.datastructures import MultiValueDict
+from mock import patch, MagicMock
 import pytest
 from api.view_handlers import handle_get_trained_city_model, handle_persist_sight_image, \
-    handle_get_supported_cities, handle_get_latest_city_model_version, _get_crawler_docker_run_command, \
-    CITY_REQUEST_LOGGING_FILE_NAME, _add_city_requested_to_logs, MIN_CITY_REQUESTS_NEEDED_UNTIL_CRAWLING_TRIGGERED, \
-    _is_crawling_needed
+    handle_get_supported_cities, handle_get_latest_city_model_version, \
+    MIN_CITY_REQUESTS_NEEDED_UNTIL_CRAWLING_TRIGGERED, handle_add_new_city, handle_get_crawler_job, \
+    handle_get_connection_pool_stats, is_etag_matching, _parse_byte_range, \
+    handle_get_city_model_metadata, handle_get_models_metadata, handle_persist_sight_images, \
+    _iter_uploaded_images
+from data_django.city_registry import invalidate_city_registry
+from data_django.handler import ModelMetadata, ImageUploadResult
 
 MODULE_PATH = 'api.view_handlers'
 
 
-def _erase_city_logging_file():
-    try:
-        os.remove(CITY_REQUEST_LOGGING_FILE_NAME)
-    except OSError:
-        pass
-
-
 @pytest.mark.parametrize('city, is_valid', [('berlin', True), ('tokyo', False)])
 def test_handle_get_trained_city_model(city, is_valid):
     with patch(f'{MODULE_PATH}.is_valid_city', return_value=is_valid), \
-         patch('api.view_handlers.get_downloaded_model', return_value='<SOME AWESOME .pt MODEL!>'):
-        _, status = handle_get_trained_city_model(city)
+         patch(f'{MODULE_PATH}.get_model_metadata', return_value=ModelMetadata(7, 3, 1337)), \
+         patch(f'{MODULE_PATH}.get_cached_model_file', return_value=None), \
+         patch(f'{MODULE_PATH}.iter_model_chunks', return_value=iter([b'<SOME AWESOME .pt MODEL!>'])) as chunks:
+        _, status, headers = handle_get_trained_city_model(city)
 
         assert status == 200 if is_valid else 400
+        if is_valid:
+            chunks.assert_called_with(7, 3, 0, 1336)
+            assert headers['ETag'] == '"7-3"'
+            assert headers['Content-Length'] == '1337'
+
+
+def test_handle_get_trained_city_model_not_found():
+    with patch(f'{MODULE_PATH}.is_valid_city', return_value=True), \
+         patch(f'{MODULE_PATH}.get_model_metadata', return_value=None):
+        _, status, _ = handle_get_trained_city_model('atlantis')
+        assert status == 404
+
+
+def test_handle_get_trained_city_model_not_modified():
+    with patch(f'{MODULE_PATH}.is_valid_city', return_value=True), \
+         patch(f'{MODULE_PATH}.get_model_metadata', return_value=ModelMetadata(7, 3, 1337)), \
+         patch(f'{MODULE_PATH}.iter_model_chunks') as chunks:
+        content, status, _ = handle_get_trained_city_model('berlin', if_none_match='"7-3"')
+        assert (content, status) == ('', 304)
+        assert chunks.called is False
+
+
+@pytest.mark.parametrize('range_header, if_range, expected_status, expected_range', [
+    ('bytes=100-199', None, 206, (100, 199)),
+    ('bytes=1000-', None, 206, (1000, 1336)),
+    ('bytes=-37', None, 206, (1300, 1336)),
+    ('bytes=100-199', '"7-3"', 206, (100, 199)),
+    ('bytes=100-199', '"6-2"', 200, (0, 1336)),  # outdated partial download => whole model
+    ('bytes=5000-', None, 416, None),
+])
+def test_handle_get_trained_city_model_range(range_header, if_range, expected_status, expected_range):
+    with patch(f'{MODULE_PATH}.is_valid_city', return_value=True), \
+         patch(f'{MODULE_PATH}.get_model_metadata', return_value=ModelMetadata(7, 3, 1337)), \
+         patch(f'{MODULE_PATH}.get_cached_model_file', return_value=None), \
+         patch(f'{MODULE_PATH}.iter_model_chunks') as chunks:
+        _, status, headers = handle_get_trained_city_model('berlin', range_header=range_header, if_range=if_range)
+
+        assert status == expected_status
+        if expected_range is None:
+            assert headers['Content-Range'] == 'bytes */1337'
+        else:
+            chunks.assert_called_with(7, 3, *expected_range)
+        if expected_status == 206:
+            assert headers['Content-Range'] == f'bytes {expected_range[0]}-{expected_range[1]}/1337'
+
+
+@pytest.mark.parametrize('range_header, expected_content', [(None, b'0123456789'), ('bytes=2-4', b'234')])
+def test_handle_get_trained_city_model_cached(tmp_path, range_header, expected_content):
+    model_path = tmp_path / 'model.pt'
+    model_path.write_bytes(b'0123456789')
+    with patch(f'{MODULE_PATH}.is_valid_city', return_value=True), \
+         patch(f'{MODULE_PATH}.get_model_metadata', return_value=ModelMetadata(7, 3, 10)), \
+         patch(f'{MODULE_PATH}.get_cached_model_file', return_value=str(model_path)), \
+         patch(f'{MODULE_PATH}.iter_model_chunks') as chunks:
+        content, _, _ = handle_get_trained_city_model('berlin', range_header=range_header)
+
+        if hasattr(content, 'read'):
+            with content:
+                assert content.read() == expected_content
+        else:
+            assert b''.join(content) == expected_content
+        assert chunks.called is False
+
+
+def test_handle_get_trained_city_model_cache_evicted(tmp_path):
+    with patch(f'{MODULE_PATH}.is_valid_city', return_value=True), \
+         patch(f'{MODULE_PATH}.get_model_metadata', return_value=ModelMetadata(7, 3, 10)), \
+         patch(f'{MODULE_PATH}.get_cached_model_file', return_value=str(tmp_path / 'evicted.pt')), \
+         patch(f'{MODULE_PATH}.iter_model_chunks', return_value=iter([b'0123456789'])) as chunks:
+        handle_get_trained_city_model('berlin')
+        chunks.assert_called_with(7, 3, 0, 9)
+
+
+@pytest.mark.parametrize('if_none_match, expected_status', [(None, 200), ('"7-3"', 304), ('"6-2"', 200)])
+def test_handle_get_city_model_metadata(if_none_match, expected_status):
+    metadata = ModelMetadata(7, 3, 1337, 'ab' * 32, ('reichstag', 'tv_tower'))
+    with patch(f'{MODULE_PATH}.get_model_metadata', return_value=metadata):
+        content, status, headers = handle_get_city_model_metadata('berlin', if_none_match=if_none_match)
+
+        assert status == expected_status
+        assert headers['ETag'] == '"7-3"'
+        if expected_status == 200:
+            assert json.loads(content) == {'city': 'BERLIN', 'trained_model_id': 7, 'version': 3, 'size': 1337,
+                                           'sha256': 'ab' * 32, 'class_names': ['reichstag', 'tv_tower']}
+
+
+@pytest.mark.parametrize('city, metadata, expected_status', [('ny', None, 400), ('atlantis', None, 404)])
+def test_handle_get_city_model_metadata_errors(city, metadata, expected_status):
+    with patch(f'{MODULE_PATH}.get_model_metadata', return_value=metadata):
+        assert handle_get_city_model_metadata(city)[1] == expected_status
+
+
+def test_handle_get_models_metadata():
+    with patch(f'{MODULE_PATH}.get_models_metadata', return_value={'BERLIN': ModelMetadata(7, 3, 1337)}) as query:
+        content, status = handle_get_models_metadata('berlin, new york,atlantis')
+
+        assert status == 200
+        query.assert_called_with(['berlin', 'new_york', 'atlantis'])
+        response = json.loads(content)
+        assert [model['city'] for model in response['models']] == ['BERLIN']
+        assert response['missing_cities'] == ['NEW_YORK', 'ATLANTIS']
+
+
+@pytest.mark.parametrize('cities', [None, 'berlin,ny', ' , '])
+def test_handle_get_models_metadata_requested_cities(cities):
+    with patch(f'{MODULE_PATH}.get_models_metadata', return_value={}) as query:
+        content, status = handle_get_models_metadata(cities)
+
+        if cities is None:
+            assert status == 200
+            query.assert_called_with(None)
+            assert json.loads(content) == {'models': [], 'missing_cities': []}
+        else:
+            assert status == 400
+            assert query.called is False
+
+
+@pytest.mark.parametrize('range_header, expected_range', [
+    ('bytes=0-0', (0, 0)),
+    ('bytes=10-5000', (10, 99)),
+    ('bytes=-500', (0, 99)),
+    ('bytes=-0', None),
+    ('bytes=100-', None),
+    ('bytes=0-1,5-9', (0, 99)),  # multiple ranges ignored
+    ('items=0-10', (0, 99)),
+    ('bytes=abc', (0, 99)),
+    ('bytes=50-10', (0, 99)),
+])
+def test_parse_byte_range(range_header, expected_range):
+    assert _parse_byte_range(range_header, 100) == expected_range
 
 
 @pytest.mark.parametrize('city, is_valid', [('berlin', True), ('tokyo', False)])
@@ -42,41 +176,152 @@ def test_handle_persist_sight_image_valid(in_memory_uploaded_file_mock):
         assert status == 200
 
 
+def _upload_images_mock(images, city, is_valid_image):
+    return [ImageUploadResult(name, 'uploaded' if is_valid_image(content) else 'rejected') for name, content in images]
+
+
+def _get_tar_body(files, mode='w:gz'):
+    body = BytesIO()
+    with tarfile.open(fileobj=body, mode=mode) as archive:
+        for name, content in files:
+            member = tarfile.TarInfo(name)
+            member.size = len(content)
+            archive.addfile(member, BytesIO(content))
+    body.seek(0)
+    return body
+
+
+def _get_zip_body(files):
+    body = BytesIO()
+    with zipfile.ZipFile(body, 'w') as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+    body.seek(0)
+    return body
+
+
+PNG_BYTES = b'\x89PNG\r\n\x1a\n' + b'\x00' * 24
+UPLOADED_FILES = [('a.png', PNG_BYTES), ('b.txt', b'no image')]
+
+
+@pytest.mark.parametrize('content_type, files, stream', [
+    ('multipart/form-data; boundary=xyz', MultiValueDict({'image': [SimpleUploadedFile(name, content)
+                                                                    for name, content in UPLOADED_FILES]}), None),
+    ('application/gzip', None, _get_tar_body(UPLOADED_FILES)),
+    ('application/x-tar', None, _get_tar_body(UPLOADED_FILES, mode='w')),
+    ('application/zip', None, _get_zip_body(UPLOADED_FILES)),
+])
+def test_handle_persist_sight_images(content_type, files, stream):
+    with patch(f'{MODULE_PATH}.upload_images', side_effect=_upload_images_mock) as uploader:
+        content, status = handle_persist_sight_images('berlin', content_type, files, stream)
+        assert status == 200
+        response = json.loads(content)
+        assert (response['n_uploaded'], response['n_rejected'], response['n_failed']) == (1, 1, 0)
+        assert [image['name'] for image in response['images']] == ['a.png', 'b.txt']
+        assert uploader.call_args[0][1] == 'berlin'
+
+
+def test_handle_persist_sight_images_corrupt_archive():
+    with patch(f'{MODULE_PATH}.upload_images', side_effect=_upload_images_mock):
+        content, status = handle_persist_sight_images('berlin', 'application/zip', None, BytesIO(b'no zip'))
+        assert status == 200
+        assert json.loads(content)['archive_error'] is not None
+
+
+@pytest.mark.parametrize('content_type, files, stream', [
+    ('multipart/form-data', MultiValueDict({'image': [SimpleUploadedFile(name, content)
+                                                      for name, content in UPLOADED_FILES]}), None),
+    ('application/x-tar', None, _get_tar_body(UPLOADED_FILES, mode='w')),
+    ('application/zip', None, _get_zip_body(UPLOADED_FILES)),
+])
+@pytest.mark.parametrize('max_file_bytes, max_total_bytes', [(len(PNG_BYTES) - 1, 1024), (1024, len(PNG_BYTES) + 1)])
+def test_handle_persist_sight_images_too_large(content_type, files, stream, max_file_bytes, max_total_bytes):
+    stream = BytesIO(stream.getvalue()) if stream is not None else None
+    with patch(f'{MODULE_PATH}.upload_images', side_effect=_upload_images_mock), \
+         patch(f'{MODULE_PATH}.IMAGE_UPLOAD_MAX_FILE_BYTES', max_file_bytes), \
+         patch(f'{MODULE_PATH}.IMAGE_UPLOAD_MAX_TOTAL_BYTES', max_total_bytes):
+        content, status = handle_persist_sight_images('berlin', content_type, files, stream)
+        response = json.loads(content)
+        assert status == 200
+        assert 'exceeds the limit' in response['archive_error']
+        assert len(response['images']) == (0 if max_file_bytes < len(PNG_BYTES) else 1)  # stops before reading
+
+
+def test_iter_zip_members_checks_declared_size():
+    with patch(f'{MODULE_PATH}.IMAGE_UPLOAD_MAX_FILE_BYTES', 1024), \
+         patch(f'{MODULE_PATH}.zipfile.ZipFile.read') as read_mock:
+        archive_errors = []
+        images = list(_iter_uploaded_images('application/zip', None, _get_zip_body([('bomb.png', b'0' * 2048)]),
+                                            archive_errors))
+
+    assert images == []
+    assert read_mock.called is False
+    assert archive_errors == ['bomb.png exceeds the limit of 1024 bytes per file.']
+
+
+@pytest.mark.parametrize('city, content_type, stream, expected_status', [
+    ('ny', 'application/zip', _get_zip_body(UPLOADED_FILES), 400),
+    ('berlin', 'application/zip', None, 400),
+    ('berlin', 'application/zip', _get_zip_body([]), 400),
+    ('berlin', 'application/json', BytesIO(b'{}'), 415),
+])
+def test_handle_persist_sight_images_invalid(city, content_type, stream, expected_status):
+    with patch(f'{MODULE_PATH}.upload_images', side_effect=_upload_images_mock):
+        _, status = handle_persist_sight_images(city, content_type, None, stream)
+        assert status == expected_status
+
+
 def test_handle_get_supported_cities():
-    with patch(f'{MODULE_PATH}.exec_dql_query', return_value=[['berlin'], ['tokyo']]):
-        content, _ = handle_get_supported_cities()
+    invalidate_city_registry()
+    with patch('data_django.city_registry.exec_dql_query', return_value=[['berlin'], ['tokyo']]):
+        content, status, etag = handle_get_supported_cities()
         assert content == '{"cities": ["berlin", "tokyo"]}'
+        assert status == 200
 
+        content, status, _ = handle_get_supported_cities(etag)
+        assert content == ''
+        assert status == 304
 
-def test_get_crawler_docker_run_command():
-    docker_run_command = _get_crawler_docker_run_command('shanghai')
-    assert docker_run_command.replace('\n', '') == 'sudo docker run -d -e PGHOST=test -e PGDATABASE=test ' \
-                                                   '-e PGUSER=test -e PGPORT=test -e PGPASSWORD=test ' \
-                                                   '-e MAPS_KEY=test_key -it crawler shanghai ' \
-                                                   '--sights_limit=test_max_sights --limit=test_max_images'
 
+@pytest.mark.parametrize('if_none_match, is_matching', [(None, False), ('"abc"', True), ('W/"abc"', True),
+                                                        ('"xyz", "abc"', True), ('*', True), ('"xyz"', False)])
+def test_is_etag_matching(if_none_match, is_matching):
+    assert is_etag_matching(if_none_match, '"abc"') is is_matching
 
-def test_add_city_requested_to_logs():
-    _erase_city_logging_file()
-    _add_city_requested_to_logs('Kyoto')
-    _add_city_requested_to_logs('Kyoto')
-    _add_city_requested_to_logs('Guangzhou')
 
-    assert os.path.exists(CITY_REQUEST_LOGGING_FILE_NAME)  # file created
-    with open(CITY_REQUEST_LOGGING_FILE_NAME , 'r') as file:
-        assert file.read() == 'Kyoto;2\nGuangzhou;1\n'  # expected contents saved
+@pytest.mark.parametrize('is_existing', [True, False])
+def test_handle_add_new_city(is_existing):
+    dispatch_queue = MagicMock()
+    dispatch_queue.get_city_job.return_value = None
+    with patch(f'{MODULE_PATH}.is_city_existing', return_value=is_existing), \
+         patch(f'{MODULE_PATH}.get_crawler_dispatch_queue', return_value=dispatch_queue), \
+         patch(f'{MODULE_PATH}.count_city_request') as counter:
+        assert handle_add_new_city('kyoto') == ('{"job_id": null}', 200)
 
-    _erase_city_logging_file()  # cleanup
+        assert counter.called is not is_existing
+        if not is_existing:
+            counter.assert_called_with('kyoto', MIN_CITY_REQUESTS_NEEDED_UNTIL_CRAWLING_TRIGGERED,
+                                       on_threshold_reached=dispatch_queue.submit)
 
 
-def test_is_crawling_needed():
-    city_of_choice = 'CapitalCity'
-    _erase_city_logging_file()
+def test_handle_add_new_city_dispatched():
+    dispatch_queue = MagicMock()
+    dispatch_queue.get_city_job.return_value.job_id = 'abc'
+    with patch(f'{MODULE_PATH}.is_city_existing', return_value=False), \
+         patch(f'{MODULE_PATH}.get_crawler_dispatch_queue', return_value=dispatch_queue), \
+         patch(f'{MODULE_PATH}.count_city_request'):
+        assert handle_add_new_city('kyoto') == ('{"job_id": "abc"}', 200)
 
-    for _ in range(MIN_CITY_REQUESTS_NEEDED_UNTIL_CRAWLING_TRIGGERED - 1):
-        _add_city_requested_to_logs(city_of_choice)  # one too few
 
-    assert _is_crawling_needed(city_of_choice) is False
-    _add_city_requested_to_logs(city_of_choice)
-    assert _is_crawling_needed(city_of_choice) is True
-    _erase_city_logging_file()  # cleanup
+def test_handle_get_crawler_job():
+    dispatch_queue = MagicMock()
+    dispatch_queue.get_job.side_effect = lambda job_id: None
+    with patch(f'{MODULE_PATH}.get_crawler_dispatch_queue', return_value=dispatch_queue):
+        assert handle_get_crawler_job('unknown')[1] == 404
+
+
+def test_handle_get_connection_pool_stats():
+    with patch(f'{MODULE_PATH}.get_connection_pool_stats', return_value={'checked_out': 2, 'waiting': 0}):
+        content, status = handle_get_connection_pool_stats()
+        assert status == 200
+        assert content == '{"checked_out": 2, "waiting": 0}'
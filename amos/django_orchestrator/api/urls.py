@@ -4,9 +4,14 @@ from . import views
 
 urlpatterns = [
     path("cities/<city>/image", views.persist_sight_image, name="persist_sight_image"),
+    path("cities/<city>/images", views.persist_sight_images, name="persist_sight_images"),
     path("cities/<city>/model", views.get_trained_city_model, name="get_trained_city_model"),
+    path("cities/<city>/model/meta", views.get_city_model_metadata, name="get_city_model_metadata"),
     path("cities/<city>/model/version", views.get_latest_city_model_version, name="get_latest_city_model_version"),
     path("cities/", views.get_supported_cities, name="get_supported_cities"),
     path("cities/<city>/add", views.add_new_city, name="add_new_city"),
+    path("crawler/jobs/<job_id>", views.get_crawler_job, name="get_crawler_job"),
+    path("models/meta", views.get_models_metadata, name="get_models_metadata"),
+    path("pool/stats", views.get_connection_pool_stats, name="get_connection_pool_stats"),
     path("", views.get_index, name="get_index")
 ]
@@ -1,7 +1,9 @@
 """This module contains various validation functions for passed user inputs like uploaded files."""
 import imghdr
 from django.core.files.uploadedfile import InMemoryUploadedFile
-from data_django.exec_sql import exec_dql_query
+from data_django.city_registry import is_supported_city
+
+IMAGE_CONTENT_TYPES = ["jpeg", "png", "gif", "bmp", "webp", "tiff"]
 
 
 def is_valid_image_upload(city: str, image: InMemoryUploadedFile) -> bool:
@@ -22,6 +24,22 @@ def is_valid_image_upload(city: str, image: InMemoryUploadedFile) -> bool:
     return bool(is_valid_city(city) and _is_valid_image_file(image))
 
 
+def is_valid_image_content(content: bytes) -> bool:
+    """Returns whether the passed file content is a supported image, judged by its header.
+
+    Parameters
+    ----------
+    content: bytes
+        File content.
+
+    Returns
+    -------
+    is_valid: bool
+        Whether the content is a supported image.
+    """
+    return imghdr.what(file=None, h=content) in IMAGE_CONTENT_TYPES
+
+
 def is_valid_city(city: str, must_be_supported: bool = False) -> bool:
     """Returns whether the passed city name is valid.
 
@@ -57,10 +75,12 @@ def is_city_existing(city: str) -> bool:
     -------
     is_existing: bool
         Whether the passed city exists.
+
+    Notes
+    -----
+    The lookup is answered by the in-process city registry without querying the data warehouse.
     """
-    cities_query = "select distinct(city_name) from data_mart_layer.current_trained_models"
-    cities = set(map(lambda _city: _city[0].upper(), exec_dql_query(cities_query, return_result=True)))
-    return city.upper() in cities
+    return is_supported_city(city)
 
 
 def _is_valid_image_file(image: InMemoryUploadedFile) -> bool:
@@ -76,13 +96,4 @@ def _is_valid_image_file(image: InMemoryUploadedFile) -> bool:
     is_valid: bool
         Whether the uploaded image file is valid.
     """
-    image_content_types = [
-        "jpeg",
-        "png",
-        "gif",
-        "bmp",
-        "webp",
-        "tiff"
-    ]
-
-    return imghdr.what(file=image.file) in image_content_types
+    return imghdr.what(file=image.file) in IMAGE_CONTENT_TYPES
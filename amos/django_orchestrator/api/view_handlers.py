@@ -1,42 +1,157 @@
 """This module contains the handling logic behind the available API views."""
-from json import dumps
-from multiprocessing import Lock
-from typing import Union, Tuple
 import os
-import paramiko
+import tarfile
+import zipfile
+from collections import Counter
+from functools import partial
+from json import dumps
+from shutil import copyfileobj
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Union, Tuple
 from django.core.files.uploadedfile import InMemoryUploadedFile
-from api.validator import is_valid_city, is_valid_image_upload, is_city_existing
-from data_django.exec_sql import exec_dql_query
-from data_django.handler import get_downloaded_model, upload_image, get_latest_model_version
+from django.utils.datastructures import MultiValueDict
+from api.crawler_dispatch import get_crawler_dispatch_queue
+from api.validator import is_valid_city, is_valid_image_upload, is_city_existing, is_valid_image_content
+from data_django.connection_pool import get_connection_pool_stats
+from data_django.city_registry import get_city_registry
+from data_django.city_requests import count_city_request
+from data_django.handler import get_model_metadata, iter_model_chunks, upload_image, get_latest_model_version, \
+    get_cached_model_file, get_models_metadata, ModelMetadata, upload_images, IMAGE_UPLOAD_STATUS_UPLOADED, \
+    IMAGE_UPLOAD_STATUS_REJECTED, IMAGE_UPLOAD_STATUS_FAILED
+from data_django.model_cache import open_file_range
 
-CITY_REQUEST_LOGGING_FILE_LOCK = Lock()
-CITY_REQUEST_LOGGING_FILE_NAME = 'city_requests.log'
-CRAWLER_TRIGGERED_FOR_CITIES = []
 HTTP_400_MESSAGE = "Wrong request format - please refer to /api/swagger!"
+HTTP_404_MESSAGE = "No trained model available for the requested city."
+HTTP_404_JOB_MESSAGE = "Unknown crawler job."
+HTTP_415_MESSAGE = "Unsupported upload format - send multipart form data, a tar or a zip archive."
+HTTP_416_MESSAGE = "Requested byte range not satisfiable."
 HTTP_200_MESSAGE = "Request successfully executed."
 MIN_CITY_REQUESTS_NEEDED_UNTIL_CRAWLING_TRIGGERED = 100
+IMAGE_UPLOAD_SPOOL_BYTES = int(os.getenv('IMAGE_UPLOAD_SPOOL_BYTES', 64 * 1024 * 1024))
+IMAGE_UPLOAD_MAX_FILE_BYTES = int(os.getenv('IMAGE_UPLOAD_MAX_FILE_BYTES', 32 * 1024 * 1024))
+IMAGE_UPLOAD_MAX_TOTAL_BYTES = int(os.getenv('IMAGE_UPLOAD_MAX_TOTAL_BYTES', 512 * 1024 * 1024))
 
+_MULTIPART_CONTENT_TYPE = 'multipart/form-data'
+_TAR_CONTENT_TYPES = {'application/x-tar', 'application/x-gtar', 'application/gzip', 'application/x-gzip'}
+_ZIP_CONTENT_TYPES = {'application/zip', 'application/x-zip-compressed'}
 
-def handle_get_trained_city_model(city: str) -> Tuple[Union[str, bytes], int]:
-    """Returns a trained city model as a .pt file.
+
+def handle_get_trained_city_model(city: str, range_header: Optional[str] = None, if_none_match: Optional[str] = None,
+                                  if_range: Optional[str] = None) \
+        -> Tuple[Union[str, Iterator[bytes], BinaryIO], int, Dict[str, str]]:
+    """Returns a trained city model as a .pt file, optionally restricted to a byte range.
 
     Parameters
     ----------
     city: str
         Name of the city.
+    range_header: str or None, default=None
+        Value of the Range request header.
+    if_none_match: str or None, default=None
+        Value of the If-None-Match request header.
+    if_range: str or None, default=None
+        Value of the If-Range request header.
 
     Returns
     -------
-    content: str or bytes
-        Response content.
+    content: str or iterator[bytes] or BinaryIO
+        Response content, the (cached) model file or its chunks for successful requests.
     http_status: int
         HTTP status code.
+    headers: dict[str, str]
+        Additional response headers.
     """
-    if is_valid_city(city):
-        model = get_downloaded_model(city)
-        return model, 200
+    if not is_valid_city(city):
+        return HTTP_400_MESSAGE, 400, {}
 
-    return HTTP_400_MESSAGE, 400
+    metadata = get_model_metadata(city)
+    if metadata is None:
+        return HTTP_404_MESSAGE, 404, {}
+
+    headers = {'ETag': metadata.etag, 'Accept-Ranges': 'bytes'}
+    if is_etag_matching(if_none_match, metadata.etag):
+        return '', 304, headers
+
+    byte_range = (0, metadata.size - 1)
+    if range_header is not None and (if_range is None or if_range == metadata.etag):
+        byte_range = _parse_byte_range(range_header, metadata.size)
+        if byte_range is None:
+            headers['Content-Range'] = f'bytes */{metadata.size}'
+            return HTTP_416_MESSAGE, 416, headers
+
+    start, end = byte_range
+    status = 200 if (start, end) == (0, metadata.size - 1) else 206
+    headers.update({
+        'Content-Type': 'application/octet-stream',
+        'Content-Disposition': f'attachment; filename="{city.upper()}.pt"',
+        'Content-Length': str(max(end + 1 - start, 0)),
+    })
+    if status == 206:
+        headers['Content-Range'] = f'bytes {start}-{end}/{metadata.size}'
+
+    return _open_model_content(city, metadata, start, end), status, headers
+
+
+def handle_get_city_model_metadata(city: str, if_none_match: Optional[str] = None) \
+        -> Tuple[str, int, Dict[str, str]]:
+    """Returns the version, size, SHA-256 hash, id and class names of a city's current model.
+
+    Parameters
+    ----------
+    city: str
+        Name of the city.
+    if_none_match: str or None, default=None
+        Value of the If-None-Match request header.
+
+    Returns
+    -------
+    content: str
+        Response content, the JSON serialized model metadata for successful requests.
+    http_status: int
+        HTTP status code.
+    headers: dict[str, str]
+        Additional response headers.
+    """
+    if not is_valid_city(city):
+        return HTTP_400_MESSAGE, 400, {}
+
+    metadata = get_model_metadata(city)
+    if metadata is None:
+        return HTTP_404_MESSAGE, 404, {}
+
+    headers = {'ETag': metadata.etag}  # identical to the model download's entity tag
+    if is_etag_matching(if_none_match, metadata.etag):
+        return '', 304, headers
+
+    return dumps(_serialize_model_metadata(city, metadata)), 200, headers
+
+
+def handle_get_models_metadata(cities: Optional[str] = None) -> Tuple[str, int]:
+    """Returns the current model metadata of several cities at once.
+
+    Parameters
+    ----------
+    cities: str or None, default=None
+        Comma-separated city names, all supported cities if None.
+
+    Returns
+    -------
+    content: str
+        Response content, the JSON serialized model metadata by city and the cities without a model.
+    http_status: int
+        HTTP status code.
+    """
+    requested_cities: Optional[List[str]] = None
+    if cities is not None:
+        requested_cities = [city.strip().replace(' ', '_') for city in cities.split(',') if city.strip()]
+        if not requested_cities or not all(map(is_valid_city, requested_cities)):
+            return HTTP_400_MESSAGE, 400
+
+    models_metadata = get_models_metadata(requested_cities)
+    return dumps({
+        'models': [_serialize_model_metadata(city, metadata) for city, metadata in sorted(models_metadata.items())],
+        'missing_cities': [city.upper() for city in requested_cities or [] if city.upper() not in models_metadata],
+    }), 200
 
 
 def handle_get_latest_city_model_version(city: str) -> Tuple[int, int]:
@@ -85,8 +200,54 @@ def handle_persist_sight_image(city: str, image: InMemoryUploadedFile) -> Tuple[
     return HTTP_400_MESSAGE, 400
 
 
+def handle_persist_sight_images(city: str, content_type: Optional[str], files: Optional[MultiValueDict],
+                                stream: Optional[BinaryIO]) -> Tuple[str, int]:
+    """Persists a batch of images of a given city in the data warehouse.
+
+    Parameters
+    ----------
+    city: str
+        Name of the city.
+    content_type: str or None
+        Value of the Content-Type request header.
+    files: MultiValueDict or None
+        Uploaded files of a multipart request, any form field names are accepted.
+    stream: BinaryIO or None
+        Request body, read for tar (optionally compressed) and zip archives, None if the body is empty.
+
+    Returns
+    -------
+    content: str
+        Response content, the JSON serialized outcome per image for processed requests.
+    http_status: int
+        HTTP status code.
+    """
+    is_body_missing = files is None and stream is None
+    if not is_valid_city(city) or is_body_missing:
+        return HTTP_400_MESSAGE, 400
+
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type != _MULTIPART_CONTENT_TYPE and media_type not in _TAR_CONTENT_TYPES | _ZIP_CONTENT_TYPES:
+        return HTTP_415_MESSAGE, 415
+
+    archive_errors: List[str] = []
+    results = upload_images(_iter_uploaded_images(media_type, files, stream, archive_errors), city,
+                            is_valid_image=is_valid_image_content)
+    if not results and not archive_errors:
+        return HTTP_400_MESSAGE, 400
+
+    status_counts = Counter(result.status for result in results)
+    return dumps({
+        'n_uploaded': status_counts[IMAGE_UPLOAD_STATUS_UPLOADED],
+        'n_rejected': status_counts[IMAGE_UPLOAD_STATUS_REJECTED],
+        'n_failed': status_counts[IMAGE_UPLOAD_STATUS_FAILED],
+        'archive_error': archive_errors[0] if archive_errors else None,
+        'images': [result._asdict() for result in results],
+    }), 200
+
+
 def handle_add_new_city(city: str) -> Tuple[str, int]:
-    """Adds a new city to the internally managed list of supported cities.
+    """Counts a request for a not yet supported city and dispatches the crawler once enough requests arrived.
 
     Parameters
     ----------
@@ -96,143 +257,344 @@ def handle_add_new_city(city: str) -> Tuple[str, int]:
     Returns
     -------
     content: str
-        Response content.
+        Response content, the JSON serialized id of the city's crawler job (null if none has been dispatched).
     http_status: int
         HTTP status code.
+
+    Notes
+    -----
+    The crawler is started by a background queue, hence the request returns immediately.
     """
+    dispatch_queue = get_crawler_dispatch_queue()
     if not is_city_existing(city):
-        _add_city_requested_to_logs(city)
+        count_city_request(city, MIN_CITY_REQUESTS_NEEDED_UNTIL_CRAWLING_TRIGGERED,
+                           on_threshold_reached=dispatch_queue.submit)
+
+    job = dispatch_queue.get_city_job(city)
+    return dumps({'job_id': job.job_id if job is not None else None}), 200
+
+
+def handle_get_crawler_job(job_id: str) -> Tuple[str, int]:
+    """Returns the status of a crawler job dispatched by any worker.
 
-        if _is_crawling_needed(city):
-            ssh_client = paramiko.SSHClient()
-            ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            ssh_client.connect(hostname=os.getenv("IC_URL"),
-                               username='ubuntu',
-                               pkey=paramiko.RSAKey.from_private_key_file('ec2key.pem'))
-            cmd = _get_crawler_docker_run_command(city)
-            print(f'Performing: {cmd} on remote image crawler {os.getenv("IC_URL")}')
-            _, _, stderr = ssh_client.exec_command(cmd)
-            print(f'Received error (if any): {stderr.readlines()}')
-            ssh_client.close()
+    Parameters
+    ----------
+    job_id: str
+        Id of the crawler job.
 
-    return HTTP_200_MESSAGE, 200
+    Returns
+    -------
+    content: str
+        Response content, the JSON serialized job for known jobs.
+    http_status: int
+        HTTP status code.
+    """
+    job = get_crawler_dispatch_queue().get_job(job_id)
+    if job is None:
+        return HTTP_404_JOB_MESSAGE, 404
 
+    return dumps(job.to_dict()), 200
 
-def handle_get_supported_cities() -> Tuple[str, int]:
+
+def handle_get_supported_cities(if_none_match: Optional[str] = None) -> Tuple[str, int, str]:
     """Returns a list containing the currently supported cities.
 
+    Parameters
+    ----------
+    if_none_match: str or None, default=None
+        Value of the If-None-Match request header.
+
     Returns
     -------
     content: str
-        Response content.
+        Response content, empty if the client's cached version is still valid.
     http_status: int
         HTTP status code.
+    etag: str
+        Entity tag of the current city list.
     """
-    cities_query = 'select distinct(city_name) from data_mart_layer.current_trained_models order by city_name asc'
-    cities = exec_dql_query(cities_query, return_result=True)
-    cities = [] if not cities else list(map(lambda _city: _city[0], cities))
+    registry = get_city_registry()
+    if is_etag_matching(if_none_match, registry.etag):
+        return '', 304, registry.etag
 
-    return dumps({'cities': cities}), 200
+    return registry.json_body, 200, registry.etag
 
 
-def _add_city_requested_to_logs(requested_city: str) -> None:
-    """Persists the information that a given city has been requested in a logging file
-    for later data stewardship.
+def is_etag_matching(if_none_match: Optional[str], etag: str) -> bool:
+    """Returns whether the passed If-None-Match header matches the given entity tag.
 
     Parameters
     ----------
-    requested_city: str
-        Requested city name.
+    if_none_match: str or None
+        Value of the If-None-Match request header.
+    etag: str
+        Current (strong) entity tag of the resource.
+
+    Returns
+    -------
+    is_matching: bool
+        Whether the client already holds the current resource.
     """
-    with CITY_REQUEST_LOGGING_FILE_LOCK:
-        _create_city_logging_file_if_not_exists()
-        new_content = _get_new_city_logging_file_content(requested_city)
-        with open(CITY_REQUEST_LOGGING_FILE_NAME, 'w') as target_file:
-            target_file.write(new_content)
+    if not if_none_match:
+        return False
 
+    client_etags = [client_etag.strip() for client_etag in if_none_match.split(',')]
+    return '*' in client_etags or any(client_etag.replace('W/', '', 1) == etag for client_etag in client_etags)
 
-def _create_city_logging_file_if_not_exists():
-    """Creates a city logging file if it does not exist."""
-    if not os.path.exists(CITY_REQUEST_LOGGING_FILE_NAME):
-        with open(CITY_REQUEST_LOGGING_FILE_NAME, 'w'):
-            print('New logging file has been created!')
 
+def handle_get_connection_pool_stats() -> Tuple[str, int]:
+    """Returns the usage statistics of the worker's data warehouse connection pool.
 
-def _get_crawler_docker_run_command(city: str) -> str:
-    """Returns the docker run command needed to trigger the crawler.
+    Returns
+    -------
+    content: str
+        Response content.
+    http_status: int
+        HTTP status code.
+    """
+    return dumps(get_connection_pool_stats()), 200
+
+
+def _open_model_content(city: str, metadata: ModelMetadata, start: int, end: int) -> Union[Iterator[bytes], BinaryIO]:
+    """Returns the requested model bytes, served from the local model cache whenever possible.
 
     Parameters
     ----------
     city: str
-        City to crawl sights for.
+        Name of the city.
+    metadata: ModelMetadata
+        Metadata of the city's current model.
+    start: int
+        First byte to serve (zero-based).
+    end: int
+        Last byte to serve (inclusive).
 
     Returns
     -------
-    run_command: str
-        Docker run command for the crawler.
+    content: iterator[bytes] or BinaryIO
+        Opened model file if the whole cached model is requested, byte chunks otherwise.
+    """
+    model_path = get_cached_model_file(city, metadata)
+
+    if model_path is not None:
+        try:
+            if (start, end) == (0, metadata.size - 1):
+                return open(model_path, 'rb')
+            return open_file_range(model_path, start, end)
+        except OSError:  # evicted by another worker in the meantime
+            pass
+
+    return iter_model_chunks(metadata.trained_model_id, metadata.version, start, end)
+
+
+def _iter_uploaded_images(media_type: str, files: MultiValueDict, stream: BinaryIO, archive_errors: List[str]) \
+        -> Iterator[Tuple[str, bytes]]:
+    """Yields the names and contents of the files of a batch upload one by one.
+
+    Parameters
+    ----------
+    media_type: str
+        Media type of the request body.
+    files: MultiValueDict
+        Uploaded files of a multipart request.
+    stream: BinaryIO
+        Request body.
+    archive_errors: list[str]
+        Collects the error of a corrupt archive or of an upload exceeding the size limits, files read up to the error
+        are yielded nevertheless.
+
+    Yields
+    ------
+    name: str
+        File name.
+    content: bytes
+        File content.
+
+    Notes
+    -----
+    The (declared) size of every file is checked before it is read, hence archives decompressing to huge files
+    (zip bombs) are rejected without being extracted.
+    """
+    if media_type == _MULTIPART_CONTENT_TYPE:
+        uploaded_files = _iter_multipart_files(files)
+    elif media_type in _TAR_CONTENT_TYPES:
+        uploaded_files = _iter_tar_members(stream)
+    else:
+        uploaded_files = _iter_zip_members(stream)
+
+    total_size = 0
+    try:
+        for name, size, read in uploaded_files:
+            total_size += size
+            error = _get_upload_size_error(name, size, total_size)
+            if error is not None:
+                print(f'Rejected uploaded files: {error}')
+                archive_errors.append(error)
+                return
+            yield name, read()
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError, OSError) as exc:
+        print(f'Could not read uploaded archive: {exc}')
+        archive_errors.append(f'Archive could not be read: {exc}')
+
+
+def _iter_multipart_files(files: MultiValueDict) -> Iterator[Tuple[str, int, Callable[[], bytes]]]:
+    """Yields the files of a multipart request, any form field names are accepted.
+
+    Parameters
+    ----------
+    files: MultiValueDict
+        Uploaded files of a multipart request.
+
+    Yields
+    ------
+    name: str
+        File name.
+    size: int
+        File size in bytes.
+    read: callable
+        Returns the file content.
+    """
+    for field_name in files:
+        for uploaded_file in files.getlist(field_name):
+            yield uploaded_file.name, uploaded_file.size, uploaded_file.read
+
+
+def _iter_tar_members(stream: BinaryIO) -> Iterator[Tuple[str, int, Callable[[], bytes]]]:
+    """Yields the regular files of a (compressed) tar archive in the order of the streamed request body.
+
+    Parameters
+    ----------
+    stream: BinaryIO
+        Request body.
+
+    Yields
+    ------
+    name: str
+        File name.
+    size: int
+        File size in bytes, as declared by the member's header.
+    read: callable
+        Returns the file content, has to be called before the next member is requested.
+    """
+    with tarfile.open(fileobj=stream, mode='r|*') as archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, member.size, archive.extractfile(member).read
+
+
+def _iter_zip_members(stream: BinaryIO) -> Iterator[Tuple[str, int, Callable[[], bytes]]]:
+    """Yields the files of a zip archive, the request body is spooled first since zip archives need seeking.
+
+    Parameters
+    ----------
+    stream: BinaryIO
+        Request body.
+
+    Yields
+    ------
+    name: str
+        File name.
+    size: int
+        Uncompressed file size in bytes, as declared by the central directory.
+    read: callable
+        Returns the file content, reading at most the declared size.
     """
-    return 'sudo docker run -d ' \
-           f'-e PGHOST={os.getenv("PGHOST")} ' \
-           f'-e PGDATABASE={os.getenv("PGDATABASE")} ' \
-           f'-e PGUSER={os.getenv("PGUSER")} ' \
-           f'-e PGPORT={os.getenv("PGPORT")} ' \
-           f'-e PGPASSWORD={os.getenv("PGPASSWORD")} ' \
-           f'-e MAPS_KEY={os.getenv("MAPS_KEY")} ' \
-           f'-it crawler {city} ' \
-           f'--sights_limit={os.getenv("MAX_SIGHTS_PER_CITY")} ' \
-           f'--limit={os.getenv("MAX_IMAGES_PER_SIGHT")}'
+    with SpooledTemporaryFile(max_size=IMAGE_UPLOAD_SPOOL_BYTES) as spooled_body:
+        copyfileobj(stream, spooled_body)
+        with zipfile.ZipFile(spooled_body) as archive:
+            for member in archive.infolist():
+                if not member.is_dir():
+                    yield member.filename, member.file_size, partial(archive.read, member)
 
 
-def _get_new_city_logging_file_content(requested_city: str) -> str:
-    """Returns the new content of the city logging file based on the received requested city.
+def _get_upload_size_error(name: str, size: int, total_size: int) -> Optional[str]:
+    """Returns the error of an uploaded file exceeding the size limits.
 
     Parameters
     ----------
-    requested_city: str
-        City whose support has just been requested.
+    name: str
+        File name.
+    size: int
+        File size in bytes.
+    total_size: int
+        Size of all files of the upload read so far including the current one in bytes.
 
     Returns
     -------
-    new_content: str
-        New content for the file.
+    error: str or None
+        Error message, None if the file is within the limits.
     """
-    new_city_content, city_already_requested = '', False
+    if size > IMAGE_UPLOAD_MAX_FILE_BYTES:
+        return f'{name} exceeds the limit of {IMAGE_UPLOAD_MAX_FILE_BYTES} bytes per file.'
+    if total_size > IMAGE_UPLOAD_MAX_TOTAL_BYTES:
+        return f'Upload exceeds the limit of {IMAGE_UPLOAD_MAX_TOTAL_BYTES} bytes in total.'
 
-    with open(CITY_REQUEST_LOGGING_FILE_NAME, 'r') as old_file:
-        for line in old_file.readlines():
-            contents = line.split(';')
-            line_city, line_counter = contents[0], int(contents[1])
-            if line_city == requested_city:  # simply copy content
-                city_already_requested = True
-                line_counter += 1
+    return None
 
-            new_city_content += f'{line_city};{line_counter}\n'
 
-    if not city_already_requested:
-        new_city_content += f'{requested_city};{1}\n'
+def _serialize_model_metadata(city: str, metadata: ModelMetadata) -> Dict[str, object]:
+    """Returns the JSON serializable representation of a city's model metadata.
 
-    return new_city_content
+    Parameters
+    ----------
+    city: str
+        Name of the city.
+    metadata: ModelMetadata
+        Metadata of the city's current model.
 
+    Returns
+    -------
+    serialized_metadata: dict[str, object]
+        Model metadata as exposed by the API.
+    """
+    return {
+        'city': city.upper(),
+        'trained_model_id': metadata.trained_model_id,
+        'version': metadata.version,
+        'size': metadata.size,
+        'sha256': metadata.sha256,
+        'class_names': list(metadata.class_names),
+    }
 
-def _is_crawling_needed(requested_city: str) -> bool:
-    """Returns whether the image crawler should be triggered.
+
+def _parse_byte_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Returns the inclusive byte boundaries requested by a Range header.
 
     Parameters
     ----------
-    requested_city: str
-        Requested city.
+    range_header: str
+        Value of the Range request header, e.g. "bytes=0-1023", "bytes=1024-" or "bytes=-512".
+    size: int
+        Total size of the requested resource in bytes.
 
     Returns
     -------
-    is_crawling_needed: bool
-        Whether the crawler should be triggered.
-    """
-    with CITY_REQUEST_LOGGING_FILE_LOCK:
-        with open(CITY_REQUEST_LOGGING_FILE_NAME, 'r') as old_file:
-            for line in old_file.readlines():
-                contents = line.split(';')
-                line_city, count = contents[0], int(contents[1])
-                if line_city == requested_city and count >= MIN_CITY_REQUESTS_NEEDED_UNTIL_CRAWLING_TRIGGERED:
-                    return True
-
-    return False
+    byte_range: tuple[int, int] or None
+        First and last byte to serve, None if the range is not satisfiable.
+
+    Notes
+    -----
+    Malformed and multi-range headers are ignored as permitted by RFC 7233, i.e. the whole resource is served.
+    """
+    full_range = (0, size - 1)
+    unit, _, ranges = range_header.partition('=')
+    if unit.strip() != 'bytes' or ',' in ranges:
+        return full_range
+
+    first, _, last = ranges.strip().partition('-')
+    if not (first.isdigit() or first == '') or not (last.isdigit() or last == '') or first == last == '':
+        return full_range
+
+    if first == '':  # suffix range, i.e. the last n bytes
+        start, end = size - min(int(last), size), size - 1
+        if int(last) == 0:
+            return None
+    else:
+        start, end = int(first), size - 1 if last == '' else min(int(last), size - 1)
+        if last != '' and int(last) < start:
+            return full_range
+
+    if start >= size:
+        return None
+
+    return start, end
@@ -0,0 +1,256 @@
+"""This module contains the responses of the API views, shared by the synchronous and the asynchronous views.
+
+The passed request is either a DRF Request (synchronous views) or a plain Django HttpRequest (asynchronous views),
+hence only the attributes both of them provide are accessed.
+"""
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional, Union
+from django.http import FileResponse, HttpRequest, HttpResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from api.view_handlers import (
+    handle_get_trained_city_model,
+    handle_persist_sight_image,
+    handle_persist_sight_images,
+    handle_add_new_city,
+    handle_get_supported_cities,
+    HTTP_200_MESSAGE,
+    handle_get_latest_city_model_version,
+    handle_get_connection_pool_stats,
+    handle_get_city_model_metadata,
+    handle_get_models_metadata,
+    handle_get_crawler_job,
+)
+
+ModelContent = Union[Iterator[bytes], BinaryIO]
+
+
+def respond_get_trained_city_model(request: HttpRequest, city: str,
+                                   stream_content: Optional[Callable[[ModelContent], Iterable[bytes]]] = None) \
+        -> HttpResponseBase:
+    """Returns the response streaming a trained city model as a .pt file.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+    city: str
+        Name of the city.
+    stream_content: callable or None, default=None
+        Turns the model file or chunks into the streamed content, by default cached model files are served zero-copy
+        via the server's file wrapper.
+
+    Returns
+    -------
+    response: HttpResponseBase
+        Response object streaming the trained model as a .pt file.
+    """
+    content, status, headers = handle_get_trained_city_model(
+        city.replace(' ', '_'),
+        range_header=request.headers.get("Range"),
+        if_none_match=request.headers.get("If-None-Match"),
+        if_range=request.headers.get("If-Range"),
+    )
+    if status not in (200, 206):
+        response = HttpResponse(content, status=status)
+    elif stream_content is not None:
+        response = StreamingHttpResponse(stream_content(content), status=status)
+    elif hasattr(content, "read"):
+        response = FileResponse(content, status=status)
+    else:
+        response = StreamingHttpResponse(content, status=status)
+    for header, value in headers.items():
+        response[header] = value
+
+    return response
+
+
+def respond_get_city_model_metadata(request: HttpRequest, city: str) -> HttpResponse:
+    """Returns the response containing the version, size, SHA-256 hash, id and class names of a city's current model.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the JSON serialized model metadata.
+    """
+    content, status, headers = handle_get_city_model_metadata(
+        city.replace(' ', '_'), if_none_match=request.headers.get("If-None-Match")
+    )
+    response = HttpResponse(content, status=status, content_type="application/json" if status == 200 else None)
+    for header, value in headers.items():
+        response[header] = value
+
+    return response
+
+
+def respond_get_models_metadata(request: HttpRequest) -> HttpResponse:
+    """Returns the response containing the current model metadata of all requested cities.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object, optionally carrying the comma-separated cities query parameter.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the JSON serialized model metadata.
+    """
+    content, status = handle_get_models_metadata(request.GET.get("cities"))
+    return HttpResponse(content, status=status, content_type="application/json" if status == 200 else None)
+
+
+def respond_get_latest_city_model_version(request: HttpRequest, city: str) -> HttpResponse:
+    """Returns the response containing the latest version of the persisted city model.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the latest model version.
+    """
+    response = handle_get_latest_city_model_version(city.replace(' ', '_'))
+    return HttpResponse(response[0], status=response[1])
+
+
+def respond_persist_sight_image(request: HttpRequest, city: str) -> HttpResponse:
+    """Persists an uploaded image of a given supported city and returns the response.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing a status message.
+    """
+    image = request.FILES["image"] if "image" in request.FILES else None
+    response = handle_persist_sight_image(city.replace(' ', '_'), image)
+    return HttpResponse(response[0], status=response[1])
+
+
+def respond_persist_sight_images(request: HttpRequest, city: str) -> HttpResponse:
+    """Persists a batch of uploaded images of a given city and returns the response.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the outcome per image.
+    """
+    is_multipart = (request.content_type or "").startswith("multipart/form-data")
+    stream = getattr(request, "stream", request)  # DRF exposes the body as stream, Django requests are file-like
+    content, status = handle_persist_sight_images(city.replace(' ', '_'), request.content_type,
+                                                  request.FILES if is_multipart else None, stream)
+    return HttpResponse(content, status=status, content_type="application/json" if status == 200 else None)
+
+
+def respond_add_new_city(request: HttpRequest, city: str) -> HttpResponse:
+    """Counts a request for a new city and returns the response.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+    city: str
+        Name of the city to add.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the id of the city's crawler job, if any.
+    """
+    response = handle_add_new_city(city.replace(' ', '_'))
+    return HttpResponse(response[0], status=response[1], content_type="application/json")
+
+
+def respond_get_crawler_job(request: HttpRequest, job_id: str) -> HttpResponse:
+    """Returns the response containing the status of a crawler job.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+    job_id: str
+        Id of the crawler job.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the JSON serialized job.
+    """
+    content, status = handle_get_crawler_job(job_id)
+    return HttpResponse(content, status=status, content_type="application/json" if status == 200 else None)
+
+
+def respond_get_supported_cities(request: HttpRequest) -> HttpResponse:
+    """Returns the response containing the currently supported cities.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the list of supported cities.
+    """
+    content, status, etag = handle_get_supported_cities(request.headers.get("If-None-Match"))
+    response = HttpResponse(content, status=status, content_type="application/json")
+    response["ETag"] = etag
+    return response
+
+
+def respond_get_connection_pool_stats(request: HttpRequest) -> HttpResponse:
+    """Returns the response containing the usage statistics of the worker's connection pool.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the connection pool statistics.
+    """
+    response_content = handle_get_connection_pool_stats()
+    return HttpResponse(response_content[0], status=response_content[1], content_type="application/json")
+
+
+def respond_get_index(request: HttpRequest) -> HttpResponse:
+    """Returns the default response.
+
+    Parameters
+    ----------
+    request: HttpRequest
+        Request object.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing a default 200 status code.
+    """
+    return HttpResponse(HTTP_200_MESSAGE, 200)
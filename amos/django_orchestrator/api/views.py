@@ -1,21 +1,46 @@
 """This module contains the views exposed to the user."""
 from django.http import HttpResponse
+from django.http.response import HttpResponseBase
 from rest_framework.decorators import api_view
 from rest_framework.request import Request
-from api.view_handlers import (
-    handle_get_trained_city_model,
-    handle_persist_sight_image,
-    handle_add_new_city,
-    handle_get_supported_cities,
-    HTTP_200_MESSAGE,
-    handle_get_latest_city_model_version,
+from api.view_responses import (
+    respond_get_trained_city_model,
+    respond_persist_sight_image,
+    respond_persist_sight_images,
+    respond_add_new_city,
+    respond_get_supported_cities,
+    respond_get_latest_city_model_version,
+    respond_get_connection_pool_stats,
+    respond_get_city_model_metadata,
+    respond_get_models_metadata,
+    respond_get_crawler_job,
+    respond_get_index,
 )
 
 
 @api_view(["GET"])
-def get_trained_city_model(request: Request, city: str) -> HttpResponse:
+def get_trained_city_model(request: Request, city: str) -> HttpResponseBase:
     """Returns a trained city model as a .pt file.
 
+    Parameters
+    ----------
+    request: Request
+        Request object.
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    response: HttpResponseBase
+        Response object streaming the trained model as a .pt file.
+    """
+    return respond_get_trained_city_model(request, city)
+
+
+@api_view(["GET"])
+def get_city_model_metadata(request: Request, city: str) -> HttpResponse:
+    """Returns the version, size, SHA-256 hash, id and class names of a city's current model.
+
     Parameters
     ----------
     request: Request
@@ -26,10 +51,26 @@ def get_trained_city_model(request: Request, city: str) -> HttpResponse:
     Returns
     -------
     response: HttpResponse
-        Response object containing the trained model as a .pt file.
+        Response object containing the JSON serialized model metadata.
     """
-    response = handle_get_trained_city_model(city.replace(' ', '_'))
-    return HttpResponse(response[0], status=response[1])
+    return respond_get_city_model_metadata(request, city)
+
+
+@api_view(["GET"])
+def get_models_metadata(request: Request) -> HttpResponse:
+    """Returns the current model metadata of all requested (by default: all supported) cities at once.
+
+    Parameters
+    ----------
+    request: Request
+        Request object, optionally carrying the comma-separated cities query parameter.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the JSON serialized model metadata.
+    """
+    return respond_get_models_metadata(request)
 
 
 @api_view(["GET"])
@@ -48,8 +89,7 @@ def get_latest_city_model_version(request: Request, city: str) -> HttpResponse:
     response: HttpResponse
         Response object containing the latest model version.
     """
-    response = handle_get_latest_city_model_version(city.replace(' ', '_'))
-    return HttpResponse(response[0], status=response[1])
+    return respond_get_latest_city_model_version(request, city)
 
 
 @api_view(["POST"])
@@ -68,9 +108,26 @@ def persist_sight_image(request: Request, city: str) -> HttpResponse:
     response: HttpResponse
         Response object containing a status message.
     """
-    image = request.FILES["image"] if "image" in request.FILES else None
-    response = handle_persist_sight_image(city.replace(' ', '_'), image)
-    return HttpResponse(response[0], status=response[1])
+    return respond_persist_sight_image(request, city)
+
+
+@api_view(["POST"])
+def persist_sight_images(request: Request, city: str) -> HttpResponse:
+    """Persists a batch of images of a given city, sent as multipart form data or as a tar or zip archive.
+
+    Parameters
+    ----------
+    request: Request
+        Request object.
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the outcome per image.
+    """
+    return respond_persist_sight_images(request, city)
 
 
 @api_view(["POST"])
@@ -87,10 +144,28 @@ def add_new_city(request: Request, city: str) -> HttpResponse:
     Returns
     -------
     response: HttpResponse
-        Response object containing a default 200 HTTP message.
+        Response object containing the id of the city's crawler job, if any.
     """
-    response = handle_add_new_city(city.replace(' ', '_'))
-    return HttpResponse(response[0], status=response[1])
+    return respond_add_new_city(request, city)
+
+
+@api_view(["GET"])
+def get_crawler_job(request: Request, job_id: str) -> HttpResponse:
+    """Returns the status of a crawler job.
+
+    Parameters
+    ----------
+    request: Request
+        Request object.
+    job_id: str
+        Id of the crawler job.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the JSON serialized job.
+    """
+    return respond_get_crawler_job(request, job_id)
 
 
 @api_view(["GET"])
@@ -107,8 +182,28 @@ def get_supported_cities(request: Request) -> HttpResponse:
     response: HttpResponse
         Response object containing the list of supported cities.
     """
-    response_content = handle_get_supported_cities()
-    return HttpResponse(response_content[0], status=response_content[1])
+    return respond_get_supported_cities(request)
+
+
+@api_view(["GET"])
+def get_connection_pool_stats(request: Request) -> HttpResponse:
+    """Returns the usage statistics of the data warehouse connection pool of the serving worker.
+
+    Parameters
+    ----------
+    request: Request
+        Request object.
+
+    Returns
+    -------
+    response: HttpResponse
+        Response object containing the connection pool statistics.
+
+    Notes
+    -----
+    This endpoint is provided for monitoring purposes, e.g. to size the pool.
+    """
+    return respond_get_connection_pool_stats(request)
 
 
 @api_view(["GET"])
@@ -129,4 +224,4 @@ def get_index(request):
     -----
     This endpoint is only provided as a best practice.
     """
-    return HttpResponse(HTTP_200_MESSAGE, 200)
+    return respond_get_index(request)
@@ -0,0 +1,161 @@
+"""This module contains a benchmark comparing the former image data marts carrying the image files to the thin ones.
+
+Both mart variants of a supported city are built from the integration layer as temporary tables, which measures the
+cost of a full refresh. The incremental refresh is measured by marking all images of the city as dirty. Afterwards the
+label queries of the model training service are run against both variants. Everything happens inside a transaction
+that is rolled back, hence the data warehouse is left untouched, e.g.
+
+    PGHOST=... PGDATABASE=... PGUSER=... PGPORT=... PGPASSWORD=... \
+        python benchmarks/data_mart_benchmark.py --city berlin --calls 20
+"""
+import argparse
+import os
+import sys
+from statistics import mean
+from time import perf_counter
+from typing import Tuple
+from psycopg2 import connect
+from psycopg2.extensions import cursor as Cursor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_django.config import config  # noqa: E402
+
+_FAT_MART_QUERY = (
+    "CREATE TEMPORARY TABLE fat_mart AS "
+    "SELECT DISTINCT ON (images.image_id) images.image_id, images.image_file, images.image_labels, "
+    "resolutions.resolution_height, resolutions.resolution_width "
+    "FROM integration_layer.fact_sights AS facts "
+    "JOIN integration_layer.dim_sights_images AS images ON images.image_id = facts.image_id "
+    "JOIN integration_layer.dim_sights_resolutions AS resolutions ON resolutions.resolution_id = facts.resolution_id "
+    "WHERE facts.city_id = %(city_id)s ORDER BY images.image_id"
+)
+_THIN_MART_QUERY = (
+    "CREATE TEMPORARY TABLE thin_mart AS "
+    "SELECT DISTINCT ON (images.image_id) images.image_id, images.image_labels, resolutions.resolution_height, "
+    "resolutions.resolution_width, timestamps.timestamp_unix "
+    "FROM integration_layer.fact_sights AS facts "
+    "JOIN integration_layer.dim_sights_images AS images ON images.image_id = facts.image_id "
+    "JOIN integration_layer.dim_sights_resolutions AS resolutions ON resolutions.resolution_id = facts.resolution_id "
+    "JOIN integration_layer.dim_sights_timestamps AS timestamps ON timestamps.timestamp_id = facts.timestamp_id "
+    "WHERE facts.city_id = %(city_id)s ORDER BY images.image_id, timestamps.timestamp_unix"
+)
+_MART_INDEX_QUERIES = {
+    'fat_mart': ["CREATE UNIQUE INDEX ON fat_mart(image_id)"],
+    'thin_mart': ["CREATE UNIQUE INDEX ON thin_mart(image_id)",
+                  "CREATE INDEX ON thin_mart(image_id) WHERE image_labels IS NOT NULL"],
+}
+_DIRTY_CITY_QUERY = (
+    "INSERT INTO integration_layer.dirty_sight_images(city_id, image_id) "
+    "SELECT DISTINCT facts.city_id, facts.image_id FROM integration_layer.fact_sights AS facts "
+    "WHERE facts.city_id = %(city_id)s ON CONFLICT DO NOTHING"
+)
+# label queries of the model training service, see mts/yolov5/trainer_endpoint.py
+_LABEL_QUERIES = {
+    'image ids': "SELECT image_id FROM {mart} WHERE image_labels IS NOT NULL",
+    'raw labels': "SELECT image_labels FROM {mart} WHERE image_labels IS NOT NULL",
+    'label ids': (
+        "SELECT image_id FROM {mart} AS city_mart WHERE image_labels IS NOT NULL AND EXISTS ("
+        "SELECT * FROM unnest(city_mart.image_labels) AS bounding_box WHERE upper(regexp_replace("
+        "replace(replace(replace(bounding_box.box_label, ' ', ''), '\\', ''), '\"', ''), '[^\\x00-\\x7F]+', '')) "
+        "= ANY(%(labels)s))"
+    ),
+}
+
+
+def _get_duration_ms(cursor: Cursor, query: str, parameters: dict) -> float:
+    """Returns the client-side duration of a single execution of the passed query.
+
+    Parameters
+    ----------
+    cursor: Cursor
+        Cursor of the benchmark connection.
+    query: str
+        Query to run.
+    parameters: dict
+        Named query parameters to bind.
+
+    Returns
+    -------
+    duration_ms: float
+        Duration in milliseconds.
+    """
+    start = perf_counter()
+    cursor.execute(query, parameters)
+    if cursor.description is not None:
+        cursor.fetchall()
+    return (perf_counter() - start) * 1000
+
+
+def build_marts(cursor: Cursor, city_id: int) -> Tuple[float, float, float]:
+    """Builds both mart variants of the passed city and refreshes its actual mart incrementally.
+
+    Parameters
+    ----------
+    cursor: Cursor
+        Cursor of the benchmark connection, inside a transaction.
+    city_id: int
+        Key of the city.
+
+    Returns
+    -------
+    fat_build_ms: float
+        Duration of a full refresh of the former mart incl. the image files.
+    thin_build_ms: float
+        Duration of a full refresh of the thin mart.
+    incremental_refresh_ms: float
+        Duration of an incremental refresh with all images of the city marked as dirty.
+    """
+    durations = []
+    for mart, query in (('fat_mart', _FAT_MART_QUERY), ('thin_mart', _THIN_MART_QUERY)):
+        start = perf_counter()
+        cursor.execute(query, {'city_id': city_id})
+        for index_query in _MART_INDEX_QUERIES[mart]:
+            cursor.execute(index_query)
+        cursor.execute(f'ANALYZE {mart}')
+        durations.append((perf_counter() - start) * 1000)
+
+    cursor.execute(_DIRTY_CITY_QUERY, {'city_id': city_id})
+    durations.append(_get_duration_ms(cursor, 'SELECT refresh_dirty_data_marts()', {}))
+    return durations[0], durations[1], durations[2]
+
+
+def main() -> None:
+    """Benchmarks both mart variants of the passed city and prints a comparison table."""
+    parser = argparse.ArgumentParser(description='Compares the former image data marts to the thin ones.')
+    parser.add_argument('--city', required=True, help='supported city with labelled images')
+    parser.add_argument('--calls', type=int, default=20, help='number of measured calls per query and variant')
+    args = parser.parse_args()
+    city = args.city.upper()
+
+    with connect(**config()) as connection:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT city_id FROM integration_layer.dim_sights_cities WHERE city_name = %s",
+                               (city,))
+                found_city = cursor.fetchone()
+                if found_city is None:
+                    sys.exit(f'{city} is not supported.')
+                cursor.execute("SELECT (image_labels[1]).box_label FROM integration_layer.dim_sights_images "
+                               "WHERE image_labels IS NOT NULL AND cardinality(image_labels) > 0 LIMIT 1")
+                found_label = cursor.fetchone()
+                parameters = {'labels': [found_label[0].upper().replace(' ', '')] if found_label else []}
+
+                fat_build_ms, thin_build_ms, incremental_refresh_ms = build_marts(cursor, found_city[0])
+                print(f'{"refresh":<24}{"fat ms":>12}{"thin ms":>12}')
+                print(f'{"full":<24}{fat_build_ms:>12.1f}{thin_build_ms:>12.1f}')
+                print(f'{"incremental (all dirty)":<24}{"":>12}{incremental_refresh_ms:>12.1f}\n')
+
+                print(f'{"label query":<24}{"fat ms":>12}{"thin ms":>12}')
+                for name, query in _LABEL_QUERIES.items():
+                    fat_ms, thin_ms = (
+                        mean(_get_duration_ms(cursor, query.format(mart=mart), parameters) for _ in range(args.calls))
+                        for mart in ('fat_mart', 'thin_mart')
+                    )
+                    print(f'{name:<24}{fat_ms:>12.2f}{thin_ms:>12.2f}')
+        finally:
+            connection.rollback()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""This module contains a benchmark comparing the row-level and the set-based image load jobs of the data warehouse.
+
+The same synthetic images are pushed into the load layer once with the row-level trigger (load_images_into_dwh) and
+once with the statement-level trigger (load_image_batch_into_dwh) enabled. Each run happens inside a transaction that
+is rolled back afterwards, hence no synthetic images remain. The triggers are swapped via ALTER TABLE, which blocks
+concurrent pushes while the benchmark runs - use a disposable data warehouse initialized with database_init.sql, e.g.
+
+    PGHOST=... PGDATABASE=... PGUSER=... PGPORT=... PGPASSWORD=... \
+        python benchmarks/image_load_benchmark.py --images 10000 --batch-size 1000
+"""
+import argparse
+import os
+import sys
+from time import perf_counter
+from typing import List, Tuple
+from uuid import uuid4
+from psycopg2 import Binary, connect
+from psycopg2.extensions import connection as Connection
+from psycopg2.extras import execute_values
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_django.config import config  # noqa: E402
+
+_ROW_TRIGGER = 'benchmark_load_images_into_dwh_trigger'
+_BATCH_TRIGGER = 'load_image_batch_into_dwh_trigger'
+_RESOLUTIONS = [(480, 640), (720, 1280), (1080, 1920), (3000, 4000)]
+_IMAGE_DML_QUERY = (
+    "INSERT INTO load_layer.sight_images(sight_image, sight_city, "
+    "sight_image_height, sight_image_width, sight_image_data_source) VALUES %s"
+)
+
+
+def _get_synthetic_images(n_images: int, image_bytes: int, n_cities: int) -> List[Tuple[object, ...]]:
+    """Returns load layer rows of distinct synthetic images.
+
+    Parameters
+    ----------
+    n_images: int
+        Number of images.
+    image_bytes: int
+        Size of every image.
+    n_cities: int
+        Number of cities the images are spread across.
+
+    Returns
+    -------
+    rows: list[tuple[object]]
+        Image, city, height, width and data source per image.
+    """
+    run_id = uuid4().hex
+    return [
+        (Binary(os.urandom(image_bytes)), f'benchmark_city_{index % n_cities}',
+         *_RESOLUTIONS[index % len(_RESOLUTIONS)], f'benchmark-{run_id}-{index}')
+        for index in range(n_images)
+    ]
+
+
+def run_load(connection: Connection, rows: List[Tuple[object, ...]], batch_size: int, is_row_level: bool) -> float:
+    """Pushes the passed rows into the load layer with the chosen load job and rolls everything back afterwards.
+
+    Parameters
+    ----------
+    connection: Connection
+        Non-autocommit data warehouse connection.
+    rows: list[tuple[object]]
+        Load layer rows.
+    batch_size: int
+        Number of rows pushed per insert statement.
+    is_row_level: bool
+        Whether to load with the row-level instead of the set-based trigger.
+
+    Returns
+    -------
+    duration_seconds: float
+        Duration of all pushes including their load jobs.
+    """
+    try:
+        with connection.cursor() as cursor:
+            if is_row_level:
+                cursor.execute(f'ALTER TABLE load_layer.sight_images DISABLE TRIGGER {_BATCH_TRIGGER}')
+                cursor.execute(f'CREATE TRIGGER {_ROW_TRIGGER} AFTER INSERT ON load_layer.sight_images '
+                               'FOR EACH ROW EXECUTE PROCEDURE load_images_into_dwh()')
+
+            start = perf_counter()
+            for batch_start in range(0, len(rows), batch_size):
+                execute_values(cursor, _IMAGE_DML_QUERY, rows[batch_start:batch_start + batch_size],
+                               page_size=batch_size)
+            duration_seconds = perf_counter() - start
+
+            cursor.execute("SELECT count(*) FROM integration_layer.dim_sights_images "
+                           "WHERE image_source LIKE 'benchmark-%'")
+            n_loaded_images = cursor.fetchone()[0]
+            if n_loaded_images != len(rows):
+                print(f'Warning: {n_loaded_images} of {len(rows)} images loaded.')
+    finally:
+        connection.rollback()
+
+    return duration_seconds
+
+
+def main() -> None:
+    """Runs both load jobs on the same synthetic images and prints a comparison."""
+    parser = argparse.ArgumentParser(description='Compares the row-level and the set-based image load jobs.')
+    parser.add_argument('--images', type=int, default=10000, help='number of synthetic images')
+    parser.add_argument('--batch-size', type=int, default=1000, help='number of images pushed per insert statement')
+    parser.add_argument('--image-bytes', type=int, default=4096, help='size of every synthetic image')
+    parser.add_argument('--cities', type=int, default=1, help='number of cities the images are spread across')
+    args = parser.parse_args()
+
+    rows = _get_synthetic_images(args.images, args.image_bytes, args.cities)
+    with connect(**config()) as connection:
+        print(f'{"load job":<12}{"images":>10}{"seconds":>10}{"images/s":>12}')
+        for name, is_row_level in (('row-level', True), ('set-based', False)):
+            duration_seconds = run_load(connection, rows, args.batch_size, is_row_level)
+            print(f'{name:<12}{len(rows):>10}{duration_seconds:>10.2f}{len(rows) / duration_seconds:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
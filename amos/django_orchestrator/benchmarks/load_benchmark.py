@@ -0,0 +1,144 @@
+"""This module contains a load test comparing the throughput and tail latency of running orchestrator instances.
+
+Start the same orchestrator once via WSGI and once via ASGI, e.g.
+
+    python manage.py runserver 0.0.0.0:8002
+    uvicorn django_orchestrator.asgi:application --host 0.0.0.0 --port 8003 --workers 4
+
+and compare both with
+
+    python benchmarks/load_benchmark.py --target wsgi=http://0.0.0.0:8002 --target asgi=http://0.0.0.0:8003 \
+        --path /api/cities/berlin/model/version --path /api/cities/berlin/model --concurrency 64
+"""
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+from time import perf_counter
+from typing import Dict, List, NamedTuple, Tuple
+import requests
+
+_THREAD_LOCAL = threading.local()
+
+
+class LoadTestResult(NamedTuple):
+    """Aggregated measurements of a single load test run."""
+    target: str
+    n_requests: int
+    n_errors: int
+    duration_seconds: float
+    latencies_seconds: List[float]
+
+    @property
+    def throughput(self) -> float:
+        """Successfully answered requests per second."""
+        return (self.n_requests - self.n_errors) / self.duration_seconds
+
+    def percentile(self, percentage: float) -> float:
+        """Returns the given latency percentile in milliseconds (nearest-rank method)."""
+        if not self.latencies_seconds:
+            return float('nan')
+        sorted_latencies = sorted(self.latencies_seconds)
+        rank = max(1, ceil(percentage / 100 * len(sorted_latencies)))
+        return sorted_latencies[rank - 1] * 1000
+
+
+def run_load_test(target: str, base_url: str, paths: List[str], n_requests: int, concurrency: int,
+                  timeout_seconds: float) -> LoadTestResult:
+    """Sends the given number of requests with the given concurrency, cycling through the passed paths.
+
+    Parameters
+    ----------
+    target: str
+        Name of the tested instance.
+    base_url: str
+        Base URL of the tested instance.
+    paths: list[str]
+        Request paths, requested in turns.
+    n_requests: int
+        Total number of requests.
+    concurrency: int
+        Number of simultaneously open requests.
+    timeout_seconds: float
+        Timeout per request.
+
+    Returns
+    -------
+    result: LoadTestResult
+        Measured latencies and errors.
+    """
+    urls = [base_url.rstrip('/') + path for path in paths]
+
+    def _request(index: int) -> Tuple[bool, float]:
+        session = getattr(_THREAD_LOCAL, 'session', None)
+        if session is None:
+            session = _THREAD_LOCAL.session = requests.Session()
+
+        start = perf_counter()
+        try:
+            with session.get(urls[index % len(urls)], timeout=timeout_seconds, stream=True) as response:
+                for _ in response.iter_content(64 * 1024):  # the whole body counts, e.g. for model downloads
+                    pass
+                is_successful = response.status_code < 500
+        except requests.exceptions.RequestException:
+            is_successful = False
+        return is_successful, perf_counter() - start
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(_request, range(n_requests)))
+    duration_seconds = perf_counter() - start
+
+    return LoadTestResult(
+        target=target,
+        n_requests=n_requests,
+        n_errors=sum(1 for is_successful, _ in outcomes if not is_successful),
+        duration_seconds=duration_seconds,
+        latencies_seconds=[latency for is_successful, latency in outcomes if is_successful],
+    )
+
+
+def _parse_targets(raw_targets: List[str]) -> Dict[str, str]:
+    """Returns the passed name=url pairs as a dictionary.
+
+    Parameters
+    ----------
+    raw_targets: list[str]
+        Targets in the form name=url.
+
+    Returns
+    -------
+    targets: dict[str, str]
+        Base URLs by target name.
+    """
+    targets = {}
+    for raw_target in raw_targets:
+        name, separator, url = raw_target.partition('=')
+        if not separator:
+            raise argparse.ArgumentTypeError(f'Invalid target {raw_target}, expected name=url')
+        targets[name] = url
+    return targets
+
+
+def main() -> None:
+    """Runs the load test against all passed targets and prints a comparison table."""
+    parser = argparse.ArgumentParser(description='Compares the throughput and latency of orchestrator instances.')
+    parser.add_argument('--target', action='append', required=True, help='name=base_url of an instance to test')
+    parser.add_argument('--path', action='append', help='request path, can be passed multiple times')
+    parser.add_argument('--requests', type=int, default=2000, help='number of requests per target')
+    parser.add_argument('--concurrency', type=int, default=64, help='number of simultaneous requests')
+    parser.add_argument('--warmup', type=int, default=100, help='number of unmeasured requests per target')
+    parser.add_argument('--timeout', type=float, default=60.0, help='timeout per request in seconds')
+    args = parser.parse_args()
+    paths = args.path or ['/api/cities/']
+
+    print(f'{"target":<10}{"requests":>10}{"errors":>8}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+    for target, base_url in _parse_targets(args.target).items():
+        run_load_test(target, base_url, paths, args.warmup, args.concurrency, args.timeout)
+        result = run_load_test(target, base_url, paths, args.requests, args.concurrency, args.timeout)
+        print(f'{result.target:<10}{result.n_requests:>10}{result.n_errors:>8}{result.throughput:>10.1f}'
+              f'{result.percentile(50):>10.1f}{result.percentile(99):>10.1f}{result.percentile(100):>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""This module contains a micro-benchmark of the planning time saved by the prepared hot data warehouse queries.
+
+Every hot query of the data handler is run repeatedly once as a plain parameterized query and once via its prepared
+statement on the same connection. Postgres reports the planning time of each call via EXPLAIN (ANALYZE, SUMMARY),
+the round trip time is measured without EXPLAIN, e.g.
+
+    PGHOST=... PGDATABASE=... PGUSER=... PGPORT=... PGPASSWORD=... \
+        python benchmarks/prepared_statements_benchmark.py --city berlin --calls 500
+"""
+import argparse
+import os
+import sys
+from statistics import mean
+from time import perf_counter
+from typing import List, NamedTuple, Tuple
+from psycopg2 import connect
+from psycopg2.extensions import cursor as Cursor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_django.config import config  # noqa: E402
+from data_django.exec_sql import PreparedStatement  # noqa: E402
+from data_django.handler import CITY_MODELS_METADATA_STATEMENT, LATEST_MODEL_VERSION_STATEMENT, \
+    MODEL_CHUNK_STATEMENT  # noqa: E402
+
+
+class StatementTimings(NamedTuple):
+    """Mean per call timings of a single statement in milliseconds."""
+    name: str
+    planning_ms: float
+    prepared_planning_ms: float
+    round_trip_ms: float
+    prepared_round_trip_ms: float
+
+
+def _get_planning_ms(cursor: Cursor, statement: str, parameters: Tuple[object, ...]) -> float:
+    """Returns the planning time Postgres reports for a single execution of the passed statement.
+
+    Parameters
+    ----------
+    cursor: Cursor
+        Cursor of the benchmark connection.
+    statement: str
+        Query or EXECUTE statement to explain.
+    parameters: tuple[object]
+        Query parameters to bind.
+
+    Returns
+    -------
+    planning_ms: float
+        Planning time in milliseconds.
+    """
+    cursor.execute(f'EXPLAIN (ANALYZE, SUMMARY, FORMAT JSON) {statement}', parameters)
+    return float(cursor.fetchone()[0][0]['Planning Time'])
+
+
+def _get_round_trip_ms(cursor: Cursor, statement: str, parameters: Tuple[object, ...]) -> float:
+    """Returns the client-side duration of a single execution of the passed statement.
+
+    Parameters
+    ----------
+    cursor: Cursor
+        Cursor of the benchmark connection.
+    statement: str
+        Query or EXECUTE statement to run.
+    parameters: tuple[object]
+        Query parameters to bind.
+
+    Returns
+    -------
+    round_trip_ms: float
+        Round trip time in milliseconds.
+    """
+    start = perf_counter()
+    cursor.execute(statement, parameters)
+    cursor.fetchall()
+    return (perf_counter() - start) * 1000
+
+
+def benchmark_statement(cursor: Cursor, statement: PreparedStatement, parameters: Tuple[object, ...], n_calls: int,
+                        n_warmup_calls: int) -> StatementTimings:
+    """Measures the mean planning and round trip time of a hot query with and without preparing it.
+
+    Parameters
+    ----------
+    cursor: Cursor
+        Cursor of the benchmark connection.
+    statement: PreparedStatement
+        Hot query to measure.
+    parameters: tuple[object]
+        Query parameters to bind.
+    n_calls: int
+        Number of measured calls per variant.
+    n_warmup_calls: int
+        Number of unmeasured calls per variant, Postgres switches to a cached generic plan after five executions.
+
+    Returns
+    -------
+    timings: StatementTimings
+        Mean per call timings.
+    """
+    cursor.execute('DEALLOCATE PREPARE ALL')
+    cursor.execute(statement.prepare_statement)
+    execute_statement = statement.execute_statement(len(parameters))
+
+    timings = []
+    for measure in (_get_planning_ms, _get_round_trip_ms):
+        for query in (statement.query, execute_statement):
+            for _ in range(n_warmup_calls):
+                measure(cursor, query, parameters)
+            timings.append(mean(measure(cursor, query, parameters) for _ in range(n_calls)))
+
+    return StatementTimings(statement.name, *timings)
+
+
+def main() -> None:
+    """Benchmarks all hot queries for the passed city and prints a comparison table."""
+    parser = argparse.ArgumentParser(description='Measures the planning time saved by prepared statements.')
+    parser.add_argument('--city', required=True, help='supported city with a trained model')
+    parser.add_argument('--calls', type=int, default=500, help='number of measured calls per query and variant')
+    parser.add_argument('--warmup', type=int, default=10, help='number of unmeasured calls per query and variant')
+    parser.add_argument('--chunk-bytes', type=int, default=64 * 1024, help='model bytes fetched per chunk query')
+    args = parser.parse_args()
+    city = args.city.upper()
+
+    with connect(**config()) as connection:
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(CITY_MODELS_METADATA_STATEMENT.query, ([city],))
+            found_metadata = cursor.fetchall()
+            if not found_metadata:
+                sys.exit(f'No trained model available for {city}.')
+            trained_model_id = found_metadata[0][1]
+
+            benchmarks: List[Tuple[PreparedStatement, Tuple[object, ...]]] = [
+                (CITY_MODELS_METADATA_STATEMENT, ([city],)),
+                (LATEST_MODEL_VERSION_STATEMENT, (city,)),
+                (MODEL_CHUNK_STATEMENT, (1, args.chunk_bytes, trained_model_id)),
+            ]
+            print(f'{"statement":<24}{"plan ms":>10}{"prep ms":>10}{"saved ms":>10}{"rtt ms":>10}{"prep rtt":>10}')
+            for statement, parameters in benchmarks:
+                timings = benchmark_statement(cursor, statement, parameters, args.calls, args.warmup)
+                print(f'{timings.name:<24}{timings.planning_ms:>10.3f}{timings.prepared_planning_ms:>10.3f}'
+                      f'{timings.planning_ms - timings.prepared_planning_ms:>10.3f}'
+                      f'{timings.round_trip_ms:>10.3f}{timings.prepared_round_trip_ms:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
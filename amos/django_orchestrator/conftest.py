@@ -26,7 +26,7 @@ class CursorMock:
     def __exit__(self, exc_type, exc_val, exc_tb):
         return self
 
-    def execute(self, sql_string):
+    def execute(self, sql_string, parameters=None):
         pass
 
     def fetchall(self):
@@ -38,6 +38,7 @@ class CursorMock:
 
 class ConnectionMock:
     autocommit = False
+    closed = 0
 
     def __enter__(self):
         return self
@@ -51,16 +52,14 @@ class ConnectionMock:
     def commit(self):
         pass
 
+    def close(self):
+        self.closed = 1
 
-class ConnectionExceptionMock:
-    autocommit = False
+    def get_transaction_status(self):
+        return 0
 
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        return self
 
+class ConnectionExceptionMock(ConnectionMock):
     def cursor(self):
         return CursorExceptionMock()
 
@@ -72,7 +71,7 @@ class CursorExceptionMock(CursorMock):
     def __exit__(self, exc_type, exc_val, exc_tb):
         return self
 
-    def execute(self, sql_string):
+    def execute(self, sql_string, parameters=None):
         raise Exception('SELECT abc FROM xyz')
 
 
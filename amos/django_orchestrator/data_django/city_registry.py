@@ -0,0 +1,110 @@
+"""This module contains the in-process, time-to-live cache of the cities currently supported by trained models."""
+from hashlib import md5
+from json import dumps
+from threading import Lock
+from time import monotonic
+from typing import FrozenSet, List, NamedTuple, Optional
+import os
+from data_django.exec_sql import exec_dql_query
+
+_REGISTRY: Optional['CityRegistry'] = None
+_REGISTRY_LOCK = Lock()
+
+
+class CityRegistry(NamedTuple):
+    """Immutable snapshot of the supported cities including their pre-serialized API representation."""
+    cities: List[str]
+    upper_cities: FrozenSet[str]
+    json_body: str
+    etag: str
+    loaded_at: float
+
+
+def get_city_registry() -> CityRegistry:
+    """Returns the cached supported cities, reloading them from the data warehouse once the TTL has expired.
+
+    Returns
+    -------
+    registry: CityRegistry
+        Current supported cities snapshot.
+
+    Notes
+    -----
+    The TTL is read from the CITY_REGISTRY_TTL_SECONDS environment variable (default: 60 seconds).
+    If the data warehouse cannot be reached, the previous snapshot (if any) is served instead.
+    """
+    global _REGISTRY
+    ttl_seconds = float(os.getenv('CITY_REGISTRY_TTL_SECONDS', 60))
+
+    with _REGISTRY_LOCK:  # a single reload per process, concurrent requests wait for its result
+        if _REGISTRY is None or monotonic() - _REGISTRY.loaded_at >= ttl_seconds:
+            reloaded_registry = _load_city_registry()
+            if reloaded_registry is not None:
+                _REGISTRY = reloaded_registry
+            elif _REGISTRY is None:
+                return _create_city_registry([])  # not cached, the next access retries
+
+        return _REGISTRY
+
+
+def invalidate_city_registry() -> None:
+    """Drops the cached supported cities so that the next access reloads them from the data warehouse."""
+    global _REGISTRY
+
+    with _REGISTRY_LOCK:
+        _REGISTRY = None
+
+
+def is_supported_city(city: str) -> bool:
+    """Returns whether a trained model exists for the passed city.
+
+    Parameters
+    ----------
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    is_supported: bool
+        Whether the city is supported.
+    """
+    return city.upper() in get_city_registry().upper_cities
+
+
+def _create_city_registry(cities: List[str]) -> CityRegistry:
+    """Returns a new supported cities snapshot for the given city names.
+
+    Parameters
+    ----------
+    cities: list[str]
+        Alphabetically ordered city names.
+
+    Returns
+    -------
+    registry: CityRegistry
+        Supported cities snapshot.
+    """
+    json_body = dumps({'cities': cities})
+    return CityRegistry(
+        cities=cities,
+        upper_cities=frozenset(city.upper() for city in cities),
+        json_body=json_body,
+        etag=f'"{md5(json_body.encode("utf-8")).hexdigest()}"',
+        loaded_at=monotonic(),
+    )
+
+
+def _load_city_registry() -> Optional[CityRegistry]:
+    """Loads the supported cities from the data warehouse.
+
+    Returns
+    -------
+    registry: CityRegistry or None
+        Supported cities snapshot, None if the query failed.
+    """
+    cities_query = 'select distinct(city_name) from data_mart_layer.current_trained_models order by city_name asc'
+    cities = exec_dql_query(cities_query, return_result=True)
+    if cities is None:
+        return None
+
+    return _create_city_registry(list(map(lambda _city: _city[0], cities)))
@@ -0,0 +1,46 @@
+"""This module contains the data warehouse backed counter of requests for cities that are not supported yet."""
+from typing import Callable, Optional
+from data_django.exec_sql import exec_dql_query
+
+
+def count_city_request(city: str, threshold: int, on_threshold_reached: Optional[Callable[[str], None]] = None) \
+        -> Optional[int]:
+    """Atomically increments the request counter of the passed city and fires the hook once the threshold is reached.
+
+    Parameters
+    ----------
+    city: str
+        Name of the requested city.
+    threshold: int
+        Number of requests after which the hook is fired.
+    on_threshold_reached: callable or None, default=None
+        Hook called with the upper case city name for every request from the threshold on, hence it has to ignore
+        cities whose crawl is already active or done.
+
+    Returns
+    -------
+    n_requests: int or None
+        Number of requests for the city including the current one, None if the counter could not be updated.
+
+    Notes
+    -----
+    Increment and read happen in a single upsert statement that locks the city's counter row. Concurrent requests,
+    regardless of the worker or host serving them, are therefore serialized. The hook is fired beyond the threshold as
+    well, so that a failed crawl is re-triggered by the next request instead of never again.
+    """
+    upsert_query = (
+        "INSERT INTO integration_layer.city_requests AS requests(city_name, n_requests) VALUES (%s, 1) "
+        "ON CONFLICT (city_name) DO UPDATE SET n_requests = requests.n_requests + 1, last_requested_at = now() "
+        "RETURNING n_requests"
+    )
+    formatted_city = city.upper()
+    counter = exec_dql_query(upsert_query, return_result=True, filling_parameters=(formatted_city,))
+    if not counter:
+        print(f'Request for {formatted_city} could not be counted.')
+        return None
+
+    n_requests = int(counter[0][0])
+    if n_requests >= threshold and on_threshold_reached is not None:
+        on_threshold_reached(formatted_city)
+
+    return n_requests
@@ -24,3 +24,26 @@ def config():
             raise ReferenceError(f'Environment Variable {env_variable_name} not found')
 
     return db
+
+
+def pool_config():
+    """Reads the optional environment variables tuning the connection pool and returns them as a parsed dictionary.
+
+    Returns
+    -------
+    pool_params: dict
+        Parsed dictionary containing the keyword arguments of the connection pool.
+    """
+    pool_params = {}
+    params = {
+        'min_size': ('PGPOOL_MIN_SIZE', int, 1),
+        'max_size': ('PGPOOL_MAX_SIZE', int, 10),
+        'max_idle_seconds': ('PGPOOL_MAX_IDLE_SECONDS', float, 300.0),
+        'health_check_after_seconds': ('PGPOOL_HEALTH_CHECK_AFTER_SECONDS', float, 30.0),
+        'checkout_timeout_seconds': ('PGPOOL_CHECKOUT_TIMEOUT_SECONDS', float, 10.0),
+    }
+
+    for param, (env_variable_name, cast, default) in params.items():
+        pool_params[param] = cast(os.getenv(env_variable_name, default))
+
+    return pool_params
@@ -0,0 +1,337 @@
+"""This module contains the process-wide PostgreSQL connection pool shared by all data warehouse queries."""
+import os
+from contextlib import contextmanager
+from threading import Condition, Lock
+from time import monotonic
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from psycopg2 import connect, InterfaceError, OperationalError
+from psycopg2.extensions import connection as Connection, TRANSACTION_STATUS_IDLE
+from psycopg2.pool import PoolError
+from .config import config, pool_config
+
+_POOL: Optional['ConnectionPool'] = None
+_POOL_LOCK = Lock()
+_INHERITED_POOLS: List['ConnectionPool'] = []
+
+
+class ConnectionPool:
+    """Thread-safe pool of reusable autocommit connections to the data warehouse.
+
+    Parameters
+    ----------
+    connection_factory: callable
+        Stateless function returning a new, ready-to-use connection.
+    min_size: int, default=1
+        Number of idle connections that are never evicted.
+    max_size: int, default=10
+        Maximum number of simultaneously open connections.
+    max_idle_seconds: float, default=300
+        Idle time after which surplus connections (beyond min_size) are closed.
+    health_check_after_seconds: float, default=30
+        Idle time after which a connection is pinged before being handed out again.
+    checkout_timeout_seconds: float, default=10
+        Maximum time to wait for a free connection before a PoolError is raised.
+    """
+
+    def __init__(self, connection_factory: Callable[[], Connection], min_size: int = 1, max_size: int = 10,
+                 max_idle_seconds: float = 300.0, health_check_after_seconds: float = 30.0,
+                 checkout_timeout_seconds: float = 10.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f'Invalid pool size boundaries: min_size={min_size}, max_size={max_size}')
+
+        self.pid = os.getpid()  # pools must never be shared between forked workers
+        self._connection_factory = connection_factory
+        self._min_size, self._max_size = min_size, max_size
+        self._max_idle_seconds = max_idle_seconds
+        self._health_check_after_seconds = health_check_after_seconds
+        self._checkout_timeout_seconds = checkout_timeout_seconds
+        self._condition = Condition()
+        self._idle: List[Tuple[Connection, float]] = []  # stack of (connection, release time), oldest first
+        self._n_open = self._n_checked_out = self._n_waiting = 0
+        self._n_created = self._n_recycled = self._n_evicted = 0
+        self._is_closed = False
+
+    @contextmanager
+    def connection(self) -> Iterator[Connection]:
+        """Checks out a connection for the duration of the with block and returns it to the pool afterwards.
+
+        Yields
+        ------
+        connection: Connection
+            Healthy autocommit connection.
+        """
+        connection, is_broken = self._acquire(), False
+        try:
+            yield connection
+        except (InterfaceError, OperationalError):
+            is_broken = True
+            raise
+        finally:
+            self._release(connection, is_broken)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the current pool usage statistics.
+
+        Returns
+        -------
+        stats: dict[str, int]
+            Open, idle, checked out and waiting connections as well as created, recycled and evicted totals.
+        """
+        with self._condition:
+            return {
+                'min_size': self._min_size,
+                'max_size': self._max_size,
+                'open': self._n_open,
+                'idle': len(self._idle),
+                'checked_out': self._n_checked_out,
+                'waiting': self._n_waiting,
+                'created': self._n_created,
+                'recycled': self._n_recycled,
+                'evicted': self._n_evicted,
+            }
+
+    def close(self) -> None:
+        """Closes all idle connections; checked out connections are closed when they are released."""
+        with self._condition:
+            while self._idle:
+                self._close_connection(self._idle.pop()[0])
+                self._n_open -= 1
+            self._is_closed = True
+            self._condition.notify_all()
+
+    def _acquire(self) -> Connection:
+        """Returns an idle connection or opens a new one, waiting for a free slot if the pool is exhausted.
+
+        Returns
+        -------
+        connection: Connection
+            Checked out connection.
+
+        Raises
+        ------
+        PoolError
+            If no connection became available within the checkout timeout.
+        """
+        deadline = monotonic() + self._checkout_timeout_seconds
+
+        with self._condition:
+            self._n_waiting += 1
+            try:
+                connection, released_at = self._wait_for_slot(deadline)
+            finally:
+                self._n_waiting -= 1
+            self._n_checked_out += 1
+
+        try:  # network round trips happen outside of the lock
+            return self._get_usable_connection(connection, released_at)
+        except Exception:
+            with self._condition:
+                self._n_open -= 1
+                self._n_checked_out -= 1
+                self._condition.notify()
+            raise
+
+    def _wait_for_slot(self, deadline: float) -> Tuple[Optional[Connection], Optional[float]]:
+        """Waits until an idle connection or a free slot for a new connection is available (lock must be held).
+
+        Parameters
+        ----------
+        deadline: float
+            Monotonic time after which waiting is given up.
+
+        Returns
+        -------
+        connection: Connection or None
+            Idle connection, None if a new one has to be opened in the reserved slot.
+        released_at: float or None
+            Monotonic time the idle connection has been returned to the pool.
+
+        Raises
+        ------
+        PoolError
+            If the pool has been closed or no slot became available before the deadline.
+        """
+        while True:
+            if self._is_closed:
+                raise PoolError('Connection pool has already been closed')
+            self._evict_idle_connections()
+            if self._idle:
+                return self._idle.pop()
+            if self._n_open < self._max_size:
+                self._n_open += 1
+                return None, None
+
+            remaining_seconds = deadline - monotonic()
+            if remaining_seconds <= 0:
+                raise PoolError(f'No connection available after {self._checkout_timeout_seconds}s')
+            self._condition.wait(remaining_seconds)
+
+    def _get_usable_connection(self, connection: Optional[Connection], released_at: Optional[float]) -> Connection:
+        """Opens a new connection for a reserved slot or replaces an idle connection that is no longer healthy.
+
+        Parameters
+        ----------
+        connection: Connection or None
+            Idle connection, None for a reserved slot.
+        released_at: float or None
+            Monotonic time the idle connection has been returned to the pool.
+
+        Returns
+        -------
+        connection: Connection
+            Healthy connection.
+        """
+        if connection is None:
+            return self._create_connection()
+        if not self._is_healthy(connection, released_at):
+            self._close_connection(connection)
+            return self._create_connection(is_replacement=True)
+        return connection
+
+    def _release(self, connection: Connection, is_broken: bool = False) -> None:
+        """Returns a checked out connection to the pool or closes it if it is no longer usable.
+
+        Parameters
+        ----------
+        connection: Connection
+            Connection to return.
+        is_broken: bool, default=False
+            Whether the connection failed during usage.
+        """
+        is_broken = is_broken or bool(connection.closed) \
+            or connection.get_transaction_status() != TRANSACTION_STATUS_IDLE
+
+        with self._condition:
+            is_broken = is_broken or self._is_closed
+            self._n_checked_out -= 1
+            if is_broken:
+                self._n_open -= 1
+                self._n_recycled += 1
+            else:
+                self._idle.append((connection, monotonic()))
+            self._condition.notify()
+
+        if is_broken:
+            self._close_connection(connection)
+
+    def _create_connection(self, is_replacement: bool = False) -> Connection:
+        """Opens a new connection and updates the pool statistics.
+
+        Parameters
+        ----------
+        is_replacement: bool, default=False
+            Whether the new connection replaces an unhealthy one.
+
+        Returns
+        -------
+        connection: Connection
+            Newly opened connection.
+        """
+        connection = self._connection_factory()
+        with self._condition:
+            self._n_created += 1
+            self._n_recycled += 1 if is_replacement else 0
+        return connection
+
+    def _evict_idle_connections(self) -> None:
+        """Closes surplus connections that have been idle for too long (lock must be held)."""
+        now = monotonic()
+        while self._idle and self._n_open > self._min_size and now - self._idle[0][1] > self._max_idle_seconds:
+            self._close_connection(self._idle.pop(0)[0])
+            self._n_open -= 1
+            self._n_evicted += 1
+
+    def _is_healthy(self, connection: Connection, released_at: float) -> bool:
+        """Returns whether an idle connection can be handed out again.
+
+        Parameters
+        ----------
+        connection: Connection
+            Idle connection.
+        released_at: float
+            Monotonic time the connection has been returned to the pool.
+
+        Returns
+        -------
+        is_healthy: bool
+            Whether the connection is still usable.
+        """
+        if connection.closed:
+            return False
+        if monotonic() - released_at < self._health_check_after_seconds:
+            return True
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except (InterfaceError, OperationalError):
+            return False
+
+    @staticmethod
+    def _close_connection(connection: Connection) -> None:
+        """Closes the given connection, ignoring already closed ones.
+
+        Parameters
+        ----------
+        connection: Connection
+            Connection to close.
+        """
+        try:
+            connection.close()
+        except (InterfaceError, OperationalError):
+            pass
+
+
+def get_connection_pool() -> ConnectionPool:
+    """Returns the connection pool of the current process, creating it lazily.
+
+    Returns
+    -------
+    pool: ConnectionPool
+        Process-wide connection pool.
+
+    Notes
+    -----
+    Forked workers (e.g. gunicorn with preloading) inherit the pool of their parent. Its sockets belong to the
+    parent, so a fresh pool is created per process while the inherited one is kept referenced: closing or
+    garbage collecting it would terminate the parent's database sessions.
+    """
+    global _POOL
+
+    with _POOL_LOCK:
+        if _POOL is None or _POOL.pid != os.getpid():
+            if _POOL is not None:
+                _INHERITED_POOLS.append(_POOL)
+            _POOL = ConnectionPool(_get_connection_factory(), **pool_config())
+
+    return _POOL
+
+
+def get_connection_pool_stats() -> Dict[str, int]:
+    """Returns the usage statistics of the current process' connection pool.
+
+    Returns
+    -------
+    stats: dict[str, int]
+        Connection pool statistics.
+    """
+    return get_connection_pool().stats()
+
+
+def _get_connection_factory() -> Callable[[], Connection]:
+    """Returns a factory opening autocommit connections with the data warehouse parameters read once.
+
+    Returns
+    -------
+    connection_factory: callable
+        Function opening a new data warehouse connection.
+    """
+    connection_params = config()
+
+    def _connect() -> Connection:
+        connection = connect(**connection_params)
+        connection.autocommit = True
+        return connection
+
+    return _connect
@@ -0,0 +1,112 @@
+"""This module contains the data warehouse backed state of the crawler jobs, shared by all workers and hosts."""
+from typing import Optional, Tuple
+from data_django.exec_sql import exec_dml_query, exec_dql_query
+
+CrawlerJobRow = Tuple[str, str, str, int, Optional[str]]
+
+_JOB_COLUMNS = "job_id, city_name, status, n_attempts, last_error"
+
+
+def create_crawler_job(job_id: str, city: str, stale_seconds: float) -> Optional[CrawlerJobRow]:
+    """Inserts a queued job for the passed city unless the city already has a queued, running or succeeded job.
+
+    Parameters
+    ----------
+    job_id: str
+        Id of the new job.
+    city: str
+        Upper case name of the city to crawl.
+    stale_seconds: float
+        Queued and running jobs not updated for this duration are considered lost (e.g. their worker has been
+        restarted) and marked as failed first, hence they can be replaced.
+
+    Returns
+    -------
+    job: tuple or None
+        Id, city, status, number of attempts and last error of the new or the already existing job, None if the job
+        could not be created.
+
+    Notes
+    -----
+    The partial unique index on the city name admits a single job per city that has not failed, regardless of the
+    worker or host dispatching it. The returned job is new if and only if its id is the passed one.
+    """
+    exec_dml_query(
+        "UPDATE integration_layer.crawler_jobs SET status = 'failed', last_error = 'Job lost by its worker', "
+        "updated_at = now() WHERE city_name = %s AND status IN ('queued', 'running') "
+        "AND updated_at < now() - make_interval(secs => %s)",
+        (city, stale_seconds),
+    )
+    job = exec_dql_query(
+        "INSERT INTO integration_layer.crawler_jobs AS jobs(job_id, city_name) VALUES (%s, %s) "
+        "ON CONFLICT (city_name) WHERE status <> 'failed' DO UPDATE SET city_name = jobs.city_name "
+        f"RETURNING {_JOB_COLUMNS}",
+        return_result=True, filling_parameters=(job_id, city),
+    )
+    return tuple(job[0]) if job else None
+
+
+def update_crawler_job(job_id: str, status: str, n_attempts: int, last_error: Optional[str]) -> bool:
+    """Updates the state of a job that has not failed yet.
+
+    Parameters
+    ----------
+    job_id: str
+        Id of the job.
+    status: str
+        New status.
+    n_attempts: int
+        Number of dispatch attempts so far.
+    last_error: str or None
+        Error of the last failed attempt, None otherwise.
+
+    Returns
+    -------
+    is_updated: bool
+        Whether the job has been updated, False if it has been marked as lost (and possibly replaced) in the meantime.
+    """
+    updated_job = exec_dql_query(
+        "UPDATE integration_layer.crawler_jobs SET status = %s, n_attempts = %s, last_error = %s, updated_at = now() "
+        "WHERE job_id = %s AND status <> 'failed' RETURNING job_id",
+        return_result=True, filling_parameters=(status, n_attempts, last_error, job_id),
+    )
+    return bool(updated_job)
+
+
+def get_crawler_job(job_id: str) -> Optional[CrawlerJobRow]:
+    """Returns the job with the passed id.
+
+    Parameters
+    ----------
+    job_id: str
+        Id of the job.
+
+    Returns
+    -------
+    job: tuple or None
+        Id, city, status, number of attempts and last error of the job, None if it is unknown.
+    """
+    job = exec_dql_query(f"SELECT {_JOB_COLUMNS} FROM integration_layer.crawler_jobs WHERE job_id = %s",
+                         return_result=True, filling_parameters=(job_id,))
+    return tuple(job[0]) if job else None
+
+
+def get_latest_city_crawler_job(city: str) -> Optional[CrawlerJobRow]:
+    """Returns the latest job of the passed city.
+
+    Parameters
+    ----------
+    city: str
+        Upper case name of the city.
+
+    Returns
+    -------
+    job: tuple or None
+        Id, city, status, number of attempts and last error of the latest job, None if the city has never been crawled.
+    """
+    job = exec_dql_query(
+        f"SELECT {_JOB_COLUMNS} FROM integration_layer.crawler_jobs WHERE city_name = %s "
+        "ORDER BY created_at DESC LIMIT 1",
+        return_result=True, filling_parameters=(city,),
+    )
+    return tuple(job[0]) if job else None
@@ -1,10 +1,36 @@
 """This module contains the psycopg2 database programming interface that is used across the application."""
-from typing import Optional, Tuple
-from .config import config
-from psycopg2 import connect
-
-
-def exec_dql_query(postgres_sql_string: str, return_result=False) -> Optional[object]:
+from typing import List, NamedTuple, Optional, Sequence, Set, Tuple
+from weakref import WeakKeyDictionary
+from psycopg2.errors import DuplicatePreparedStatement, InvalidSqlStatementName
+from psycopg2.extensions import connection as Connection
+from psycopg2.extras import execute_values
+from .connection_pool import get_connection_pool
+
+_PREPARED_STATEMENT_NAMES: 'WeakKeyDictionary[Connection, Set[str]]' = WeakKeyDictionary()
+
+
+class PreparedStatement(NamedTuple):
+    """Hot query that is prepared once per pooled connection, so that Postgres parses and plans it only once."""
+    name: str
+    query: str  # %s placeholders, like all other queries
+
+    @property
+    def prepare_statement(self) -> str:
+        """PREPARE statement with the placeholders replaced by positional Postgres parameters."""
+        query_parts = self.query.split('%s')
+        positional_query = query_parts[0] + ''.join(f'${number}{part}' for number, part in
+                                                    enumerate(query_parts[1:], start=1))
+        return f'PREPARE {self.name} AS {positional_query}'
+
+    def execute_statement(self, n_parameters: int) -> str:
+        """Returns the EXECUTE statement for the given number of bind parameters."""
+        if n_parameters == 0:
+            return f'EXECUTE {self.name}'
+        return f'EXECUTE {self.name} ({", ".join(["%s"] * n_parameters)})'
+
+
+def exec_dql_query(postgres_sql_string: str, return_result=False,
+                   filling_parameters: Optional[Tuple[object]] = None) -> Optional[object]:
     """Executes a given PostgreSQL string on the data warehouse and potentially returns the query result.
 
     Parameters
@@ -13,6 +39,8 @@ def exec_dql_query(postgres_sql_string: str, return_result=False) -> Optional[ob
         PostgreSQL query to evaluate in the external DHW.
     return_result: bool, default=False
         Whether to return the query result.
+    filling_parameters: tuple[object] or None, default=None
+        Query parameters to bind, None if the query is already filled.
 
     Returns
     -------
@@ -21,13 +49,14 @@ def exec_dql_query(postgres_sql_string: str, return_result=False) -> Optional[ob
     """
     result = None
 
-    with connect(**config()) as connection:
-        connection.autocommit = True
+    with get_connection_pool().connection() as connection:
         with connection.cursor() as cursor:
 
             try:
-                cursor.execute(postgres_sql_string)
-                connection.commit()
+                if filling_parameters is None:
+                    cursor.execute(postgres_sql_string)
+                else:
+                    cursor.execute(postgres_sql_string, filling_parameters)
                 cursor_result = cursor.fetchall()
                 result = cursor_result if (return_result and cursor_result is not None) else return_result
 
@@ -50,8 +79,7 @@ def exec_dml_query(dml_query: str, filling_parameters: Optional[Tuple[object]])
     filling_parameters: tuple[object] or None
         Object to inject into the empty string, None if the dml query is already filled.
     """
-    with connect(**config()) as connection:
-        connection.autocommit = True
+    with get_connection_pool().connection() as connection:
         with connection.cursor() as cursor:
 
             try:
@@ -60,10 +88,89 @@ def exec_dml_query(dml_query: str, filling_parameters: Optional[Tuple[object]])
                 else:
                     cursor.execute(dml_query, filling_parameters)
 
-                connection.commit()
+            except Exception as exc:
+                print('Error executing SQL: %s' % exc)
+
+            finally:
+                cursor.close()
+
+
+def exec_dml_batch_query(dml_query: str, filling_parameters_list: Sequence[Tuple[object, ...]]) -> bool:
+    """Inserts the passed rows with a single multi-row statement.
+
+    Parameters
+    ----------
+    dml_query: str
+        SQL DML string with a single VALUES %s placeholder.
+    filling_parameters_list: sequence[tuple[object]]
+        Rows to insert.
+
+    Returns
+    -------
+    is_successful: bool
+        Whether all rows have been inserted.
+    """
+    if not filling_parameters_list:
+        return True
+
+    with get_connection_pool().connection() as connection:
+        with connection.cursor() as cursor:
+
+            try:
+                execute_values(cursor, dml_query, filling_parameters_list, page_size=len(filling_parameters_list))
+                return True
+
+            except Exception as exc:
+                print('Error executing SQL: %s' % exc)
+
+            finally:
+                cursor.close()
+
+    return False
+
+
+def exec_prepared_query(statement: PreparedStatement, filling_parameters: Tuple[object, ...] = ()) \
+        -> Optional[List[tuple]]:
+    """Executes a prepared statement with the passed bind parameters and returns its result.
+
+    Parameters
+    ----------
+    statement: PreparedStatement
+        Statement to execute, prepared on the used connection first if necessary.
+    filling_parameters: tuple[object], default=()
+        Query parameters to bind.
+
+    Returns
+    -------
+    result: list[tuple] or None
+        Query result, None if the execution failed.
+
+    Notes
+    -----
+    Prepared statements live as long as their session, hence they pay off with the pooled connections only.
+    """
+    with get_connection_pool().connection() as connection:
+        prepared_names = _PREPARED_STATEMENT_NAMES.setdefault(connection, set())
+
+        with connection.cursor() as cursor:
+            try:
+                for is_retry in (False, True):
+                    try:
+                        if statement.name not in prepared_names:
+                            cursor.execute(statement.prepare_statement)
+                            prepared_names.add(statement.name)
+                        cursor.execute(statement.execute_statement(len(filling_parameters)), filling_parameters)
+                        return cursor.fetchall()
+                    except (DuplicatePreparedStatement, InvalidSqlStatementName):
+                        if is_retry:  # bookkeeping out of sync, e.g. after a DISCARD ALL
+                            raise
+                        cursor.execute('DEALLOCATE PREPARE ALL')
+                        prepared_names.clear()
 
             except Exception as exc:
                 print('Error executing SQL: %s' % exc)
 
             finally:
                 cursor.close()
+
+    return None
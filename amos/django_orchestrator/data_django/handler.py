@@ -1,10 +1,86 @@
 """This module contains necessary business logic in order to communicate with the data warehouse."""
-from hashlib import md5
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+import os
 from django.core.files.uploadedfile import InMemoryUploadedFile
-from PIL import Image
 from psycopg2 import Binary
-from data_django.exec_sql import exec_dql_query, exec_dml_query
+from data_django.exec_sql import exec_dml_batch_query, exec_dml_query, exec_dql_query, exec_prepared_query, \
+    PreparedStatement
+from data_django.image_encoding import encode_image, EncodedImage
+from data_django.model_cache import get_cached_model_path
+
+MODEL_DOWNLOAD_CHUNK_BYTES = int(os.getenv('MODEL_DOWNLOAD_CHUNK_BYTES', 1024 * 1024))
+IMAGE_UPLOAD_BATCH_SIZE = int(os.getenv('IMAGE_UPLOAD_BATCH_SIZE', 100))
+IMAGE_UPLOAD_WORKERS = int(os.getenv('IMAGE_UPLOAD_WORKERS', 4))
+# maximum Hamming distance between perceptual hashes of near-duplicate uploads, negative disables the check
+IMAGE_NEAR_DUPLICATE_DISTANCE = int(os.getenv('IMAGE_NEAR_DUPLICATE_DISTANCE', -1))
+
+IMAGE_UPLOAD_STATUS_UPLOADED = 'uploaded'
+IMAGE_UPLOAD_STATUS_REJECTED = 'rejected'
+IMAGE_UPLOAD_STATUS_FAILED = 'failed'
+
+_IMAGE_DML_QUERY = (
+    "INSERT INTO load_layer.sight_images(sight_image, sight_city, "
+    "sight_image_height, sight_image_width, sight_image_data_source, sight_image_content_hash, "
+    "sight_image_perceptual_hash) VALUES (%s, %s, %s, %s, %s, %s, %s)"
+)
+_IMAGE_BATCH_DML_QUERY = (
+    "INSERT INTO load_layer.sight_images(sight_image, sight_city, "
+    "sight_image_height, sight_image_width, sight_image_data_source, sight_image_content_hash, "
+    "sight_image_perceptual_hash) VALUES %s"
+)
+_PERSISTED_CONTENT_HASHES_QUERY = (
+    "SELECT image_content_hash FROM integration_layer.dim_sights_images WHERE image_content_hash = ANY(%s)"
+)
+_NEAR_DUPLICATE_HASHES_QUERY = (
+    "SELECT hashes.perceptual_hash FROM unnest(%s::bigint[]) AS hashes(perceptual_hash) "
+    "WHERE has_near_duplicate_image(hashes.perceptual_hash, %s)"
+)
+
+# hot queries served on every model request, hence parsed and planned only once per pooled connection
+_METADATA_COLUMNS = "city_name, trained_model_id, version, model_size, model_sha256, class_names"
+ALL_MODELS_METADATA_STATEMENT = PreparedStatement(
+    'all_models_metadata', f"SELECT {_METADATA_COLUMNS} FROM data_mart_layer.current_trained_models"
+)
+CITY_MODELS_METADATA_STATEMENT = PreparedStatement(
+    'city_models_metadata',
+    f"SELECT {_METADATA_COLUMNS} FROM data_mart_layer.current_trained_models WHERE city_name = ANY(%s::text[])"
+)
+MODEL_CHUNK_STATEMENT = PreparedStatement(
+    'model_chunk',
+    "SELECT substring(trained_model FROM %s::int FOR %s::int) "
+    "FROM data_mart_layer.current_trained_models WHERE trained_model_id = %s::int AND version = %s::int"
+)
+LATEST_MODEL_VERSION_STATEMENT = PreparedStatement(
+    'latest_model_version', "SELECT version FROM data_mart_layer.current_trained_models WHERE city_name = %s::text"
+)
+
+
+class ModelMetadata(NamedTuple):
+    """Identifying metadata of a trained city model, precomputed when the model is loaded into the data warehouse."""
+    trained_model_id: int
+    version: int
+    size: int
+    sha256: Optional[str] = None
+    class_names: Tuple[str, ...] = ()
+
+    @property
+    def etag(self) -> str:
+        """Strong entity tag identifying the model content."""
+        return f'"{self.trained_model_id}-{self.version}"'
+
+
+class ModelChangedError(RuntimeError):
+    """Raised if the downloaded model has been replaced or removed in the data warehouse during the download."""
+
+
+class ImageUploadResult(NamedTuple):
+    """Outcome of a single image of a batch upload."""
+    name: str
+    status: str
+    source_hash: Optional[str] = None
+    error: Optional[str] = None
 
 
 def upload_image(image: InMemoryUploadedFile, city: str) -> str:
@@ -20,47 +96,253 @@ def upload_image(image: InMemoryUploadedFile, city: str) -> str:
     Returns
     -------
     source_hash: str
-        Image lookup hash.
+        Image lookup hash, also returned if the image has already been persisted and is not uploaded again.
     """
-    empty_dml_query = (
-        "INSERT INTO load_layer.sight_images(sight_image, sight_city, "
-        "sight_image_height, sight_image_width, sight_image_data_source) "
-        "VALUES (%s, %s, %s, %s, %s)"
-    )
+    encoded_image = encode_image(image.read())
+    if _get_duplicate_images([encoded_image]):
+        return encoded_image.source_hash
+
+    query_filling_params = (Binary(encoded_image.content), city, encoded_image.height, encoded_image.width,
+                            encoded_image.source_hash, encoded_image.content_hash, encoded_image.perceptual_hash)
+    exec_dml_query(_IMAGE_DML_QUERY, query_filling_params)
+
+    return encoded_image.source_hash
 
-    img = Image.open(image)
-    img_bytes = img.tobytes()
-    source_hash = md5(img_bytes).hexdigest()  # hash image to guarantee unique user input to DWH
-    width = img.size[0]
-    height = img.size[1]
 
-    query_filling_params = (Binary(img_bytes), city, height, width, source_hash)
-    exec_dml_query(empty_dml_query, query_filling_params)
+def upload_images(images: Iterable[Tuple[str, bytes]], city: str, is_valid_image: Callable[[bytes], bool],
+                  batch_size: int = IMAGE_UPLOAD_BATCH_SIZE) -> List[ImageUploadResult]:
+    """Uploads several images for the specified city, writing one multi-row insert per batch.
+
+    Parameters
+    ----------
+    images: iterable[tuple[str, bytes]]
+        File names and contents of the images to insert, consumed lazily batch by batch.
+    city: str
+        City the images belong to.
+    is_valid_image: callable
+        Function returning whether the passed file content is an accepted image.
+    batch_size: int, default=IMAGE_UPLOAD_BATCH_SIZE
+        Maximum number of images inserted per statement.
 
-    return source_hash
+    Returns
+    -------
+    results: list[ImageUploadResult]
+        Outcome per image in the order of the passed images.
 
+    Notes
+    -----
+    Images are validated, decoded, compressed and hashed in a thread pool, since the work is mostly done by PIL and
+    hashlib outside the GIL. Only a single batch is held in memory at a time. Images whose content has already been
+    persisted (or is uploaded twice) are rejected before any blob is sent to the data warehouse.
+    """
+    results: List[ImageUploadResult] = []
+    image_iterator = iter(images)
 
-def get_downloaded_model(city: str) -> Optional[bytes]:
-    """Returns the downloaded and trained model for the specified city if it is available in the data warehouse.
+    with ThreadPoolExecutor(max_workers=IMAGE_UPLOAD_WORKERS) as executor:
+        while True:
+            batch = list(islice(image_iterator, batch_size))
+            if not batch:
+                return results
+
+            read_images = list(executor.map(lambda image: _read_uploaded_image(*image, is_valid_image), batch))
+            duplicate_images = _get_duplicate_images(read_images)
+            rows = [(Binary(image.content), city, image.height, image.width, image.source_hash, image.content_hash,
+                     image.perceptual_hash) for index, image in enumerate(read_images)
+                    if isinstance(image, EncodedImage) and index not in duplicate_images]
+            is_inserted = exec_dml_batch_query(_IMAGE_BATCH_DML_QUERY, rows)
+
+            for index, ((name, _), read_image) in enumerate(zip(batch, read_images)):
+                if isinstance(read_image, ImageUploadResult):
+                    results.append(read_image)
+                elif index in duplicate_images:
+                    results.append(ImageUploadResult(name, IMAGE_UPLOAD_STATUS_REJECTED, read_image.source_hash,
+                                                     error='Image has already been persisted.'))
+                elif is_inserted:
+                    results.append(ImageUploadResult(name, IMAGE_UPLOAD_STATUS_UPLOADED, read_image.source_hash))
+                else:
+                    results.append(ImageUploadResult(name, IMAGE_UPLOAD_STATUS_FAILED, read_image.source_hash,
+                                                     error='Image could not be persisted.'))
+
+
+def _get_duplicate_images(images: List[Union[ImageUploadResult, EncodedImage]]) -> Set[int]:
+    """Returns which of the passed images must not be uploaded, since their content has already been persisted.
+
+    Parameters
+    ----------
+    images: list[ImageUploadResult or EncodedImage]
+        Read images of a batch upload, only compressed images are checked.
+
+    Returns
+    -------
+    duplicate_images: set[int]
+        Indexes of the images persisted before, uploaded earlier in the same batch or, if enabled, near-duplicates of
+        persisted images.
+
+    Notes
+    -----
+    The load job of the data warehouse deduplicates by content hash as well, hence a failing lookup only costs the
+    transfer of the duplicate blobs.
+    """
+    encoded_images = {index: image for index, image in enumerate(images) if isinstance(image, EncodedImage)}
+    if not encoded_images:
+        return set()
+
+    content_hashes = list({image.content_hash for image in encoded_images.values()})
+    persisted_hashes = {row[0] for row in exec_dql_query(_PERSISTED_CONTENT_HASHES_QUERY, return_result=True,
+                                                          filling_parameters=(content_hashes,)) or []}
+    if IMAGE_NEAR_DUPLICATE_DISTANCE >= 0:
+        perceptual_hashes = list({image.perceptual_hash for image in encoded_images.values()})
+        near_duplicate_hashes = {row[0] for row in exec_dql_query(
+            _NEAR_DUPLICATE_HASHES_QUERY, return_result=True,
+            filling_parameters=(perceptual_hashes, IMAGE_NEAR_DUPLICATE_DISTANCE)) or []}
+    else:
+        near_duplicate_hashes = set()
+
+    duplicate_images = set()
+    for index, image in encoded_images.items():
+        if image.content_hash in persisted_hashes or image.perceptual_hash in near_duplicate_hashes:
+            duplicate_images.add(index)
+        persisted_hashes.add(image.content_hash)  # the first image of the batch wins
+
+    return duplicate_images
+
+
+def _read_uploaded_image(name: str, content: bytes, is_valid_image: Callable[[bytes], bool]) \
+        -> Union[ImageUploadResult, EncodedImage]:
+    """Validates and decodes a single image of a batch upload.
+
+    Parameters
+    ----------
+    name: str
+        File name of the image.
+    content: bytes
+        File content of the image.
+    is_valid_image: callable
+        Function returning whether the passed file content is an accepted image.
+
+    Returns
+    -------
+    image: ImageUploadResult or EncodedImage
+        Rejection result, or the compressed image to insert.
+    """
+    if not is_valid_image(content):
+        return ImageUploadResult(name, IMAGE_UPLOAD_STATUS_REJECTED, error='Unsupported image format.')
+
+    try:
+        return encode_image(content)
+    except Exception as exc:  # PIL raises various exceptions for corrupt images
+        return ImageUploadResult(name, IMAGE_UPLOAD_STATUS_REJECTED, error=f'Image could not be decoded: {exc}')
+
+
+def get_model_metadata(city: str) -> Optional[ModelMetadata]:
+    """Returns the metadata of the current trained model for the specified city without loading the model itself.
+
+    Parameters
+    ----------
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    metadata: ModelMetadata or None
+        Metadata of the current model, None if no model is available.
+    """
+    return get_models_metadata([city]).get(city.upper())
+
+
+def get_models_metadata(cities: Optional[List[str]] = None) -> Dict[str, ModelMetadata]:
+    """Returns the metadata of the current trained models of several cities with a single query.
+
+    Parameters
+    ----------
+    cities: list[str] or None, default=None
+        Names of the cities, all supported cities if None.
+
+    Returns
+    -------
+    metadata: dict[str, ModelMetadata]
+        Metadata of the current models by upper case city name, cities without a model are omitted.
+    """
+    if cities is None:
+        found_metadata = exec_prepared_query(ALL_MODELS_METADATA_STATEMENT)
+    else:
+        found_metadata = exec_prepared_query(CITY_MODELS_METADATA_STATEMENT, ([city.upper() for city in cities],))
+
+    found_metadata = found_metadata or []
+    return {
+        city_name: ModelMetadata(int(trained_model_id), int(version), int(size), sha256, tuple(class_names or ()))
+        for city_name, trained_model_id, version, size, sha256, class_names in found_metadata
+    }
+
+
+def get_cached_model_file(city: str, metadata: ModelMetadata) -> Optional[str]:
+    """Returns the path of the locally cached model file, downloading the model first if it is not cached yet
+    or if a newer version has been trained in the meantime.
 
     Parameters
     ----------
     city: str
         Name of the city.
+    metadata: ModelMetadata
+        Metadata of the city's current model.
 
     Returns
     -------
-    found_model: bytes or None
-        Retrieved .pt model file.
+    model_path: str or None
+        Path of the cached model file, None if the model could not be cached.
+    """
+    try:
+        return get_cached_model_path(
+            city, metadata.trained_model_id, metadata.version, metadata.size,
+            lambda: iter_model_chunks(metadata.trained_model_id, metadata.version, 0, metadata.size - 1)
+        )
+    except ModelChangedError as exc:
+        print(f'Caching model of {city.upper()} failed: {exc}')
+        return None
+
+
+def iter_model_chunks(trained_model_id: int, version: int, start: int, end: int,
+                      chunk_size: int = MODEL_DOWNLOAD_CHUNK_BYTES) -> Iterator[bytes]:
+    """Yields the given byte range of a trained model chunk by chunk.
+
+    Parameters
+    ----------
+    trained_model_id: int
+        Id of the trained model to read.
+    version: int
+        Version of the trained model the download started with, every chunk is checked against it.
+    start: int
+        First byte to read (zero-based).
+    end: int
+        Last byte to read (inclusive).
+    chunk_size: int, default=MODEL_DOWNLOAD_CHUNK_BYTES
+        Maximum number of bytes fetched per data warehouse round trip.
+
+    Yields
+    ------
+    chunk: bytes
+        Next model chunk.
+
+    Raises
+    ------
+    ModelChangedError
+        If the model has been replaced or removed since the download started. Raising aborts a streamed response
+        instead of silently ending it before Content-Length bytes have been sent.
+
+    Notes
+    -----
+    Every chunk is fetched through a separate pooled connection, hence slow clients do not block connections.
+    Only the requested slice crosses the wire since the model column is stored uncompressed (STORAGE EXTERNAL).
     """
-    trained_model_query = (
-        f"SELECT trained_model FROM data_mart_layer.current_trained_models " f"WHERE city_name = '{city.upper()}'"
-    )
-    found_model = exec_dql_query(trained_model_query, return_result=True)
-    if found_model:
-        return found_model[0][0].tobytes()
+    for chunk_start in range(start, end + 1, chunk_size):
+        chunk_length = min(chunk_size, end + 1 - chunk_start)
+        # SQL substrings are one-based
+        chunk = exec_prepared_query(MODEL_CHUNK_STATEMENT, (chunk_start + 1, chunk_length, trained_model_id, version))
+        if not chunk:
+            raise ModelChangedError(f'Trained model {trained_model_id} (version {version}) changed during download '
+                                    f'at byte {chunk_start}.')
 
-    return None
+        yield chunk[0][0].tobytes()
 
 
 def get_latest_model_version(city: str) -> int:
@@ -76,10 +358,7 @@ def get_latest_model_version(city: str) -> int:
     latest_version: int
         Latest model version.
     """
-    trained_model_query = (
-        f"SELECT version FROM data_mart_layer.current_trained_models " f"WHERE city_name = '{city.upper()}'"
-    )
-    found_version = exec_dql_query(trained_model_query, return_result=True)
+    found_version = exec_prepared_query(LATEST_MODEL_VERSION_STATEMENT, (city.upper(),))
     if found_version:
         return int(found_version[0][0])
 
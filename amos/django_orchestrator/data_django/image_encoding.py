@@ -0,0 +1,105 @@
+"""This module contains the normalization of images before they are persisted in the data warehouse."""
+from hashlib import md5, sha256
+from io import BytesIO
+from typing import NamedTuple
+import os
+from PIL import Image
+
+IMAGE_STORAGE_FORMAT = os.getenv('IMAGE_STORAGE_FORMAT', 'JPEG').upper()  # JPEG, WEBP or ORIGINAL
+IMAGE_STORAGE_QUALITY = int(os.getenv('IMAGE_STORAGE_QUALITY', 85))
+IMAGE_STORAGE_MAX_SIDE = int(os.getenv('IMAGE_STORAGE_MAX_SIDE', 2048))  # 0 keeps the original resolution
+
+_PERCEPTUAL_HASH_SIZE = 8  # 8x8 gradient bits, i.e. a 64 bit hash fitting a BIGINT column
+
+
+class EncodedImage(NamedTuple):
+    """Compressed image as persisted in the data warehouse."""
+    content: bytes
+    width: int
+    height: int
+    source_hash: str
+    content_hash: str  # hex encoded SHA-256 of the uploaded file, the crawler hashes its downloaded files the same way
+    perceptual_hash: int
+
+
+def encode_image(content: bytes) -> EncodedImage:
+    """Decodes the passed image file and returns its compressed storage representation.
+
+    Parameters
+    ----------
+    content: bytes
+        Uploaded image file.
+
+    Returns
+    -------
+    encoded_image: EncodedImage
+        Compressed image, its resolution, lookup, content and perceptual hash.
+
+    Notes
+    -----
+    The lookup hash is computed over the decoded pixels of the uploaded image, hence it is independent of the storage
+    format and identical to the hashes of images that have been persisted as raw pixel buffers before. The content
+    and perceptual hash are computed over the uploaded file, i.e. the same representation the crawler pushes, hence
+    uploads of crawled images are deduplicated regardless of the storage format.
+    """
+    content_hash = sha256(content).hexdigest()
+    img = Image.open(BytesIO(content))
+    source_hash = md5(img.tobytes()).hexdigest()  # hash image to guarantee unique user input to DWH
+    perceptual_hash = get_perceptual_hash(img)
+
+    if IMAGE_STORAGE_FORMAT != 'ORIGINAL':
+        if IMAGE_STORAGE_MAX_SIDE > 0:
+            img.thumbnail((IMAGE_STORAGE_MAX_SIDE, IMAGE_STORAGE_MAX_SIDE))  # keeps the aspect ratio, never upscales
+        content = compress_image(img)
+
+    return EncodedImage(content, img.size[0], img.size[1], source_hash, content_hash, perceptual_hash)
+
+
+def get_perceptual_hash(img: Image.Image) -> int:
+    """Returns the difference hash of the passed image, which is robust against re-encoding and rescaling.
+
+    This is the only implementation of the hash: uploads are hashed before they are persisted, crawled images are
+    hashed afterwards by the perceptual_hash_backfill job.
+
+    Parameters
+    ----------
+    img: Image.Image
+        Decoded image.
+
+    Returns
+    -------
+    perceptual_hash: int
+        Signed 64 bit hash, one bit per horizontal brightness gradient of the downscaled grayscale image.
+    """
+    gray_img = img.convert('L').resize((_PERCEPTUAL_HASH_SIZE + 1, _PERCEPTUAL_HASH_SIZE), Image.BILINEAR)
+    pixels = list(gray_img.getdata())
+
+    perceptual_hash = 0
+    for row in range(_PERCEPTUAL_HASH_SIZE):
+        for column in range(_PERCEPTUAL_HASH_SIZE):
+            left = pixels[row * (_PERCEPTUAL_HASH_SIZE + 1) + column]
+            perceptual_hash = (perceptual_hash << 1) | (left > pixels[row * (_PERCEPTUAL_HASH_SIZE + 1) + column + 1])
+
+    return perceptual_hash - (1 << 64) if perceptual_hash >= 1 << 63 else perceptual_hash  # Postgres BIGINT
+
+
+def compress_image(img: Image.Image) -> bytes:
+    """Returns the passed decoded image compressed in the configured storage format.
+
+    Parameters
+    ----------
+    img: Image.Image
+        Decoded image.
+
+    Returns
+    -------
+    compressed_image: bytes
+        JPEG (default) or WebP encoded image.
+    """
+    storage_format = 'WEBP' if IMAGE_STORAGE_FORMAT == 'WEBP' else 'JPEG'
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')  # neither alpha channels nor palettes are needed for training
+
+    compressed_image = BytesIO()
+    img.save(compressed_image, format=storage_format, quality=IMAGE_STORAGE_QUALITY, optimize=True)
+    return compressed_image.getvalue()
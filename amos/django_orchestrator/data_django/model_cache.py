@@ -0,0 +1,306 @@
+"""This module contains the on-disk, content-addressed cache of trained city models shared by all workers."""
+from collections import defaultdict
+from hashlib import sha256
+from json import dump, load
+from tempfile import mkstemp
+from threading import Lock
+from typing import Callable, Dict, Iterator, Optional
+import os
+
+MODEL_FILE_EXTENSION = '.pt'
+_CITY_LOCKS: Dict[str, Lock] = defaultdict(Lock)
+_CITY_LOCKS_LOCK = Lock()
+
+
+def get_cached_model_path(city: str, trained_model_id: int, version: int, size: int,
+                          model_chunks: Callable[[], Iterator[bytes]]) -> Optional[str]:
+    """Returns the path of the cached model file of the given city, fetching the model first if it is missing
+    or outdated.
+
+    Parameters
+    ----------
+    city: str
+        Name of the city.
+    trained_model_id: int
+        Id of the current trained model.
+    version: int
+        Version of the current trained model.
+    size: int
+        Size of the current trained model in bytes.
+    model_chunks: callable
+        Function returning an iterator over the whole model's chunks, only called on cache misses.
+
+    Returns
+    -------
+    model_path: str or None
+        Path of the cached model file, None if caching is disabled or failed.
+
+    Notes
+    -----
+    The cache directory (MODEL_CACHE_DIR, default: model_cache) and its size budget (MODEL_CACHE_MAX_BYTES,
+    default: 2 GiB, 0 disables caching) are read from the environment. Models are stored under their SHA-256
+    content hash, a small index file per city points to the hash of its current model version.
+    """
+    max_cache_bytes = int(os.getenv('MODEL_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+    if max_cache_bytes <= 0 or size > max_cache_bytes:
+        return None
+
+    cache_dir = _get_cache_dir()
+    with _get_city_lock(city):
+        index_entry = _read_index_entry(cache_dir, city)
+        if index_entry is not None and index_entry['trained_model_id'] == trained_model_id \
+                and index_entry['version'] == version:
+            model_path = os.path.join(cache_dir, index_entry['sha256'] + MODEL_FILE_EXTENSION)
+            if _is_file_of_size(model_path, size):
+                os.utime(model_path)  # mark as recently used
+                return model_path
+
+        try:
+            content_hash = _store_model(cache_dir, model_chunks(), size)
+        except OSError as exc:
+            print(f'Caching model {trained_model_id} of {city.upper()} failed: {exc}')
+            return None
+
+        if content_hash is None:
+            return None
+
+        _write_index_entry(cache_dir, city, {'trained_model_id': trained_model_id, 'version': version,
+                                             'sha256': content_hash, 'size': size})
+        if index_entry is not None and index_entry['sha256'] != content_hash:
+            _remove_unreferenced_model(cache_dir, index_entry['sha256'])
+
+    model_path = os.path.join(cache_dir, content_hash + MODEL_FILE_EXTENSION)
+    _evict_least_recently_used(cache_dir, max_cache_bytes, model_path)
+    return model_path
+
+
+def open_file_range(model_path: str, start: int, end: int, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """Opens a cached model file and returns an iterator over the given byte range.
+
+    Parameters
+    ----------
+    model_path: str
+        Path of the cached model file.
+    start: int
+        First byte to read (zero-based).
+    end: int
+        Last byte to read (inclusive).
+    chunk_size: int, default=1 MiB
+        Maximum number of bytes read at once.
+
+    Returns
+    -------
+    chunks: iterator[bytes]
+        Chunks of the requested byte range.
+
+    Raises
+    ------
+    OSError
+        If the file has been evicted in the meantime.
+
+    Notes
+    -----
+    The file is opened eagerly, so later evictions by other workers cannot interrupt the download.
+    """
+    model_file = open(model_path, 'rb')
+    model_file.seek(start)
+
+    def _iter_chunks() -> Iterator[bytes]:
+        with model_file:
+            remaining_bytes = end + 1 - start
+            while remaining_bytes > 0:
+                chunk = model_file.read(min(chunk_size, remaining_bytes))
+                if not chunk:
+                    return
+                remaining_bytes -= len(chunk)
+                yield chunk
+
+    return _iter_chunks()
+
+
+def _evict_least_recently_used(cache_dir: str, max_cache_bytes: int, keep_path: str) -> None:
+    """Removes the least recently used model files until the cache fits into its size budget.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Cache directory.
+    max_cache_bytes: int
+        Size budget of all cached models in bytes.
+    keep_path: str
+        Path of the model file that must not be evicted.
+    """
+    model_files = []
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith(MODEL_FILE_EXTENSION):
+            try:
+                file_stats = os.stat(os.path.join(cache_dir, file_name))
+                model_files.append((file_stats.st_mtime, file_stats.st_size, os.path.join(cache_dir, file_name)))
+            except FileNotFoundError:  # concurrently evicted by another worker
+                continue
+
+    cache_bytes = sum(file_size for _, file_size, _ in model_files)
+    for _, file_size, model_path in sorted(model_files):
+        if cache_bytes <= max_cache_bytes:
+            break
+        if model_path == keep_path:
+            continue
+        try:
+            os.remove(model_path)
+        except FileNotFoundError:
+            pass
+        cache_bytes -= file_size
+
+
+def _get_cache_dir() -> str:
+    """Returns the (created) model cache directory.
+
+    Returns
+    -------
+    cache_dir: str
+        Model cache directory.
+    """
+    cache_dir = os.getenv('MODEL_CACHE_DIR', 'model_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def _get_city_lock(city: str) -> Lock:
+    """Returns the lock serializing cache updates of the given city within this process.
+
+    Parameters
+    ----------
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    lock: Lock
+        City lock.
+    """
+    with _CITY_LOCKS_LOCK:
+        return _CITY_LOCKS[city.upper()]
+
+
+def _is_file_of_size(path: str, size: int) -> bool:
+    """Returns whether the given file exists and has the expected size.
+
+    Parameters
+    ----------
+    path: str
+        File path.
+    size: int
+        Expected file size in bytes.
+
+    Returns
+    -------
+    is_valid: bool
+        Whether the file exists with the expected size.
+    """
+    try:
+        return os.path.getsize(path) == size
+    except OSError:
+        return False
+
+
+def _read_index_entry(cache_dir: str, city: str) -> Optional[Dict[str, object]]:
+    """Returns the cache index entry of the given city.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Cache directory.
+    city: str
+        Name of the city.
+
+    Returns
+    -------
+    index_entry: dict[str, object] or None
+        Model id, version, content hash and size of the cached model, None if nothing is cached yet.
+    """
+    try:
+        with open(os.path.join(cache_dir, f'{city.upper()}.json'), 'r') as index_file:
+            return load(index_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _remove_unreferenced_model(cache_dir: str, content_hash: str) -> None:
+    """Removes an outdated model file unless another city's index still refers to it.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Cache directory.
+    content_hash: str
+        SHA-256 hash of the outdated model.
+    """
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith('.json'):
+            index_entry = _read_index_entry(cache_dir, file_name[:-len('.json')])
+            if index_entry is not None and index_entry['sha256'] == content_hash:
+                return
+
+    try:
+        os.remove(os.path.join(cache_dir, content_hash + MODEL_FILE_EXTENSION))
+    except FileNotFoundError:
+        pass
+
+
+def _store_model(cache_dir: str, model_chunks: Iterator[bytes], size: int) -> Optional[str]:
+    """Writes the passed model chunks into the cache and returns the model's content hash.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Cache directory.
+    model_chunks: iterator[bytes]
+        Chunks of the whole model.
+    size: int
+        Expected model size in bytes.
+
+    Returns
+    -------
+    content_hash: str or None
+        SHA-256 hash of the stored model, None if the model was incomplete.
+    """
+    file_descriptor, temp_path = mkstemp(dir=cache_dir, suffix='.tmp')
+    content_hash, n_bytes = sha256(), 0
+
+    try:
+        with os.fdopen(file_descriptor, 'wb') as temp_file:
+            for chunk in model_chunks:
+                content_hash.update(chunk)
+                temp_file.write(chunk)
+                n_bytes += len(chunk)
+
+        if n_bytes != size:
+            print(f'Received {n_bytes} of {size} model bytes, discarding incomplete model.')
+            os.remove(temp_path)
+            return None
+
+        os.replace(temp_path, os.path.join(cache_dir, content_hash.hexdigest() + MODEL_FILE_EXTENSION))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return content_hash.hexdigest()
+
+
+def _write_index_entry(cache_dir: str, city: str, index_entry: Dict[str, object]) -> None:
+    """Atomically replaces the cache index entry of the given city.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Cache directory.
+    city: str
+        Name of the city.
+    index_entry: dict[str, object]
+        Model id, version, content hash and size of the cached model.
+    """
+    file_descriptor, temp_path = mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(file_descriptor, 'w') as temp_file:
+        dump(index_entry, temp_file)
+    os.replace(temp_path, os.path.join(cache_dir, f'{city.upper()}.json'))
@@ -0,0 +1,92 @@
+"""This module contains the job computing the perceptual hashes of persisted images that have been pushed without one.
+
+Uploads are hashed by the orchestrator before they are persisted, crawled images are pushed without a perceptual hash,
+hence they only become candidates of the near-duplicate check once this job has hashed them. Run the job after the
+crawler runs, e.g. periodically via cron:
+
+    python -m data_django.perceptual_hash_backfill --batch-size 50
+"""
+import argparse
+from io import BytesIO
+from typing import List, NamedTuple, Tuple
+from PIL import Image
+from data_django.exec_sql import exec_dml_batch_query, exec_dql_query
+from data_django.image_encoding import get_perceptual_hash
+
+# images without a perceptual hash, keyset paginated by image id
+_UNHASHED_IMAGES_QUERY = (
+    "SELECT image_id, image_file FROM integration_layer.dim_sights_images "
+    "WHERE image_perceptual_hash IS NULL AND image_id > %s ORDER BY image_id LIMIT %s"
+)
+_PERCEPTUAL_HASHES_DML_QUERY = (
+    "UPDATE integration_layer.dim_sights_images AS images SET image_perceptual_hash = hashed.perceptual_hash "
+    "FROM (VALUES %s) AS hashed(image_id, perceptual_hash) WHERE images.image_id = hashed.image_id"
+)
+
+
+class BackfillReport(NamedTuple):
+    """Number of images hashed by the backfill."""
+    n_hashed: int
+    n_skipped: int
+    n_failed: int
+
+    def __str__(self) -> str:
+        return (f'Computed the perceptual hashes of {self.n_hashed} images ({self.n_skipped} not decodable, '
+                f'{self.n_failed} failed).')
+
+
+def backfill_perceptual_hashes(batch_size: int = 50) -> BackfillReport:
+    """Computes and persists the perceptual hashes of all images persisted without one.
+
+    Parameters
+    ----------
+    batch_size: int, default=50
+        Number of images fetched and updated at a time.
+
+    Returns
+    -------
+    report: BackfillReport
+        Number of hashed, skipped and failed images.
+
+    Notes
+    -----
+    Crawled images are persisted as downloaded, hence they are hashed in the same representation as uploads, which are
+    hashed before they are re-encoded. Images that cannot be decoded (e.g. raw pixel buffers) keep a NULL hash.
+    """
+    n_hashed = n_skipped = n_failed = 0
+    last_image_id = 0
+
+    while True:
+        images: List[Tuple[int, memoryview]] = exec_dql_query(
+            _UNHASHED_IMAGES_QUERY, return_result=True, filling_parameters=(last_image_id, batch_size)
+        ) or []
+        if not images:
+            break
+        last_image_id = images[-1][0]
+
+        perceptual_hashes = []
+        for image_id, image_file in images:
+            try:
+                perceptual_hashes.append((image_id, get_perceptual_hash(Image.open(BytesIO(bytes(image_file))))))
+            except Exception:
+                n_skipped += 1
+
+        if not perceptual_hashes or exec_dml_batch_query(_PERCEPTUAL_HASHES_DML_QUERY, perceptual_hashes):
+            n_hashed += len(perceptual_hashes)
+        else:
+            n_failed += len(perceptual_hashes)
+
+    return BackfillReport(n_hashed, n_skipped, n_failed)
+
+
+def main() -> None:
+    """Runs the backfill and prints the report."""
+    parser = argparse.ArgumentParser(description='Computes the perceptual hashes of images persisted without one.')
+    parser.add_argument('--batch-size', type=int, default=50, help='number of images updated at a time')
+    args = parser.parse_args()
+
+    print(backfill_perceptual_hashes(batch_size=args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
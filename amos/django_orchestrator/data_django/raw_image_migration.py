@@ -0,0 +1,157 @@
+"""This module contains the one-off job recompressing images that have been persisted as raw pixel buffers.
+
+Uploads used to be persisted as decoded pixel buffers, which are roughly a hundred times larger than the uploaded files
+and cannot be read by any image decoder. Run the job once per data warehouse, e.g.
+
+    python -m data_django.raw_image_migration --batch-size 50 [--dry-run]
+"""
+import argparse
+import imghdr
+from typing import List, NamedTuple, Optional, Tuple
+from PIL import Image
+from psycopg2 import Binary
+from data_django.exec_sql import exec_dml_batch_query, exec_dql_query
+from data_django.image_encoding import compress_image
+
+# number of bytes per pixel of the raw buffers by PIL image mode
+_RAW_IMAGE_MODES = {1: 'L', 3: 'RGB', 4: 'RGBA'}
+
+# images without a known file header whose size matches their resolution, keyset paginated by image id
+_RAW_IMAGE_CANDIDATES_QUERY = (
+    "SELECT DISTINCT ON (images.image_id) images.image_id, resolutions.resolution_width, "
+    "resolutions.resolution_height "
+    "FROM integration_layer.dim_sights_images AS images "
+    "JOIN integration_layer.fact_sights AS facts ON facts.image_id = images.image_id "
+    "JOIN integration_layer.dim_sights_resolutions AS resolutions ON resolutions.resolution_id = facts.resolution_id "
+    "WHERE images.image_id > %s AND octet_length(images.image_file) IN ("
+    "resolutions.resolution_width * resolutions.resolution_height, "
+    "3 * resolutions.resolution_width * resolutions.resolution_height, "
+    "4 * resolutions.resolution_width * resolutions.resolution_height) "
+    "ORDER BY images.image_id LIMIT %s"
+)
+_RAW_IMAGE_FILES_QUERY = (
+    "SELECT image_id, image_file FROM integration_layer.dim_sights_images WHERE image_id = ANY(%s)"
+)
+_RECOMPRESSED_IMAGES_DML_QUERY = (
+    "UPDATE integration_layer.dim_sights_images AS images SET image_file = recompressed.image_file, "
+    "image_content_hash = encode(sha256(recompressed.image_file), 'hex') "
+    "FROM (VALUES %s) AS recompressed(image_id, image_file) WHERE images.image_id = recompressed.image_id"
+)
+
+
+class MigrationReport(NamedTuple):
+    """Storage reclaimed by recompressing raw images."""
+    n_recompressed: int
+    n_skipped: int
+    n_failed: int
+    bytes_before: int
+    bytes_after: int
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        """Number of bytes saved by the recompressed images."""
+        return self.bytes_before - self.bytes_after
+
+    def __str__(self) -> str:
+        ratio = self.bytes_after / self.bytes_before if self.bytes_before else 1.
+        return (f'Recompressed {self.n_recompressed} raw images ({self.n_skipped} skipped, {self.n_failed} failed): '
+                f'{self.bytes_before / 1024 ** 2:.1f} MiB -> {self.bytes_after / 1024 ** 2:.1f} MiB, '
+                f'{self.bytes_reclaimed / 1024 ** 2:.1f} MiB reclaimed ({(1 - ratio) * 100:.1f}%).')
+
+
+def decode_raw_image(raw_image: bytes, width: int, height: int) -> Optional[Image.Image]:
+    """Returns the image stored as the passed raw pixel buffer.
+
+    Parameters
+    ----------
+    raw_image: bytes
+        Stored image.
+    width: int
+        Image width.
+    height: int
+        Image height.
+
+    Returns
+    -------
+    img: Image.Image or None
+        Decoded image, None if the stored image is an encoded image file or does not match the resolution.
+    """
+    bytes_per_pixel, remainder = divmod(len(raw_image), width * height) if width * height > 0 else (0, 1)
+    if remainder or bytes_per_pixel not in _RAW_IMAGE_MODES or imghdr.what(file=None, h=raw_image) is not None:
+        return None
+
+    return Image.frombytes(_RAW_IMAGE_MODES[bytes_per_pixel], (width, height), raw_image)
+
+
+def recompress_raw_images(batch_size: int = 50, is_dry_run: bool = False) -> MigrationReport:
+    """Recompresses all images persisted as raw pixel buffers in place.
+
+    Parameters
+    ----------
+    batch_size: int, default=50
+        Number of images fetched and updated at a time.
+    is_dry_run: bool, default=False
+        Whether to only report the storage that would be reclaimed.
+
+    Returns
+    -------
+    report: MigrationReport
+        Number of recompressed images and reclaimed storage.
+
+    Notes
+    -----
+    Images are recompressed in their original resolution since the resolution dimension is shared between facts.
+    Palette images have been persisted as one byte per pixel without their palette, they are recompressed in grayscale.
+    The data marts do not hold image files, hence need no refresh. The freed space is reused by Postgres after the
+    next (auto)vacuum.
+    """
+    n_recompressed = n_skipped = n_failed = bytes_before = bytes_after = 0
+    last_image_id = 0
+
+    while True:
+        candidates: List[Tuple[int, int, int]] = exec_dql_query(
+            _RAW_IMAGE_CANDIDATES_QUERY, return_result=True, filling_parameters=(last_image_id, batch_size)
+        ) or []
+        if not candidates:
+            break
+        last_image_id = candidates[-1][0]
+
+        resolutions = {image_id: (width, height) for image_id, width, height in candidates}
+        raw_images = exec_dql_query(_RAW_IMAGE_FILES_QUERY, return_result=True,
+                                    filling_parameters=(list(resolutions),)) or []
+
+        recompressed_images, batch_bytes_before, batch_bytes_after = [], 0, 0
+        for image_id, raw_image in raw_images:
+            raw_image = bytes(raw_image)
+            img = decode_raw_image(raw_image, *resolutions[image_id])
+            if img is None:
+                n_skipped += 1
+                continue
+
+            compressed_image = compress_image(img)
+            recompressed_images.append((image_id, Binary(compressed_image)))
+            batch_bytes_before, batch_bytes_after = batch_bytes_before + len(raw_image), \
+                batch_bytes_after + len(compressed_image)
+
+        if is_dry_run or exec_dml_batch_query(_RECOMPRESSED_IMAGES_DML_QUERY, recompressed_images):
+            n_recompressed += len(recompressed_images)
+            bytes_before, bytes_after = bytes_before + batch_bytes_before, bytes_after + batch_bytes_after
+        else:
+            n_failed += len(recompressed_images)
+
+    return MigrationReport(n_recompressed, n_skipped, n_failed, bytes_before, bytes_after)
+
+
+def main() -> None:
+    """Runs the migration and prints the report."""
+    parser = argparse.ArgumentParser(description='Recompresses images persisted as raw pixel buffers.')
+    parser.add_argument('--batch-size', type=int, default=50, help='number of images updated at a time')
+    parser.add_argument('--dry-run', action='store_true', help='only report the storage that would be reclaimed')
+    args = parser.parse_args()
+
+    report = recompress_raw_images(batch_size=args.batch_size, is_dry_run=args.dry_run)
+    print(f'{"[dry run] " if args.dry_run else ""}{report}')
+
+
+if __name__ == '__main__':
+    main()
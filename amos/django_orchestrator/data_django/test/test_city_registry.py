@@ -0,0 +1,54 @@
+"""This module contains the tests for the city_registry module of the data sub-app."""
+from mock import patch
+import pytest
+from data_django.city_registry import get_city_registry, invalidate_city_registry, is_supported_city
+
+FUNCTION_PATH = "data_django.city_registry.exec_dql_query"
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    invalidate_city_registry()
+    yield
+    invalidate_city_registry()
+
+
+def test_city_registry_cached():
+    with patch(FUNCTION_PATH, return_value=[["BERLIN"], ["TOKYO"]]) as query_mock:
+        registry = get_city_registry()
+        assert registry.cities == ["BERLIN", "TOKYO"]
+        assert registry.json_body == '{"cities": ["BERLIN", "TOKYO"]}'
+        assert is_supported_city("berlin") and is_supported_city("Tokyo")
+        assert not is_supported_city("atlantis")
+        assert query_mock.call_count == 1  # all lookups served from cache
+
+
+def test_city_registry_expired(monkeypatch):
+    monkeypatch.setenv("CITY_REGISTRY_TTL_SECONDS", "0")
+    with patch(FUNCTION_PATH, side_effect=[[["BERLIN"]], [["BERLIN"], ["TOKYO"]]]):
+        first_registry = get_city_registry()
+        second_registry = get_city_registry()
+
+    assert second_registry.cities == ["BERLIN", "TOKYO"]
+    assert first_registry.etag != second_registry.etag
+
+
+def test_city_registry_invalidated():
+    with patch(FUNCTION_PATH, return_value=[["BERLIN"]]) as query_mock:
+        get_city_registry()
+        invalidate_city_registry()
+        get_city_registry()
+        assert query_mock.call_count == 2
+
+
+def test_city_registry_kept_on_query_error(monkeypatch):
+    monkeypatch.setenv("CITY_REGISTRY_TTL_SECONDS", "0")
+    with patch(FUNCTION_PATH, side_effect=[[["BERLIN"]], None]):
+        get_city_registry()
+        assert get_city_registry().cities == ["BERLIN"]  # stale snapshot served instead of an empty list
+
+
+def test_city_registry_empty_on_initial_query_error():
+    with patch(FUNCTION_PATH, side_effect=[None, [["BERLIN"]]]):
+        assert get_city_registry().cities == []
+        assert get_city_registry().cities == ["BERLIN"]  # failure not cached
@@ -0,0 +1,30 @@
+"""This module contains the tests for the city_requests module of the data sub-app."""
+from mock import patch, MagicMock
+from data_django.city_requests import count_city_request
+
+FUNCTION_PATH = 'data_django.city_requests.exec_dql_query'
+
+
+def test_count_city_request():
+    with patch(FUNCTION_PATH, return_value=[(3,)]) as query_mock:
+        assert count_city_request('kyoto', 100) == 3
+        assert 'ON CONFLICT (city_name) DO UPDATE' in query_mock.call_args[0][0]
+        assert query_mock.call_args[1]['filling_parameters'] == ('KYOTO',)
+
+
+def test_count_city_request_fires_hook_from_threshold_on():
+    hook = MagicMock()
+    counters = iter([[(n_requests,)] for n_requests in range(1, 6)])
+    with patch(FUNCTION_PATH, side_effect=lambda *args, **kwargs: next(counters)):
+        for _ in range(5):
+            count_city_request('kyoto', 3, on_threshold_reached=hook)
+
+    assert hook.call_count == 3  # requests 3, 4 and 5, the hook ignores cities with an active or done crawl
+    hook.assert_called_with('KYOTO')
+
+
+def test_count_city_request_failed():
+    hook = MagicMock()
+    with patch(FUNCTION_PATH, return_value=None):
+        assert count_city_request('kyoto', 1, on_threshold_reached=hook) is None
+    assert hook.called is False
@@ -0,0 +1,124 @@
+"""This module contains the tests for the connection_pool module of the data sub-app."""
+from threading import Thread
+from mock import patch
+from psycopg2 import OperationalError
+from psycopg2.pool import PoolError
+import pytest
+from data_django import connection_pool
+from data_django.connection_pool import ConnectionPool, get_connection_pool, get_connection_pool_stats
+from conftest import ConnectionMock
+
+
+class FailingPingCursorMock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def execute(self, sql_string):
+        raise OperationalError('server closed the connection unexpectedly')
+
+
+class StaleConnectionMock(ConnectionMock):
+    def cursor(self):
+        return FailingPingCursorMock()
+
+
+def test_connection_reused():
+    pool = ConnectionPool(ConnectionMock)
+    with pool.connection() as first_connection:
+        pass
+    with pool.connection() as second_connection:
+        assert pool.stats()['checked_out'] == 1
+
+    assert first_connection is second_connection
+    assert pool.stats()['created'] == 1
+    assert pool.stats()['idle'] == 1
+
+
+def test_pool_exhausted():
+    pool = ConnectionPool(ConnectionMock, min_size=0, max_size=1, checkout_timeout_seconds=0.05)
+    with pool.connection():
+        with pytest.raises(PoolError):
+            with pool.connection():
+                pass
+
+    assert pool.stats()['waiting'] == 0
+    assert pool.stats()['checked_out'] == 0
+
+
+def test_waiting_for_released_connection():
+    pool = ConnectionPool(ConnectionMock, max_size=1, checkout_timeout_seconds=5)
+    checked_out = []
+
+    with pool.connection() as connection:
+        waiter = Thread(target=lambda: checked_out.append(pool._acquire()))
+        waiter.start()
+        while pool.stats()['waiting'] == 0:
+            pass
+
+    waiter.join()
+    assert checked_out == [connection]
+
+
+def test_broken_connection_recycled():
+    pool = ConnectionPool(ConnectionMock)
+    with pytest.raises(OperationalError):
+        with pool.connection():
+            raise OperationalError('terminating connection due to administrator command')
+
+    stats = pool.stats()
+    assert stats['open'] == 0 and stats['recycled'] == 1
+
+
+def test_unhealthy_idle_connection_replaced():
+    connections = [StaleConnectionMock(), ConnectionMock()]
+    pool = ConnectionPool(lambda: connections.pop(0), health_check_after_seconds=0)
+
+    with pool.connection():
+        pass
+    with pool.connection() as connection:
+        assert isinstance(connection, ConnectionMock) and not isinstance(connection, StaleConnectionMock)
+
+    assert pool.stats()['created'] == 2
+    assert pool.stats()['recycled'] == 1
+
+
+def test_idle_connections_evicted():
+    pool = ConnectionPool(ConnectionMock, min_size=1, max_size=3, max_idle_seconds=0)
+    with pool.connection(), pool.connection(), pool.connection():
+        pass
+
+    with pool.connection():
+        pass
+    assert pool.stats()['open'] == 1
+    assert pool.stats()['evicted'] == 2
+
+
+def test_closed_pool():
+    pool = ConnectionPool(ConnectionMock)
+    with pool.connection() as connection:
+        pool.close()
+
+    assert connection.closed
+    with pytest.raises(PoolError):
+        pool._acquire()
+
+
+def test_invalid_pool_size():
+    with pytest.raises(ValueError):
+        ConnectionPool(ConnectionMock, min_size=5, max_size=2)
+
+
+def test_pool_recreated_per_process():
+    with patch.object(connection_pool, '_POOL', None), patch('data_django.connection_pool.connect'):
+        pool = get_connection_pool()
+        assert get_connection_pool() is pool
+        assert get_connection_pool_stats()['max_size'] == 10
+
+        with patch('data_django.connection_pool.os.getpid', return_value=pool.pid + 1):
+            forked_pool = get_connection_pool()
+
+        assert forked_pool is not pool
+        assert pool in connection_pool._INHERITED_POOLS
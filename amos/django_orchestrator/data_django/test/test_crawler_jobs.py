@@ -0,0 +1,40 @@
+"""This module contains the tests for the crawler_jobs module of the data sub-app."""
+from mock import patch
+from data_django.crawler_jobs import create_crawler_job, update_crawler_job, get_crawler_job, \
+    get_latest_city_crawler_job
+
+MODULE_PATH = 'data_django.crawler_jobs'
+
+
+def test_create_crawler_job():
+    with patch(f'{MODULE_PATH}.exec_dml_query') as stale_query_mock, \
+         patch(f'{MODULE_PATH}.exec_dql_query', return_value=[('abc', 'KYOTO', 'queued', 0, None)]) as query_mock:
+        assert create_crawler_job('abc', 'KYOTO', 600) == ('abc', 'KYOTO', 'queued', 0, None)
+
+        assert "status IN ('queued', 'running')" in stale_query_mock.call_args[0][0]
+        assert stale_query_mock.call_args[0][1] == ('KYOTO', 600)
+        assert "ON CONFLICT (city_name) WHERE status <> 'failed'" in query_mock.call_args[0][0]
+        assert query_mock.call_args[1]['filling_parameters'] == ('abc', 'KYOTO')
+
+
+def test_create_crawler_job_failed():
+    with patch(f'{MODULE_PATH}.exec_dml_query'), patch(f'{MODULE_PATH}.exec_dql_query', return_value=None):
+        assert create_crawler_job('abc', 'KYOTO', 600) is None
+
+
+def test_update_crawler_job():
+    with patch(f'{MODULE_PATH}.exec_dql_query', return_value=[('abc',)]) as query_mock:
+        assert update_crawler_job('abc', 'running', 1, None) is True
+        assert query_mock.call_args[1]['filling_parameters'] == ('running', 1, None, 'abc')
+
+    with patch(f'{MODULE_PATH}.exec_dql_query', return_value=[]):  # marked as lost in the meantime
+        assert update_crawler_job('abc', 'running', 1, None) is False
+
+
+def test_get_crawler_job():
+    with patch(f'{MODULE_PATH}.exec_dql_query', return_value=[]):
+        assert get_crawler_job('unknown') is None
+        assert get_latest_city_crawler_job('KYOTO') is None
+
+    with patch(f'{MODULE_PATH}.exec_dql_query', return_value=[('abc', 'KYOTO', 'failed', 3, 'timeout')]):
+        assert get_latest_city_crawler_job('KYOTO') == ('abc', 'KYOTO', 'failed', 3, 'timeout')
@@ -1,6 +1,6 @@
 """This module contains the tests for the config module of the data sub-app."""
 from pytest import raises
-from data_django.config import config
+from data_django.config import config, pool_config
 
 
 def test_config():
@@ -20,3 +20,12 @@ def test_config_error(monkeypatch):
 
     with raises(ReferenceError):
         config()
+
+
+def test_pool_config(monkeypatch):
+    monkeypatch.setenv("PGPOOL_MAX_SIZE", "25")
+    pool_params = pool_config()
+
+    assert pool_params["max_size"] == 25
+    assert pool_params["min_size"] == 1
+    assert pool_params["max_idle_seconds"] == 300.0
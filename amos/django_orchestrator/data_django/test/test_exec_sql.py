@@ -1,16 +1,29 @@
 """This module contains the tests for the exec_sql module of the data sub-app."""
 from mock import patch
 import pytest
-from data_django.exec_sql import exec_dml_query, exec_dql_query
+from data_django.connection_pool import ConnectionPool
+from psycopg2.errors import InvalidSqlStatementName
+from conftest import ConnectionMock, CursorMock
+from data_django.exec_sql import exec_dml_query, exec_dql_query, exec_prepared_query, PreparedStatement, \
+    exec_dml_batch_query
+
+STATEMENT = PreparedStatement("city_version", "SELECT version FROM xyz WHERE city_name = %s AND version > %s")
 
 
 def test_valid_dql_query(connection_mock):
-    with patch("data_django.exec_sql.connect", return_value=connection_mock) as conn_mock, patch(
-        "data_django.exec_sql.config", return_value={}
-    ) as config_mock:
-        assert (conn_mock.called or config_mock.called) is False
+    pool = ConnectionPool(lambda: connection_mock)
+    with patch("data_django.exec_sql.get_connection_pool", return_value=pool) as pool_mock:
+        assert pool_mock.called is False
         result = exec_dql_query("SELECT abc FROM xyz", True)
-        assert conn_mock.called and config_mock.called
+        assert pool_mock.called
+        assert result == [["Berlin"], ["Tokyo"]]
+        assert pool.stats()["idle"] == 1  # connection handed back
+
+
+def test_valid_parameterized_dql_query(connection_mock):
+    pool = ConnectionPool(lambda: connection_mock)
+    with patch("data_django.exec_sql.get_connection_pool", return_value=pool):
+        result = exec_dql_query("SELECT abc FROM xyz WHERE abc = %s", True, filling_parameters=("Berlin",))
         assert result == [["Berlin"], ["Tokyo"]]
 
 
@@ -19,18 +32,77 @@ def test_valid_dql_query(connection_mock):
     [('INSERT INTO a VALUES ("b", "c")', None), ('INSERT INTO a VALUES ("%s", "%s")', ("b", "c"))],
 )
 def test_valid_dml_query(connection_mock, dml_query, filling_parameters):
-    with patch("data_django.exec_sql.connect", return_value=connection_mock) as conn_mock, patch(
-        "data_django.exec_sql.config", return_value={}
-    ) as config_mock:
-        assert (conn_mock.called or config_mock.called) is False
+    pool = ConnectionPool(lambda: connection_mock)
+    with patch("data_django.exec_sql.get_connection_pool", return_value=pool) as pool_mock:
+        assert pool_mock.called is False
         exec_dml_query(dml_query, filling_parameters)
-        assert conn_mock.called and config_mock.called
+        assert pool_mock.called
+        assert pool.stats()["checked_out"] == 0
 
 
 def test_invalid_query(connection_exception_mock):
-    with patch("data_django.exec_sql.connect", return_value=connection_exception_mock) as conn_mock, patch(
-        "data_django.exec_sql.config", return_value={}
-    ) as config_mock:
-        assert (conn_mock.called or config_mock.called) is False
+    pool = ConnectionPool(lambda: connection_exception_mock)
+    with patch("data_django.exec_sql.get_connection_pool", return_value=pool):
         exec_dql_query("SELECT abc FROM xyz", True)  # errors caught
         exec_dml_query("SELECT abc FROM xyz", True)
+        assert pool.stats()["created"] == 1  # single connection reused across queries
+
+
+def test_prepared_statement_placeholders():
+    assert STATEMENT.prepare_statement == \
+           "PREPARE city_version AS SELECT version FROM xyz WHERE city_name = $1 AND version > $2"
+    assert STATEMENT.execute_statement(2) == "EXECUTE city_version (%s, %s)"
+    assert PreparedStatement("all_versions", "SELECT version FROM xyz").execute_statement(0) == "EXECUTE all_versions"
+
+
+def test_prepared_query_prepared_once_per_connection():
+    connection_mock = ConnectionMock()  # fresh connection without prepared statements
+    pool = ConnectionPool(lambda: connection_mock)
+    with patch("data_django.exec_sql.get_connection_pool", return_value=pool), \
+         patch.object(CursorMock, "execute") as execute_mock:
+        assert exec_prepared_query(STATEMENT, ("BERLIN", 1)) == [["Berlin"], ["Tokyo"]]
+        assert exec_prepared_query(STATEMENT, ("PARIS", 2)) == [["Berlin"], ["Tokyo"]]
+        assert [call[0] for call in execute_mock.call_args_list] == [
+            (STATEMENT.prepare_statement,),
+            ("EXECUTE city_version (%s, %s)", ("BERLIN", 1)),
+            ("EXECUTE city_version (%s, %s)", ("PARIS", 2)),
+        ]
+
+
+def test_prepared_query_reprepared_after_deallocation(connection_mock):
+    pool = ConnectionPool(lambda: connection_mock)
+    with patch("data_django.exec_sql.get_connection_pool", return_value=pool):
+        exec_prepared_query(STATEMENT, ("BERLIN", 1))
+        with patch.object(CursorMock, "execute", side_effect=[InvalidSqlStatementName(), None, None, None]) \
+                as execute_mock:
+            assert exec_prepared_query(STATEMENT, ("BERLIN", 1)) == [["Berlin"], ["Tokyo"]]
+            assert [call[0][0] for call in execute_mock.call_args_list] == \
+                   ["EXECUTE city_version (%s, %s)", "DEALLOCATE PREPARE ALL", STATEMENT.prepare_statement,
+                    "EXECUTE city_version (%s, %s)"]
+
+
+def test_invalid_prepared_query(connection_exception_mock):
+    pool = ConnectionPool(lambda: connection_exception_mock)
+    with patch("data_django.exec_sql.get_connection_pool", return_value=pool):
+        assert exec_prepared_query(STATEMENT, ("BERLIN", 1)) is None  # errors caught
+        assert pool.stats()["checked_out"] == 0
+
+
+def test_dml_batch_query(connection_mock):
+    pool = ConnectionPool(lambda: connection_mock)
+    rows = [("b", "c"), ("d", "e")]
+    with patch("data_django.exec_sql.get_connection_pool", return_value=pool), \
+         patch("data_django.exec_sql.execute_values") as execute_values_mock:
+        assert exec_dml_batch_query("INSERT INTO a VALUES %s", rows) is True
+        assert execute_values_mock.call_args[0][1:] == ("INSERT INTO a VALUES %s", rows)
+        assert execute_values_mock.call_args[1]["page_size"] == 2  # single statement
+        assert exec_dml_batch_query("INSERT INTO a VALUES %s", []) is True
+        assert execute_values_mock.call_count == 1
+
+
+def test_invalid_dml_batch_query(connection_mock):
+    pool = ConnectionPool(lambda: connection_mock)
+    with patch("data_django.exec_sql.get_connection_pool", return_value=pool), \
+         patch("data_django.exec_sql.execute_values", side_effect=Exception("duplicate key")):
+        assert exec_dml_batch_query("INSERT INTO a VALUES %s", [("b", "c")]) is False  # errors caught
+        assert pool.stats()["checked_out"] == 0
@@ -1,36 +1,159 @@
 """This module contains the tests for the handler module of the data sub-app."""
-from mock import patch, PropertyMock
-from data_django.handler import upload_image, get_downloaded_model, get_latest_model_version
+from hashlib import sha256
+from io import BytesIO
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from mock import ANY, patch
+from PIL import Image
+from data_django.handler import upload_image, upload_images, get_model_metadata, get_latest_model_version, \
+    iter_model_chunks, get_cached_model_file, get_models_metadata, ModelChangedError, ModelMetadata, \
+    ALL_MODELS_METADATA_STATEMENT, CITY_MODELS_METADATA_STATEMENT, LATEST_MODEL_VERSION_STATEMENT
+from data_django.image_encoding import encode_image
 
-FUNCTION_PATH = "data_django.handler.exec_dql_query"
+FUNCTION_PATH = "data_django.handler.exec_prepared_query"
 
 
-def test_upload_image(in_memory_uploaded_file_mock, md5_mock):
-    with patch("data_django.handler.Image", new_callable=PropertyMock, return_value=in_memory_uploaded_file_mock), \
-         patch("data_django.handler.md5", return_value=md5_mock), \
-         patch("data_django.handler.exec_dml_query"):
-        assert upload_image(in_memory_uploaded_file_mock, "Berlin") == md5_mock.hexdigest()
+def _get_png_bytes(width: int, height: int) -> bytes:
+    image_file = BytesIO()
+    Image.new("RGB", (width, height)).save(image_file, format="PNG")
+    return image_file.getvalue()
 
 
-def test_get_downloaded_model_found(model_mock):
-    with patch(FUNCTION_PATH, return_value=[[model_mock]]):
-        result_model = get_downloaded_model("berlin")
-        assert result_model == model_mock.tobytes()
+def test_upload_image():
+    with patch("data_django.handler.exec_dml_query") as dml_mock, \
+         patch("data_django.handler.exec_dql_query", return_value=[]):
+        source_hash = upload_image(SimpleUploadedFile("a.png", _get_png_bytes(4, 3)), "Berlin")
+        stored_image, city, height, width, stored_hash, content_hash, _ = dml_mock.call_args[0][1]
+        assert (city, height, width, stored_hash) == ("Berlin", 3, 4, source_hash)
+        assert content_hash == sha256(_get_png_bytes(4, 3)).hexdigest()  # hash of the uploaded, not the stored file
+        assert bytes(stored_image.adapted)[:3] == b"\xff\xd8\xff"  # compressed as JPEG
 
 
-def test_get_downloaded_model_not_found():
+def test_upload_image_already_persisted():
+    content = _get_png_bytes(4, 3)
+    with patch("data_django.handler.exec_dml_query") as dml_mock, \
+         patch("data_django.handler.exec_dql_query", side_effect=lambda query, return_result, filling_parameters:
+               [(content_hash,) for content_hash in filling_parameters[0]]):
+        assert upload_image(SimpleUploadedFile("a.png", content), "Berlin") is not None
+        dml_mock.assert_not_called()  # the blob never crosses the wire
+
+
+def test_upload_images():
+    images = [("a.png", _get_png_bytes(4, 3)), ("b.txt", b"no image"), ("c.png", b"\x89PNG\r\n\x1a\ncorrupt"),
+              ("d.png", _get_png_bytes(2, 2))]
+    with patch("data_django.handler.exec_dml_batch_query", return_value=True) as batch_mock, \
+         patch("data_django.handler.exec_dql_query", return_value=[]):
+        results = upload_images(iter(images), "BERLIN", is_valid_image=lambda content: content[1:4] == b"PNG",
+                                batch_size=3)
+        assert [(result.name, result.status) for result in results] == \
+               [("a.png", "uploaded"), ("b.txt", "rejected"), ("c.png", "rejected"), ("d.png", "uploaded")]
+        assert results[0].source_hash is not None and results[1].error == "Unsupported image format."
+        assert batch_mock.call_count == 2  # one insert per batch
+        inserted_row = batch_mock.call_args_list[0][0][1][0]
+        assert inserted_row[1:5] == ("BERLIN", 3, 4, results[0].source_hash)
+
+
+def test_upload_images_duplicates():
+    persisted, new = _get_png_bytes(4, 3), _get_png_bytes(2, 2)
+    persisted_hash = sha256(persisted).hexdigest()
+    images = [("a.png", persisted), ("b.png", new), ("c.png", new)]
+    with patch("data_django.handler.exec_dml_batch_query", return_value=True) as batch_mock, \
+         patch("data_django.handler.exec_dql_query", return_value=[(persisted_hash,)]) as query_mock, \
+         patch("data_django.handler.IMAGE_NEAR_DUPLICATE_DISTANCE", -1):
+        results = upload_images(images, "BERLIN", is_valid_image=lambda _: True)
+        assert [result.status for result in results] == ["rejected", "uploaded", "rejected"]
+        assert results[0].error == "Image has already been persisted."
+        assert len(batch_mock.call_args[0][1]) == 1  # duplicates of the same batch are uploaded once
+        assert query_mock.call_count == 1  # near-duplicate check disabled
+
+
+def test_upload_images_near_duplicates():
+    content = _get_png_bytes(4, 3)
+    perceptual_hash = encode_image(content).perceptual_hash
+    with patch("data_django.handler.exec_dml_batch_query", return_value=True) as batch_mock, \
+         patch("data_django.handler.exec_dql_query", side_effect=[[], [(perceptual_hash,)]]) as query_mock, \
+         patch("data_django.handler.IMAGE_NEAR_DUPLICATE_DISTANCE", 3):
+        results = upload_images([("a.png", content)], "BERLIN", is_valid_image=lambda _: True)
+        assert results[0].status == "rejected"
+        assert query_mock.call_args[1]["filling_parameters"] == ([perceptual_hash], 3)
+        batch_mock.assert_called_with(ANY, [])
+
+
+def test_upload_images_insert_failed():
+    with patch("data_django.handler.exec_dml_batch_query", return_value=False), \
+         patch("data_django.handler.exec_dql_query", return_value=None):
+        results = upload_images([("a.png", _get_png_bytes(4, 3))], "BERLIN", is_valid_image=lambda _: True)
+        assert results[0].status == "failed"
+
+
+def test_get_model_metadata_found():
+    with patch(FUNCTION_PATH, return_value=[("BERLIN", 7, 3, 1337, "ab" * 32, ["reichstag", "tv_tower"])]) \
+            as query_mock:
+        metadata = get_model_metadata("berlin")
+        assert metadata == ModelMetadata(trained_model_id=7, version=3, size=1337, sha256="ab" * 32,
+                                         class_names=("reichstag", "tv_tower"))
+        assert metadata.etag == '"7-3"'
+        query_mock.assert_called_with(CITY_MODELS_METADATA_STATEMENT, (["BERLIN"],))
+
+
+def test_get_model_metadata_not_found():
     with patch(FUNCTION_PATH, return_value=[]):
-        result_model = get_downloaded_model("berlin")
-        assert result_model is None
+        assert get_model_metadata("berlin") is None
+
+
+def test_get_models_metadata():
+    with patch(FUNCTION_PATH, return_value=[("BERLIN", 7, 3, 1337, "ab" * 32, ["reichstag"]),
+                                            ("PARIS", 9, 1, 42, "cd" * 32, [])]) as query_mock:
+        metadata = get_models_metadata()
+        assert list(metadata) == ["BERLIN", "PARIS"]
+        assert metadata["PARIS"].class_names == ()
+        query_mock.assert_called_with(ALL_MODELS_METADATA_STATEMENT)
+
+
+def test_get_models_metadata_query_failed():
+    with patch(FUNCTION_PATH, return_value=None):
+        assert get_models_metadata(["berlin"]) == {}
+
+
+def test_iter_model_chunks(model_mock):
+    with patch(FUNCTION_PATH, return_value=[[model_mock]]) as query_mock:
+        chunks = list(iter_model_chunks(7, 3, start=10, end=34, chunk_size=10))
+        assert chunks == [model_mock.tobytes()] * 3
+        # one-based SQL offsets, last chunk shortened to the requested end, every chunk pinned to the version
+        assert [call[0][1] for call in query_mock.call_args_list] == \
+               [(11, 10, 7, 3), (21, 10, 7, 3), (31, 5, 7, 3)]
+
+
+def test_iter_model_chunks_model_changed(model_mock):
+    with patch(FUNCTION_PATH, side_effect=[[[model_mock]], []]):
+        chunks = iter_model_chunks(7, 3, start=0, end=99, chunk_size=10)
+        assert next(chunks) == model_mock.tobytes()
+        with pytest.raises(ModelChangedError):  # aborts instead of silently ending short
+            next(chunks)
 
 
 def test_get_latest_model_version():
-    with patch(FUNCTION_PATH, return_value=[['22']]):
+    with patch(FUNCTION_PATH, return_value=[['22']]) as query_mock:
         result_model = get_latest_model_version("berlin")
         assert result_model == 22
+        query_mock.assert_called_with(LATEST_MODEL_VERSION_STATEMENT, ("BERLIN",))
 
 
 def test_get_latest_model_version_not_found():
     with patch(FUNCTION_PATH, return_value=[]):
         result_model = get_latest_model_version("berlin")
         assert result_model == -1
+
+
+def test_get_cached_model_file(model_mock):
+    with patch("data_django.handler.get_cached_model_path", return_value="model_cache/abc.pt") as cache_mock, \
+         patch("data_django.handler.iter_model_chunks", return_value=iter([])) as chunks_mock:
+        assert get_cached_model_file("berlin", ModelMetadata(7, 3, 1337)) == "model_cache/abc.pt"
+        assert cache_mock.call_args[0][:4] == ("berlin", 7, 3, 1337)
+        cache_mock.call_args[0][4]()  # fetches the whole model on cache misses
+        chunks_mock.assert_called_with(7, 3, 0, 1336)
+
+
+def test_get_cached_model_file_model_changed():
+    with patch("data_django.handler.get_cached_model_path", side_effect=ModelChangedError("changed")):
+        assert get_cached_model_file("berlin", ModelMetadata(7, 3, 1337)) is None
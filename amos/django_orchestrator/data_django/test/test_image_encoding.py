@@ -0,0 +1,57 @@
+"""This module contains the tests for the image_encoding module of the data sub-app."""
+from hashlib import md5, sha256
+from io import BytesIO
+from mock import patch
+from PIL import Image
+import pytest
+from data_django.image_encoding import encode_image, get_perceptual_hash
+
+MODULE_PATH = "data_django.image_encoding"
+
+
+def _get_image_bytes(mode: str, size, image_format: str = "PNG") -> bytes:
+    image_file = BytesIO()
+    Image.new(mode, size, color=128 if mode == "L" else None).save(image_file, format=image_format)
+    return image_file.getvalue()
+
+
+def _get_reencoded_bytes(img: Image.Image) -> bytes:
+    image_file = BytesIO()
+    img.save(image_file, format="JPEG", quality=50)
+    return image_file.getvalue()
+
+
+@pytest.mark.parametrize("storage_format, expected_format", [("JPEG", "JPEG"), ("WEBP", "WEBP")])
+def test_encode_image(storage_format, expected_format):
+    content = _get_image_bytes("RGBA", (300, 200))
+    with patch(f"{MODULE_PATH}.IMAGE_STORAGE_FORMAT", storage_format), \
+         patch(f"{MODULE_PATH}.IMAGE_STORAGE_MAX_SIDE", 150):
+        encoded_image = encode_image(content)
+        assert Image.open(BytesIO(encoded_image.content)).format == expected_format
+        assert (encoded_image.width, encoded_image.height) == (150, 100)  # aspect ratio kept
+        # hash of the uploaded pixels, independent of the storage format and resolution
+        assert encoded_image.source_hash == md5(Image.open(BytesIO(content)).tobytes()).hexdigest()
+        # hash of the uploaded file, identical to the hash the crawler pushes for the same download
+        assert encoded_image.content_hash == sha256(content).hexdigest()
+
+
+def test_encode_image_original():
+    content = _get_image_bytes("L", (30, 20))
+    with patch(f"{MODULE_PATH}.IMAGE_STORAGE_FORMAT", "ORIGINAL"):
+        encoded_image = encode_image(content)
+        assert (encoded_image.content, encoded_image.width, encoded_image.height) == (content, 30, 20)
+
+
+def test_get_perceptual_hash():
+    fractal = Image.effect_mandelbrot((64, 48), (-2, -1.5, 1, 1.5), 100)
+    perceptual_hash = get_perceptual_hash(fractal)
+    assert -2 ** 63 <= perceptual_hash < 2 ** 63  # fits a Postgres BIGINT
+    # re-encoded and rescaled copies keep (almost) the same hash, other images do not
+    reencoded = Image.open(BytesIO(_get_reencoded_bytes(fractal.resize((128, 96)))))
+    assert bin((get_perceptual_hash(reencoded) ^ perceptual_hash) & (2 ** 64 - 1)).count("1") <= 3
+    assert get_perceptual_hash(fractal.rotate(180)) != perceptual_hash
+
+
+def test_encode_image_invalid():
+    with pytest.raises(Exception):
+        encode_image(b"no image")
@@ -0,0 +1,76 @@
+"""This module contains the tests for the model_cache module of the data sub-app."""
+import os
+import pytest
+from data_django.model_cache import get_cached_model_path, open_file_range
+
+MODEL = b'<SOME AWESOME .pt MODEL!>'
+
+
+@pytest.fixture(autouse=True)
+def model_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('MODEL_CACHE_DIR', str(tmp_path))
+    monkeypatch.setenv('MODEL_CACHE_MAX_BYTES', str(10 * len(MODEL)))
+    return tmp_path
+
+
+def _chunks(model=MODEL, chunk_size=10):
+    return iter([model[i:i + chunk_size] for i in range(0, len(model), chunk_size)])
+
+
+def test_get_cached_model_path_miss_and_hit():
+    calls = []
+
+    def _model_chunks():
+        calls.append(True)
+        return _chunks()
+
+    first_path = get_cached_model_path('berlin', 7, 3, len(MODEL), _model_chunks)
+    second_path = get_cached_model_path('Berlin', 7, 3, len(MODEL), _model_chunks)
+
+    assert first_path == second_path
+    assert len(calls) == 1
+    with open(first_path, 'rb') as model_file:
+        assert model_file.read() == MODEL
+
+
+def test_get_cached_model_path_new_version_replaces_old_file():
+    old_path = get_cached_model_path('berlin', 7, 3, len(MODEL), _chunks)
+    new_model = MODEL[::-1]
+    new_path = get_cached_model_path('berlin', 8, 4, len(new_model), lambda: _chunks(new_model))
+
+    assert old_path != new_path
+    assert not os.path.exists(old_path)
+    assert os.path.exists(new_path)
+
+
+def test_get_cached_model_path_incomplete_model(model_cache_dir):
+    assert get_cached_model_path('berlin', 7, 3, len(MODEL) + 1, _chunks) is None
+    assert os.listdir(model_cache_dir) == []
+
+
+def test_get_cached_model_path_disabled(monkeypatch):
+    monkeypatch.setenv('MODEL_CACHE_MAX_BYTES', '0')
+    assert get_cached_model_path('berlin', 7, 3, len(MODEL), _chunks) is None
+
+
+def test_get_cached_model_path_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setenv('MODEL_CACHE_MAX_BYTES', str(2 * len(MODEL)))
+    models = {city: bytes([index]) * len(MODEL) for index, city in enumerate(['berlin', 'paris', 'rome'])}
+    paths = {}
+    for timestamp, (city, model) in enumerate(models.items()):
+        paths[city] = get_cached_model_path(city, 1, 1, len(model), lambda: _chunks(model))
+        os.utime(paths[city], (timestamp, timestamp))
+
+    assert not os.path.exists(paths['berlin'])
+    assert os.path.exists(paths['paris']) and os.path.exists(paths['rome'])
+
+
+def test_open_file_range(tmp_path):
+    model_path = tmp_path / 'model.pt'
+    model_path.write_bytes(MODEL)
+    assert list(open_file_range(str(model_path), 2, 8, chunk_size=4)) == [MODEL[2:6], MODEL[6:9]]
+
+
+def test_open_file_range_missing_file(tmp_path):
+    with pytest.raises(OSError):
+        open_file_range(str(tmp_path / 'evicted.pt'), 0, 9)
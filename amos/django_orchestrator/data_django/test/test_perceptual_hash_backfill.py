@@ -0,0 +1,33 @@
+"""This module contains the tests for the perceptual_hash_backfill module of the data sub-app."""
+from io import BytesIO
+from mock import patch
+from PIL import Image
+from data_django.image_encoding import encode_image
+from data_django.perceptual_hash_backfill import backfill_perceptual_hashes
+
+MODULE_PATH = "data_django.perceptual_hash_backfill"
+
+
+def _get_png_bytes() -> bytes:
+    image_file = BytesIO()
+    Image.effect_mandelbrot((64, 48), (-2, -1.5, 1, 1.5), 100).save(image_file, format="PNG")
+    return image_file.getvalue()
+
+
+def test_backfill_perceptual_hashes():
+    png = _get_png_bytes()
+    query_results = [[(1, memoryview(png)), (2, memoryview(b"no image"))], []]
+    with patch(f"{MODULE_PATH}.exec_dql_query", side_effect=query_results) as query_mock, \
+         patch(f"{MODULE_PATH}.exec_dml_batch_query", return_value=True) as update_mock:
+        report = backfill_perceptual_hashes(batch_size=2)
+
+        assert (report.n_hashed, report.n_skipped, report.n_failed) == (1, 1, 0)
+        # crawled images are hashed exactly like uploads of the same file
+        assert update_mock.call_args[0][1] == [(1, encode_image(png).perceptual_hash)]
+        assert query_mock.call_args_list[1][1]["filling_parameters"] == (2, 2)  # keyset pagination
+
+
+def test_backfill_perceptual_hashes_failed_update():
+    with patch(f"{MODULE_PATH}.exec_dql_query", side_effect=[[(1, _get_png_bytes())], []]), \
+         patch(f"{MODULE_PATH}.exec_dml_batch_query", return_value=False):
+        assert backfill_perceptual_hashes().n_failed == 1
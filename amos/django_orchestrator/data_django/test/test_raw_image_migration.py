@@ -0,0 +1,59 @@
+"""This module contains the tests for the raw_image_migration module of the data sub-app."""
+from io import BytesIO
+from mock import patch
+from PIL import Image
+import pytest
+from data_django.raw_image_migration import decode_raw_image, recompress_raw_images
+
+MODULE_PATH = "data_django.raw_image_migration"
+
+
+def _get_png_bytes(width: int, height: int) -> bytes:
+    image_file = BytesIO()
+    Image.new("RGB", (width, height)).save(image_file, format="PNG")
+    return image_file.getvalue()
+
+
+@pytest.mark.parametrize("mode", ["L", "RGB", "RGBA"])
+def test_decode_raw_image(mode):
+    img = Image.new(mode, (40, 30))
+    decoded_image = decode_raw_image(img.tobytes(), 40, 30)
+    assert decoded_image.mode == mode and decoded_image.size == (40, 30)
+
+
+@pytest.mark.parametrize("stored_image, width, height", [
+    (bytes(40 * 30 * 2), 40, 30),  # no known pixel format
+    (bytes(40 * 30 * 3 + 1), 40, 30),  # resolution mismatch
+    (bytes(40 * 30 * 3), 0, 0),
+])
+def test_decode_raw_image_no_raw_image(stored_image, width, height):
+    assert decode_raw_image(stored_image, width, height) is None
+
+
+def test_decode_raw_image_encoded_image():
+    png = _get_png_bytes(4, 3)
+    assert decode_raw_image(png, len(png), 1) is None  # matching size, but a PNG header
+
+
+def test_recompress_raw_images():
+    raw_image, png = Image.new("RGB", (40, 30)).tobytes(), _get_png_bytes(40, 30)
+    query_results = [[(1, 40, 30), (2, 40, 30)], [(1, memoryview(raw_image)), (2, memoryview(png))], []]
+    with patch(f"{MODULE_PATH}.exec_dql_query", side_effect=query_results) as query_mock, \
+         patch(f"{MODULE_PATH}.exec_dml_batch_query", return_value=True) as update_mock:
+        report = recompress_raw_images(batch_size=2)
+
+        assert (report.n_recompressed, report.n_skipped, report.n_failed) == (1, 1, 0)
+        assert report.bytes_before == len(raw_image) and 0 < report.bytes_after < report.bytes_before
+        assert report.bytes_reclaimed == report.bytes_before - report.bytes_after
+        assert "reclaimed" in str(report)
+        assert [image_id for image_id, _ in update_mock.call_args[0][1]] == [1]
+        assert query_mock.call_args_list[2][1]["filling_parameters"] == (2, 2)  # keyset pagination
+
+
+def test_recompress_raw_images_dry_run():
+    raw_image = Image.new("L", (40, 30)).tobytes()
+    with patch(f"{MODULE_PATH}.exec_dql_query", side_effect=[[(1, 40, 30)], [(1, raw_image)], []]), \
+         patch(f"{MODULE_PATH}.exec_dml_batch_query") as update_mock:
+        report = recompress_raw_images(is_dry_run=True)
+        assert report.n_recompressed == 1 and report.bytes_reclaimed > 0
+        assert not update_mock.called
@@ -70,6 +70,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "django_orchestrator.wsgi.application"
 
+# serve the non-blocking API views, enabled by default when running via django_orchestrator.asgi
+ASYNC_API = os.getenv("ASYNC_API", "false").lower() == "true"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -13,11 +13,12 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path, include
 from swagger_render.views import SwaggerUIView
 
 urlpatterns = [
-    path('api/', include('api.urls')),
+    path('api/', include('api.async_urls' if settings.ASYNC_API else 'api.urls')),
     path('swagger/', SwaggerUIView.as_view()),
 ] + static('/docs/', document_root='docs')
@@ -34,7 +34,8 @@ def get_downloaded_model(city: str) -> Optional[bytes]:
     print("{0}/api/cities/{1}/model".format(api_endpoint_url, city.upper()))
     try:
 
-        latest_version = get_dwh_model_version(city)
+        model_metadata = get_model_metadata(city)
+        latest_version = model_metadata['version'] if model_metadata is not None else -1
         r = requests.get("{0}/api/cities/{1}/model".format(api_endpoint_url, city.upper()))
 
         file = open("weights/versions.txt", "r")
@@ -52,23 +53,25 @@ def get_downloaded_model(city: str) -> Optional[bytes]:
         return None
 
 
-def get_dwh_model_version(city: str) -> int:
-    """Returns the current model version in dwh.
+def get_model_metadata(city: str) -> Optional[dict]:
+    """Returns the metadata of the current model of the specified city with a single cheap request.
+
     Parameters
     ----------
     city: str
         Name of the city.
+
     Returns
     -------
-    version: int or None
-        Retrieved version number.
-
+    metadata: dict or None
+        Model version, size, sha256 hash, trained_model_id and class names, None if unavailable.
     """
     api_endpoint_url = os.environ["API_ENDPOINT_URL"]
-    print("{0}/api/cities/{1}/model/version".format(api_endpoint_url, city))
     try:
-        r = requests.get("{0}/api/cities/{1}/model/version".format(api_endpoint_url, city))
-        return int(r.text)
+        r = requests.get("{0}/api/cities/{1}/model/meta".format(api_endpoint_url, city.upper()), timeout=2)
+        if r.status_code != 200:
+            return None
+        return json.loads(r.text)
     except requests.exceptions.RequestException as e:
         print(e)
         return None
@@ -1,5 +1,5 @@
 import pytest
-from api_communication.api_handler import get_downloaded_model
+from api_communication.api_handler import get_downloaded_model, get_model_metadata
 from mock import patch
 from requests import exceptions
 
@@ -24,18 +24,44 @@ def side_effect_failure(url):
     raise exceptions.RequestException("No Model")
 
 
-def test_getdownloaded_model():
+def test_getdownloaded_model(tmp_path, monkeypatch):
     mock_city = "test_city"
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "weights").mkdir()
+    (tmp_path / "weights" / "versions.txt").write_text("OTHER_CITY=2\nTEST_CITY=1\n")
 
-    with patch("requests.get", side_effect=side_effect_success) as exec_api_request:
+    with patch("requests.get", side_effect=side_effect_success) as exec_api_request, \
+         patch("api_communication.api_handler.get_model_metadata", return_value={"version": 3}):
         assert (exec_api_request.called) is False
         result = get_downloaded_model(mock_city)
-        exec_api_request.assert_called_with("{0}/api/cities/{1}/model".format(API_ENDPOINT_URL, mock_city))
+        exec_api_request.assert_called_once_with("{0}/api/cities/{1}/model".format(API_ENDPOINT_URL, "TEST_CITY"))
         assert result.decode("utf-8") == "mock_model"
+        # the version is taken from the single metadata request
+        assert (tmp_path / "weights" / "versions.txt").read_text() == "OTHER_CITY=2\nTEST_CITY=3\n"
 
-    with patch("requests.get", side_effect=side_effect_failure) as exec_api_request:
+    with patch("requests.get", side_effect=side_effect_failure) as exec_api_request, \
+         patch("api_communication.api_handler.get_model_metadata", return_value=None):
         assert (exec_api_request.called) is False
         result = get_downloaded_model(mock_city)
-        print(result)
-        exec_api_request.assert_called_with("{0}/api/cities/{1}/model".format(API_ENDPOINT_URL, mock_city))
+        exec_api_request.assert_called_with("{0}/api/cities/{1}/model".format(API_ENDPOINT_URL, "TEST_CITY"))
         assert result is None
+
+
+class MetadataMockClass:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = '{"city": "TEST_CITY", "version": 3, "class_names": ["sight_a"]}'
+
+
+def test_get_model_metadata():
+    with patch("requests.get", return_value=MetadataMockClass(200)) as exec_api_request:
+        result = get_model_metadata("test_city")
+        exec_api_request.assert_called_with("{0}/api/cities/TEST_CITY/model/meta".format(API_ENDPOINT_URL), timeout=2)
+        assert result["version"] == 3
+        assert result["class_names"] == ["sight_a"]
+
+    with patch("requests.get", return_value=MetadataMockClass(404)):
+        assert get_model_metadata("test_city") is None
+
+    with patch("requests.get", side_effect=exceptions.RequestException("No Model")):
+        assert get_model_metadata("test_city") is None
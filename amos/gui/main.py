@@ -23,7 +23,7 @@ from PyQt5.QtMultimedia import QCamera, QCameraInfo
 from PyQt5.QtMultimediaWidgets import QCameraViewfinder
 from PyQt5.QtGui import QPixmap, QIcon
 from PyQt5.QtCore import QCoreApplication, QRect, QMetaObject
-from api_communication.api_handler import get_downloaded_model, get_dwh_model_version, \
+from api_communication.api_handler import get_downloaded_model, get_model_metadata, \
 	get_supported_cities, send_city_request, send_new_image
 from datetime import datetime
 import shutil
@@ -298,7 +298,8 @@ class UiMainWindow(QWidget):
 							downloaded_version = int(elements[1])
 							break
 
-				latest_version = get_dwh_model_version(city)
+				model_metadata = get_model_metadata(city)
+				latest_version = model_metadata['version'] if model_metadata is not None else -1
 
 				if downloaded_version == -1:
 					msg = QMessageBox()
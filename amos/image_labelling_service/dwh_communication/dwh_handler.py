@@ -1,6 +1,11 @@
 """This module contains necessary business logic in order to communicate with the dwh_communication warehouse."""
 from dwh_communication.exec_dwh_sql import exec_dml_query
 from json import loads
+from typing import Tuple
+
+IMAGE_LABEL_DML_QUERY = (
+    "INSERT INTO load_layer.sight_image_labels(sight_image_data_source, sight_labels) VALUES (%s, %s)"
+)
 
 
 def upload_image_labels(labels: str, source_hash: str) -> None:
@@ -13,13 +18,11 @@ def upload_image_labels(labels: str, source_hash: str) -> None:
     source_hash: str
         Image lookup hash.
     """
-    filled_dml_query = _get_image_label_dml_query(labels, source_hash)
-    exec_dml_query(filled_dml_query, None)
+    exec_dml_query(IMAGE_LABEL_DML_QUERY, _get_image_label_dml_parameters(labels, source_hash))
 
 
-def _get_image_label_dml_query(labels: str, source_hash: str) -> str:
-    """Returns the prepared DML query necessary to insert the passed labels
-    for the image corresponding to the passed lookup key.
+def _get_image_label_dml_parameters(labels: str, source_hash: str) -> Tuple[str, str]:
+    """Returns the parameters to bind to the label insertion query for the image corresponding to the passed lookup key.
 
     Parameters
     ----------
@@ -30,8 +33,10 @@ def _get_image_label_dml_query(labels: str, source_hash: str) -> str:
 
     Returns
     -------
-    dml_query: str
-        Prepared DML query for the label insertion.
+    source_hash: str
+        Image lookup hash.
+    bounding_boxes: str
+        Bounding box labels as a PostgreSQL array literal.
     """
     bounding_boxes_input_dict = loads(labels)
     n_bounding_boxes = len(bounding_boxes_input_dict["boundingBoxes"])
@@ -49,7 +54,4 @@ def _get_image_label_dml_query(labels: str, source_hash: str) -> str:
 
     bounding_boxes_postgres_output_string += "}"
 
-    return (
-        "INSERT INTO load_layer.sight_image_labels(sight_image_data_source, sight_labels) "
-        f"VALUES ('{source_hash}', '{bounding_boxes_postgres_output_string}')"
-    )
+    return source_hash, bounding_boxes_postgres_output_string
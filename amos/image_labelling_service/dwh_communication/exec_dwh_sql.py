@@ -4,7 +4,8 @@ from .dwh_config import config
 from psycopg2 import connect
 
 
-def exec_dql_query(postgres_sql_string: str, return_result=False) -> Optional[object]:
+def exec_dql_query(postgres_sql_string: str, return_result=False,
+                   filling_parameters: Optional[Tuple[object]] = None) -> Optional[object]:
     """Executes a given PostgreSQL string on the data warehouse and potentially returns the query result.
 
     Parameters
@@ -13,6 +14,8 @@ def exec_dql_query(postgres_sql_string: str, return_result=False) -> Optional[ob
         PostgreSQL query to evaluate in the external DHW.
     return_result: bool, default=False
         Whether to return the query result.
+    filling_parameters: tuple[object] or None, default=None
+        Query parameters to bind, None if the query is already filled.
 
     Returns
     -------
@@ -26,7 +29,10 @@ def exec_dql_query(postgres_sql_string: str, return_result=False) -> Optional[ob
         with connection.cursor() as cursor:
 
             try:
-                cursor.execute(postgres_sql_string)
+                if filling_parameters is None:
+                    cursor.execute(postgres_sql_string)
+                else:
+                    cursor.execute(postgres_sql_string, filling_parameters)
                 connection.commit()
                 cursor_result = cursor.fetchall()
                 result = cursor_result if (return_result and cursor_result is not None) else return_result
@@ -1,5 +1,5 @@
 """This module contains the tests for the handler module of the dwh_communication sub-app."""
-from dwh_communication.dwh_handler import upload_image_labels, _get_image_label_dml_query
+from dwh_communication.dwh_handler import upload_image_labels, _get_image_label_dml_parameters, IMAGE_LABEL_DML_QUERY
 from mock import patch
 
 
@@ -7,17 +7,14 @@ def test_upload_image_labels(labels_mock, md5_mock):
     with patch("dwh_communication.dwh_handler.exec_dml_query") as exec_mock:
         upload_image_labels(labels_mock, md5_mock.hexdigest())
         assert exec_mock.called
-        called_query = exec_mock.mock_calls[0][1][0]
-        assert str(md5_mock.hexdigest()) in called_query
+        called_query, called_parameters = exec_mock.mock_calls[0][1]
+        assert called_query == IMAGE_LABEL_DML_QUERY
+        assert called_parameters[0] == md5_mock.hexdigest()
 
 
-def test_get_image_label_dml_query(labels_mock, md5_mock):
-    built_query = _get_image_label_dml_query(labels_mock, md5_mock.hexdigest())
-    assert (
-        built_query == "INSERT INTO load_layer.sight_image_labels(sight_image_data_source, sight_labels) "
-        "VALUES ('b'testtesttesttesttesttesttest'', "
-        "'{\""
-        '(0.12122,0.34212,0.33311,0.12315,Brandenburger Tor)",'
-        '"(0.12122,0.34212,0.33311,0.12315,Siegessaeule)'
-        "\"}')"
+def test_get_image_label_dml_parameters(labels_mock, md5_mock):
+    parameters = _get_image_label_dml_parameters(labels_mock, md5_mock.hexdigest())
+    assert parameters == (
+        md5_mock.hexdigest(),
+        '{"(0.12122,0.34212,0.33311,0.12315,Brandenburger Tor)","(0.12122,0.34212,0.33311,0.12315,Siegessaeule)"}'
     )
@@ -2,6 +2,7 @@
 
 and merging them into the data warehouse - provided the specified city is yet not supported.
 """
+from dwh_communication.dwh_handler import IMAGE_LABEL_DML_QUERY
 from dwh_communication.exec_dwh_sql import exec_dql_query, exec_dml_query
 from google.cloud import vision
 from google.protobuf.json_format import MessageToDict
@@ -177,10 +178,9 @@ def _label_image(image_id: int) -> bool:
         dql_query = (
             "SELECT img.image_file AS file, img.image_source AS source "
             "FROM integration_layer.dim_sights_images AS img "
-            f"WHERE img.image_id = {image_id} "
+            "WHERE img.image_id = %s"
         )
-        content = exec_dql_query(dql_query, return_result=True)
-
+        content = exec_dql_query(dql_query, return_result=True, filling_parameters=(image_id,))
 
         # retrieve bounding boxes in data warehouse-readable format
         image_bytes, image_source = bytes(content[0][0]), content[0][1]
@@ -196,11 +196,7 @@ def _label_image(image_id: int) -> bool:
             final_bounding_boxes_string = _get_merged_bounding_box_string(bounding_box_strings)
 
             # merge labels into data warehouse
-            dml_query = (
-                "INSERT INTO load_layer.sight_image_labels(sight_image_data_source, sight_labels) "
-                f"VALUES ('{image_source}', '{final_bounding_boxes_string}')"
-            )
-            exec_dml_query(dml_query, filling_parameters=None)
+            exec_dml_query(IMAGE_LABEL_DML_QUERY, filling_parameters=(image_source, final_bounding_boxes_string))
 
         return is_label_retrieved
     except Exception as e:
@@ -284,12 +280,13 @@ def _read_image_ids_for_labelling(city_name: str) -> Optional[List[int]]:
         "WHERE img.image_id = sights.image_id AND "
         "sights.city_id = cities.city_id AND "
         "img.image_labels IS NULL AND "
-        f"cities.city_name = '{city_name.upper()}'"
+        "cities.city_name = %s"
         ") AS ids "
-        f"ORDER BY RANDOM() LIMIT {max_google_vision_calls_per_new_city}"
+        "ORDER BY RANDOM() LIMIT %s"
     )
 
-    image_ids_to_label = exec_dql_query(query, return_result=True)
+    image_ids_to_label = exec_dql_query(query, return_result=True,
+                                        filling_parameters=(city_name.upper(), max_google_vision_calls_per_new_city))
     if image_ids_to_label is not None:
         image_ids_to_label = [id_tpl[0] for id_tpl in image_ids_to_label]
 
@@ -49,21 +49,24 @@ def test_label_image(vision_response_mock: List[Dict[str, Union[str, float, dict
     mock_url = 'https://xd.com/awesome.png'
 
     with patch(f'{MODULE_PATH}.exec_dql_query',
-               return_value=[[image_mock, mock_url]]), \
+               return_value=[[image_mock, mock_url]]) as fetcher, \
          patch(f'{MODULE_PATH}._get_landmarks_from_vision', return_value=vision_response_mock), \
          patch(f'{MODULE_PATH}.exec_dml_query') as persistor:
         _label_image(42)
 
+        # image fetched by bound id
+        assert fetcher.call_args[1]['filling_parameters'] == (42,)
+
         # no error occurring
         assert persistor.called
-        called_query = persistor.call_args_list[0][0][0]
+        called_source, called_labels = persistor.call_args_list[0][1]['filling_parameters']
 
         # url extraction correct
-        assert mock_url in called_query
+        assert called_source == mock_url
 
         # both labels saved
-        assert re.escape(vision_response_mock[0]['description']) in called_query
-        assert re.escape(vision_response_mock[1]['description']) in called_query
+        assert re.escape(vision_response_mock[0]['description']) in called_labels
+        assert re.escape(vision_response_mock[1]['description']) in called_labels
 
 
 def test_log_incident() -> None:
@@ -94,7 +97,9 @@ def test_parsing_landmark_to_str(vision_response_mock: List[Dict[str, Union[str,
 
 
 def test_read_image_ids_for_labelling(monkeypatch: MonkeyPatch) -> None:
-    with patch(f'{MODULE_PATH}.exec_dql_query', return_value=[(1,), (2,), (3,)]):
+    monkeypatch.setenv('MAX_GOOGLE_VISION_CALLS_PER_NEW_CITY', '10')
+    with patch(f'{MODULE_PATH}.exec_dql_query', return_value=[(1,), (2,), (3,)]) as fetcher:
         image_ids_to_label = _read_image_ids_for_labelling('test city')
         assert image_ids_to_label is not None
         assert image_ids_to_label == [1, 2, 3]
+        assert fetcher.call_args[1]['filling_parameters'] == ('TEST CITY', 10)
@@ -0,0 +1,142 @@
+"""This module contains a benchmark comparing the former sequential training data writer to the parallel one.
+
+The former writer globbed the images directory once per image in order to compute the next file index, i.e. exporting
+n images scanned O(n²) directory entries. Both writers export the same distinct synthetic images into temporary
+directories, the parallel writer stores them in an empty image cache first (i.e. a cold cache like a first training
+run), hence the benchmark needs neither the data warehouse nor a GPU, e.g.
+
+    python benchmarks/dataset_writer_benchmark.py --images 5000 10000 20000
+"""
+import argparse
+import glob
+import imghdr
+import os
+import sys
+import tempfile
+from hashlib import sha256
+from io import BytesIO
+from time import perf_counter
+from typing import Callable, List, Tuple
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from yolov5.trainer_endpoint import _cache_image, _persist_image_and_label_files_batch  # noqa: E402
+
+_LABEL = "Statueofliberty"
+_BOUNDING_BOXES_ENCODING = '{"(0.1,0.6,0.5,0.2,\\"%s\\")"}' % _LABEL
+
+
+def _get_synthetic_images(n_images: int) -> List[Tuple[bytes, str]]:
+    """Returns n distinct small JPEG images with a single bounding box.
+
+    Parameters
+    ----------
+    n_images: int
+        Number of images.
+
+    Returns
+    -------
+    images: list[tuple[bytes, str]]
+        Images and their bounding boxes encoding as streamed from the data warehouse.
+    """
+    image_file = BytesIO()
+    Image.effect_mandelbrot((320, 240), (-2, -1.5, 1, 1.5), 100).save(image_file, format="JPEG")
+    # decoders ignore bytes after the end of image marker, hence every image has its own content and file
+    return [(image_file.getvalue() + index.to_bytes(4, "big"), _BOUNDING_BOXES_ENCODING) for index in range(n_images)]
+
+
+def _persist_sequentially(images: List[Tuple[bytes, str]]) -> int:
+    """Persists the passed images like the former writer, i.e. sequentially and globbing once per image.
+
+    Parameters
+    ----------
+    images: list[tuple[bytes, str]]
+        Images and their bounding boxes encoding.
+
+    Returns
+    -------
+    success_count: int
+        Number of persisted images.
+    """
+    success_count = 0
+    for image, _ in images:
+        index = len(glob.glob("../training_data/images/*")) + 1
+        with BytesIO(image) as _file:
+            ext = imghdr.what(_file)
+        with open("../training_data/images/" + str(index) + "." + ext, "wb") as image_file:
+            image_file.write(image)
+        with open("../training_data/labels/" + str(index) + ".txt", "w") as label_file:
+            label_file.write(f"{_LABEL} 0.3 0.6 0.4 0.4\n")
+        success_count += 1
+
+    return success_count
+
+
+def _persist_in_parallel(images: List[Tuple[bytes, str]]) -> int:
+    """Caches the passed images and persists them with the parallel writer, which links them from the cache.
+
+    Parameters
+    ----------
+    images: list[tuple[bytes, str]]
+        Images and their bounding boxes encoding.
+
+    Returns
+    -------
+    success_count: int
+        Number of persisted images.
+    """
+    cached_images = ((_cache_image(image_id, sha256(image).hexdigest(), image, cache_dir="../image_cache"), labels)
+                     for image_id, (image, labels) in enumerate(images, start=1))
+    return _persist_image_and_label_files_batch(cached_images, {_LABEL: _LABEL}, [], set())
+
+
+def run_export(images: List[Tuple[bytes, str]], persist: Callable[[List[Tuple[bytes, str]]], int]) -> float:
+    """Exports the passed images into a fresh temporary training data directory.
+
+    Parameters
+    ----------
+    images: list[tuple[bytes, str]]
+        Images and their bounding boxes encoding.
+    persist: callable
+        Writer to measure.
+
+    Returns
+    -------
+    duration_seconds: float
+        Duration of the export.
+    """
+    working_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as root_dir:
+        for sub_dir in ("training_data/images", "training_data/labels", "image_cache", "cwd"):
+            os.makedirs(os.path.join(root_dir, sub_dir))
+        os.chdir(os.path.join(root_dir, "cwd"))  # the writers persist relative to ../training_data
+        try:
+            start = perf_counter()
+            n_persisted_images = persist(images)
+            duration_seconds = perf_counter() - start
+        finally:
+            os.chdir(working_dir)
+
+    if n_persisted_images != len(images):
+        print(f"Warning: {n_persisted_images} of {len(images)} images persisted.")
+    return duration_seconds
+
+
+def main() -> None:
+    """Runs both writers for every passed number of images and prints a comparison table."""
+    parser = argparse.ArgumentParser(description="Compares the sequential and the parallel training data writer.")
+    parser.add_argument("--images", type=int, nargs="+", default=[5000, 10000, 20000], help="numbers of images")
+    args = parser.parse_args()
+
+    print(f'{"images":>8}{"sequential s":>16}{"parallel s":>14}{"speedup":>10}')
+    for n_images in args.images:
+        images = _get_synthetic_images(n_images)
+        sequential_seconds = run_export(images, _persist_sequentially)
+        parallel_seconds = run_export(images, _persist_in_parallel)
+        print(f"{n_images:>8}{sequential_seconds:>16.2f}{parallel_seconds:>14.2f}"
+              f"{sequential_seconds / parallel_seconds:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,20 @@
 """This module contains various tests for the MTS trainer endpoint module."""
 import os
 import sys
+import tempfile
 import unittest
+from itertools import count
+from threading import Event
 import pytest
 import yaml
-from mock import patch
+from mock import MagicMock, patch
 from yolov5.trainer_endpoint import (
     generate_training_config_yaml,
     parse_bounding_boxes_encoding, persist_training_data, cleanup, upload_trained_model,
-    _compute_actual_image_ids_to_load, _exec_dml_query, _exec_dql_query, _config, _get_raw_persisted_labels,
-    _load_images_from_ids, _persist_image_and_label_files_batch, _preprocess_raw_label,
-    _retrieve_label_mappings_raw_to_final, _retrieve_images_and_labels,
+    IMAGES_FETCHED_PER_DATABASE_ROUND_TRIP, _compute_actual_image_ids_to_load, _exec_dml_query, _exec_dql_query,
+    _config, _get_raw_persisted_labels, _iter_images_from_ids, _iter_prefetched, _persist_image_and_label_files_batch,
+    _preprocess_raw_label, _retrieve_label_mappings_raw_to_final, _retrieve_images_and_labels,
+    _read_trained_class_names, _cache_image, _evict_image_cache, _iter_cached_images, _read_image_cache_index,
 )
 from yolov5.test_.test_models import ConnectionMock
 
@@ -40,6 +44,13 @@ class MTSCoreTestCase(unittest.TestCase):
         self.assertEqual(3, config_file["nc"])
         self.assertEqual("sight_a", config_file["names"][0])
 
+    def test_read_trained_class_names(self) -> None:
+        generate_training_config_yaml(["sight_a", "sight_b"])
+        self.assertEqual(["sight_a", "sight_b"], _read_trained_class_names())
+
+    def test_read_trained_class_names_no_config(self) -> None:
+        self.assertEqual([], _read_trained_class_names())
+
     @unittest.skip("only for testing endpoints")
     def test_download(self) -> None:
         os.environ["PGHOST"] = "abc"
@@ -86,14 +97,20 @@ class MTSHelperTestCase(unittest.TestCase):
             upload_trained_model()  # no city passed
 
     def test_compute_actual_image_ids_to_load(self) -> None:
-        with patch(f'{MODULE_PATH}._exec_dql_query', return_value=[(1,), (2,), (3,)]):
-            label_mappings = {'BrooklynBridge': 'BrooklynBridge'}
+        with patch(f'{MODULE_PATH}._exec_dql_query', return_value=[('BrooklynBridge', 3, [1, 2, 3])]) as query_mock:
+            label_mappings = {'BrooklynBridge': 'BrooklynBridge', 'Brooklyn_Bridge': 'BrooklynBridge',
+                              'EmpireState': 'EmpireStateBuilding'}
             ids, excluded = _compute_actual_image_ids_to_load('new_york', label_mappings, 3)
-            assert len(ids) == 3
-            assert len(excluded) == 0
+            assert sorted(ids) == [1, 2, 3]
+            assert excluded == ['EmpireState']  # not returned, i.e. too few images
+            assert query_mock.call_count == 1  # single round trip for all labels
+            assert query_mock.call_args[1]['filling_parameters'] == (
+                ['BROOKLYNBRIDGE', 'BROOKLYN_BRIDGE', 'EMPIRESTATE'],
+                ['BrooklynBridge', 'BrooklynBridge', 'EmpireStateBuilding'], 3)
+            assert 'integration_layer.fact_image_labels' in query_mock.call_args[0][0]  # indexed normalized labels
 
     def test_compute_actual_image_ids_to_load_too_few_labels(self) -> None:
-        with patch(f'{MODULE_PATH}._exec_dql_query', return_value=[(1,), (2,), (3,)]):
+        with patch(f'{MODULE_PATH}._exec_dql_query', return_value=[]):
             label_mappings = {'BrooklynBridge': 'BrooklynBridge'}
             ids, excluded = _compute_actual_image_ids_to_load('new_york', label_mappings, 30)
             assert len(ids) == 0
@@ -140,19 +157,56 @@ class MTSHelperTestCase(unittest.TestCase):
             assert 'Timessquare' in persisted_labels
             assert 'Centralpark' in persisted_labels
 
-    def test_load_images_from_ids(self) -> None:
-        with patch(f'{MODULE_PATH}._exec_dql_query', return_value=[(b'test image', 'd812h3kfda8')]):
-            mocked_result = _load_images_from_ids('new_york', [1])
-            assert mocked_result is not None
-            assert mocked_result[0] == (b'test image', 'd812h3kfda8')
+    def test_iter_images_from_ids(self) -> None:
+        connection = MagicMock()
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.__iter__.return_value = iter([(1, 'd812h3kfda8', b'test image'), (2, 'f3kfda8d812', b'other image')])
+        with patch(f'{MODULE_PATH}.connect', return_value=connection), patch(f'{MODULE_PATH}._config', return_value={}):
+            images = _iter_images_from_ids(range(1, 3))
+            assert not connection.cursor.called  # lazily streamed
+            assert list(images) == [(1, 'd812h3kfda8', b'test image'), (2, 'f3kfda8d812', b'other image')]
+            assert connection.cursor.call_args[1]['name'] is not None  # server-side cursor
+            assert cursor.itersize == IMAGES_FETCHED_PER_DATABASE_ROUND_TRIP
+            query, parameters = cursor.execute.call_args[0]
+            assert parameters == ([1, 2],)
+            assert 'integration_layer.dim_sights_images' in query  # blobs fetched by id
+            connection.close.assert_called_once()
+
+    def test_iter_images_from_ids_stopped_early(self) -> None:
+        connection = MagicMock()
+        connection.cursor.return_value.__enter__.return_value.__iter__.return_value = iter([(1, 'd812h3kfda8', b'a')] * 2)
+        with patch(f'{MODULE_PATH}.connect', return_value=connection), patch(f'{MODULE_PATH}._config', return_value={}):
+            images = _iter_images_from_ids([1, 2])
+            next(images)
+            images.close()
+            connection.close.assert_called_once()  # no connection is left idle in transaction
+
+    def test_iter_prefetched(self) -> None:
+        assert list(_iter_prefetched(iter(range(100)), max_prefetched_items=3)) == list(range(100))
+        assert list(_iter_prefetched([], max_prefetched_items=3)) == []
+
+    def test_iter_prefetched_stopped_consumer(self) -> None:
+        is_closed = Event()
+
+        def _items():
+            try:
+                yield from count()
+            finally:
+                is_closed.set()
+
+        with patch(f'{MODULE_PATH}.PREFETCH_PUT_TIMEOUT_SECONDS', 0.01):
+            prefetched_items = _iter_prefetched(_items(), max_prefetched_items=2)
+            assert next(prefetched_items) == 0
+            prefetched_items.close()  # e.g. the consumer raised
+            assert is_closed.wait(timeout=5)  # the blocked producer stopped and closed the items
 
     def test_persist_image_and_label_files_batch(self) -> None:
         with patch(f'{MODULE_PATH}._persist_single_image_and_label_file', return_value=True):
             example_nyc_boxes = '{"(0.12116,0.715,0.825,0.015,\\"Rockefellercenter\\")",' \
                                 '"(0.1,0.6,0.5,0.2,\\"Statueofliberty\\")"}'
             example_box_fail = '{"(0.12116,0.715,0.825,0.015,\\"Grandcanyon\\")"}'
-            images = [(b'img 1', example_nyc_boxes), (b'img2', example_nyc_boxes),
-                      (b'img 3', None), (b'img 4', example_box_fail)]
+            images = [('1-a.png', example_nyc_boxes), ('2-b.png', example_nyc_boxes),
+                      ('3-c.png', None), ('4-d.png', example_box_fail), (None, example_nyc_boxes)]
             label_mapping = {'Rockefellercenter': 'RockefellerCenter',
                              'Statueofliberty': 'StatueOfLiberty',
                              'GrandCanyon': 'GrandCanyon'}
@@ -165,6 +219,74 @@ class MTSHelperTestCase(unittest.TestCase):
             assert 'RockefellerCenter' in final_sight_list
             assert 'StatueOfLiberty' in final_sight_list
 
+    def test_persist_image_and_label_files_batch_written(self) -> None:
+        boxes = '{"(0.1,0.6,0.5,0.2,\\"Statueofliberty\\")"}'
+        with tempfile.TemporaryDirectory() as root_dir:
+            cached_image_path = os.path.join(root_dir, '1-d812h3kfda8.png')
+            with open(cached_image_path, 'wb') as cached_image:
+                cached_image.write(b'\x89PNG\r\n\x1a\n' + bytes(32))
+            images = [(cached_image_path, boxes)] * 40 + [(os.path.join(root_dir, 'missing.png'), boxes)]
+            os.makedirs(os.path.join(root_dir, 'training_data', 'images'))
+            os.makedirs(os.path.join(root_dir, 'training_data', 'labels'))
+            os.makedirs(os.path.join(root_dir, 'cwd'))
+            working_dir = os.getcwd()
+            os.chdir(os.path.join(root_dir, 'cwd'))
+            try:
+                with patch(f'{MODULE_PATH}.DATASET_WRITER_THREADS', 2):
+                    success_count = _persist_image_and_label_files_batch(
+                        images, {'Statueofliberty': 'StatueOfLiberty'}, [], set())
+            finally:
+                os.chdir(working_dir)
+
+            assert success_count == 40
+            assert sorted(os.listdir(os.path.join(root_dir, 'training_data', 'images'))) == \
+                   sorted(f'{index}.png' for index in range(1, 41))  # unique indices from a counter
+            assert len(os.listdir(os.path.join(root_dir, 'training_data', 'labels'))) == 40
+            assert os.stat(cached_image_path).st_nlink == 41  # hard-linked instead of copied
+
+    def test_cache_image(self) -> None:
+        with tempfile.TemporaryDirectory() as cache_dir, patch(f'{MODULE_PATH}.IMAGE_CACHE_DIR', cache_dir):
+            image_path = _cache_image(7, 'd812h3kfda8', b'\x89PNG\r\n\x1a\n' + bytes(32))
+            assert image_path == os.path.join(cache_dir, '7-d812h3kfda8.png')
+            assert _cache_image(8, 'f3kfda8d812', b'no image') is None
+            assert _read_image_cache_index() == {(7, 'd812h3kfda8'): image_path}
+
+    def test_read_image_cache_index_skips_temporary_files(self) -> None:
+        with tempfile.TemporaryDirectory() as cache_dir, patch(f'{MODULE_PATH}.IMAGE_CACHE_DIR', cache_dir):
+            for file_name in ('1-d812h3kfda8.jpeg.tmp', '2-f3kfda8d812.tmp', 'unknown.png'):
+                open(os.path.join(cache_dir, file_name), 'wb').close()
+            assert _read_image_cache_index() == {}
+
+    def test_cache_image_into_cache_dir(self) -> None:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            image_path = _cache_image(7, 'd812h3kfda8', b'\x89PNG\r\n\x1a\n' + bytes(32), cache_dir=cache_dir)
+            assert image_path == os.path.join(cache_dir, '7-d812h3kfda8.png')
+
+    def test_iter_cached_images(self) -> None:
+        png = b'\x89PNG\r\n\x1a\n' + bytes(32)
+        metadata = [(1, 'd812h3kfda8', 'labels 1'), (2, 'f3kfda8d812', 'labels 2'), (3, 'a8d812f3kfd', 'labels 3')]
+        with tempfile.TemporaryDirectory() as cache_dir, patch(f'{MODULE_PATH}.IMAGE_CACHE_DIR', cache_dir), \
+             patch(f'{MODULE_PATH}._get_image_metadata', return_value=metadata), \
+             patch(f'{MODULE_PATH}._iter_images_from_ids',
+                   return_value=iter([(2, 'f3kfda8d812', png), (3, 'a8d812f3kfd', png)])) as downloader:
+            first_image_path = _cache_image(1, 'd812h3kfda8', png)
+            _cache_image(2, 'outdatedhash', png)  # image file changed since the last training run
+
+            images = list(_iter_cached_images('new_york', [1, 2, 3]))
+            assert downloader.call_args[0][0] == [2, 3]  # only new or changed images are downloaded
+            assert images == [(first_image_path, 'labels 1'),
+                              (os.path.join(cache_dir, '2-f3kfda8d812.png'), 'labels 2'),
+                              (os.path.join(cache_dir, '3-a8d812f3kfd.png'), 'labels 3')]
+
+    def test_evict_image_cache(self) -> None:
+        with tempfile.TemporaryDirectory() as cache_dir, patch(f'{MODULE_PATH}.IMAGE_CACHE_DIR', cache_dir):
+            for image_id in range(1, 4):
+                image_path = _cache_image(image_id, 'd812h3kfda8', b'\x89PNG\r\n\x1a\n' + bytes(32))
+                os.utime(image_path, (image_id, 3 if image_id == 1 else image_id))  # image 1 recently used
+
+            _evict_image_cache(max_cache_bytes=2 * 40)
+            assert sorted(_read_image_cache_index()) == [(1, 'd812h3kfda8'), (3, 'd812h3kfda8')]
+
     def test_preprocess_raw_label(self) -> None:
         assert _preprocess_raw_label('HollywoodSignLos_Angeles') == 'HOLLYWOODSIGNLOSANGELES'
 
@@ -189,10 +311,12 @@ class MTSHelperTestCase(unittest.TestCase):
              patch(f'{MODULE_PATH}._persist_image_and_label_files_batch', return_value=10) as persistor, \
              patch(f'{MODULE_PATH}._get_all_loadable_image_ids', return_value=range(1, 3001)), \
              patch(f'{MODULE_PATH}._compute_actual_image_ids_to_load', return_value=(range(1, 1001), [])), \
-             patch(f'{MODULE_PATH}._load_images_from_ids'):
+             patch(f'{MODULE_PATH}._iter_cached_images', return_value=iter([])), \
+             patch(f'{MODULE_PATH}._evict_image_cache') as evictor:
 
             _retrieve_images_and_labels(target_city, 1)
-            assert persistor.call_count == 10
+            assert persistor.call_count == 1  # all images streamed through a single cursor
+            assert evictor.call_count == 1
 
 
 if __name__ == "__main__":
@@ -5,17 +5,27 @@ import imghdr
 import os
 import re
 import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from itertools import combinations
-from math import ceil
-from time import sleep
-from typing import Optional, Tuple, List, Dict, Set
+from itertools import combinations, count
+from queue import Full, Queue
+from threading import Event, Thread
+from typing import Optional, Tuple, List, Dict, Iterable, Iterator, Set
+import yaml
 from fuzzywuzzy import fuzz
 from psycopg2 import connect
 from psycopg2._psycopg import Binary
 
 
-MAX_IMAGES_DOWNLOADED_PER_SINGLE_DATABASE_REQUEST = 100
+IMAGES_FETCHED_PER_DATABASE_ROUND_TRIP = 16  # server-side cursor batch size, bounds the number of buffered images
+PREFETCH_PUT_TIMEOUT_SECONDS = 1  # how often a blocked prefetching thread checks whether its consumer stopped
+DATASET_WRITER_THREADS = int(os.getenv("DATASET_WRITER_THREADS", 8))
+# images persist across training runs in a content-addressed cache, training directories hard-link into it
+IMAGE_CACHE_DIR = os.getenv("MTS_IMAGE_CACHE_DIR", "../image_cache")
+IMAGE_CACHE_TEMP_EXTENSION = ".tmp"  # images are written to temporary files first, which are never cache entries
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("MTS_IMAGE_CACHE_MAX_BYTES", 20 * 1024 ** 3))
+TRAINING_CONFIG_YAML_PATH = "./sight_training_config.yaml"
 
 
 def cleanup():
@@ -52,15 +62,15 @@ def generate_training_config_yaml(sights: List[str]) -> None:
         List of sight classes used for training the model.
     """
     print('Generating final labels YAML file...')
-    yaml = open("./sight_training_config.yaml", "w")
-    yaml.write("# train and val data\n")
-    yaml.write("train: ../training_data/images\n")
-    yaml.write("val: ../training_data/images\n\n")
-    yaml.write("# number of classes\n")
-    yaml.write("nc: " + str(len(sights)) + "\n\n")
-    yaml.write("# class names\n")
-    yaml.write("names: [" + ",".join(sights) + "]")
-    yaml.close()
+    yaml_file = open(TRAINING_CONFIG_YAML_PATH, "w")
+    yaml_file.write("# train and val data\n")
+    yaml_file.write("train: ../training_data/images\n")
+    yaml_file.write("val: ../training_data/images\n\n")
+    yaml_file.write("# number of classes\n")
+    yaml_file.write("nc: " + str(len(sights)) + "\n\n")
+    yaml_file.write("# class names\n")
+    yaml_file.write("names: [" + ",".join(sights) + "]")
+    yaml_file.close()
 
 
 def parse_bounding_boxes_encoding(labels_string: str) -> List[Tuple[str, str]]:
@@ -137,17 +147,33 @@ def upload_trained_model() -> None:
         in_file.close()
         # generating query
         dml_query = (
-            "INSERT INTO load_layer.trained_models(city, trained_model, n_considered_images) "
-            "VALUES (%s, %s, %s)"
+            "INSERT INTO load_layer.trained_models(city, trained_model, n_considered_images, class_names) "
+            "VALUES (%s, %s, %s, %s)"
         )
         # get amount of downloaded images
         image_count = len(glob.glob("../training_data/images/*"))
         # execute query to upload weights
-        _exec_dml_query(dml_query, (city, Binary(data), image_count))
+        _exec_dml_query(dml_query, (city, Binary(data), image_count, _read_trained_class_names()))
     else:
         raise ValueError('No city passed!')
 
 
+def _read_trained_class_names() -> List[str]:
+    """Returns the class names the uploaded model has been trained on, in the order of its class indices.
+
+    Returns
+    -------
+    class_names: list[str]
+        Class names taken from the training config, empty if the config is not available.
+    """
+    try:
+        with open(TRAINING_CONFIG_YAML_PATH, "r") as config_file:
+            return [str(name) for name in yaml.safe_load(config_file).get("names", [])]
+    except (OSError, AttributeError, yaml.YAMLError) as exception:
+        print(f"Could not read the trained class names: {exception}")
+        return []
+
+
 def _compute_actual_image_ids_to_load(city_name: str, label_mappings: Dict[str, str],
                                       min_number_of_images_per_label: int) -> Tuple[List[int], List[str]]:
     """Returns the relevant image ids to load after too sparse classes have been sorted out.
@@ -169,33 +195,30 @@ def _compute_actual_image_ids_to_load(city_name: str, label_mappings: Dict[str,
         List of labels to exclude from loading due to sparsity.
     """
     print('Computing sparse labels to exclude and restricting the set of relevant image ids...')
-    image_ids, labels_excluded_from_training = [], []
-
-    for final_label in set(label_mappings.values()):
-        raw_labels = [raw_label for raw_label, _final_label in label_mappings.items()
-                      if _final_label == final_label]
-        upper_associated_raw_labels = [raw_label.upper() for raw_label, _final_label in label_mappings.items()
-                                       if _final_label == final_label]
-        query = f"""select image_id
-                    from data_mart_layer.images_{city_name} city_mart
-                    where image_labels is not null and exists (
-                      select *
-                      from unnest(city_mart.image_labels) as bounding_box
-                      where upper(regexp_replace(
-                         replace(replace(replace(bounding_box.box_label, ' ', ''), '\\', ''), '"', ''), 
-                            '[^\\x00-\\x7F]+', '')) 
-                        in {tuple(upper_associated_raw_labels)})""" \
-            .replace(',))', '))')  # remove , at end of tuples from SQL syntax
-        label_image_ids_cache = _exec_dql_query(query, return_result=True)
-        sleep(0.1)  # delay to increase robustness
-        if label_image_ids_cache is not None:
-            belonging_ids = list(sum(label_image_ids_cache, ()))
-            if len(belonging_ids) >= int(min_number_of_images_per_label):
-                image_ids += belonging_ids
-            else:
-                labels_excluded_from_training += raw_labels
-
-    return list(set(image_ids)), list(set(labels_excluded_from_training))
+    raw_labels = list(label_mappings)
+    # image count and ids per final label in a single round trip, sparse final labels are filtered out in the same pass
+    query = f"""select mapping.final_label, count(distinct labels.image_id), array_agg(distinct labels.image_id)
+                from unnest(%s::text[], %s::text[]) as mapping(normalized_label, final_label)
+                join integration_layer.fact_image_labels labels on labels.normalized_label = mapping.normalized_label
+                join data_mart_layer.images_{city_name} city_mart on city_mart.image_id = labels.image_id
+                group by mapping.final_label
+                having count(distinct labels.image_id) >= %s"""
+    label_statistics = _exec_dql_query(query, return_result=True, filling_parameters=(
+        [raw_label.upper() for raw_label in raw_labels], [label_mappings[raw_label] for raw_label in raw_labels],
+        int(min_number_of_images_per_label)
+    ))
+    if label_statistics is None:
+        return [], []
+
+    image_ids, included_final_labels = set(), set()
+    for final_label, n_images, label_image_ids in label_statistics:
+        print(f'{final_label}: {n_images} images')
+        image_ids.update(label_image_ids)
+        included_final_labels.add(final_label)
+
+    labels_excluded_from_training = [raw_label for raw_label in raw_labels
+                                     if label_mappings[raw_label] not in included_final_labels]
+    return list(image_ids), labels_excluded_from_training
 
 
 def _config():
@@ -249,7 +272,8 @@ def _exec_dml_query(dml_query: str, filling_parameters: Optional[Tuple]) -> None
                 cursor.close()
 
 
-def _exec_dql_query(postgres_sql_string: str, return_result=False) -> Optional[object]:
+def _exec_dql_query(postgres_sql_string: str, return_result=False,
+                    filling_parameters: Optional[Tuple] = None) -> Optional[object]:
     """Executes a given PostgreSQL query on the data warehouse and potentially returns the query result.
 
     Parameters
@@ -258,6 +282,8 @@ def _exec_dql_query(postgres_sql_string: str, return_result=False) -> Optional[o
         PostgreSQL query to evaluate in the external DHW.
     return_result: bool, default=False
         Whether to return the query result.
+    filling_parameters: tuple[object] or None, default=None
+        Query parameters to bind, None if the query is already filled.
 
     Returns
     -------
@@ -269,7 +295,10 @@ def _exec_dql_query(postgres_sql_string: str, return_result=False) -> Optional[o
         connection.autocommit = True
         with connection.cursor() as cursor:
             try:
-                cursor.execute(postgres_sql_string)
+                if filling_parameters is None:
+                    cursor.execute(postgres_sql_string)
+                else:
+                    cursor.execute(postgres_sql_string, filling_parameters)
                 connection.commit()
                 cursor_result = cursor.fetchall()
                 result = (
@@ -346,34 +375,234 @@ def _init_directories_for_training():
         print("Directories exist")
 
 
-def _load_images_from_ids(city_name: str, image_ids: List[int]) -> List[Tuple[bytes, str]]:
-    """Loads all images including labels for the given image ids and city.
+def _get_image_metadata(city_name: str, image_ids: List[int]) -> List[Tuple[int, str, str]]:
+    """Returns the content hash and current labels of the given images, without fetching the image files.
 
     Parameters
     ----------
     city_name: str
         The name of the city the request is performed for.
+    image_ids: list[int]
+        Ids of the images to train on.
+
+    Returns
+    -------
+    image_metadata: list[tuple[int, str, str]]
+        Image id, content hash and labels per image. Images whose id and content hash are cached need no download,
+        relabelled images only need their (small) labels.
+    """
+    query = f"select city_mart.image_id, images.image_content_hash, city_mart.image_labels " \
+            f"from data_mart_layer.images_{city_name} city_mart " \
+            "join integration_layer.dim_sights_images images on images.image_id = city_mart.image_id " \
+            "where city_mart.image_id = ANY(%s)"
+    return _exec_dql_query(query, True, filling_parameters=(list(image_ids),)) or []
+
+
+def _iter_images_from_ids(image_ids: List[int]) -> Iterator[Tuple[int, str, bytes]]:
+    """Streams the image files of the given image ids through a single server-side cursor.
+
+    Parameters
+    ----------
     image_ids: list[int]
         Ids of the images to download.
 
     Returns
     -------
-    images_to_download: list[tuple[bytes, str]]
-        List of tuples with the image and the corresponding labels.
+    images_to_download: iterator[tuple[int, str, bytes]]
+        Image id, content hash and image file, fetched IMAGES_FETCHED_PER_DATABASE_ROUND_TRIP rows at a time.
+    """
+    query = "select image_id, image_content_hash, image_file from integration_layer.dim_sights_images " \
+            "where image_id = ANY(%s)"
+
+    connection = connect(**_config())  # named cursors live inside a transaction, hence no autocommit
+    try:
+        with connection.cursor(name="training_images") as cursor:
+            cursor.itersize = IMAGES_FETCHED_PER_DATABASE_ROUND_TRIP
+            cursor.execute(query, (list(image_ids),))
+            for image_id, content_hash, image in cursor:
+                yield image_id, content_hash, image
+    except Exception as exc:
+        print("Error executing SQL: %s" % exc)
+    finally:
+        connection.close()  # also ends the transaction if the consumer stopped early, e.g. due to an error
+
+
+def _read_image_cache_index() -> Dict[Tuple[int, str], str]:
+    """Returns the paths of all cached images.
+
+    Returns
+    -------
+    cache_index: dict[tuple[int, str], str]
+        Cached image path per image id and content hash.
     """
-    query = f"select image_file, image_labels from data_mart_layer.images_{city_name} " \
-            f"where image_id in {tuple(image_ids)}"
-    return _exec_dql_query(query, True)
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    cache_index = {}
+    for file_name in os.listdir(IMAGE_CACHE_DIR):
+        if file_name.endswith(IMAGE_CACHE_TEMP_EXTENSION):  # unfinished, e.g. interrupted by a crash
+            continue
+        image_key, _ = os.path.splitext(file_name)
+        image_id, _, content_hash = image_key.partition("-")
+        if image_id.isdigit() and content_hash:
+            cache_index[(int(image_id), content_hash)] = os.path.join(IMAGE_CACHE_DIR, file_name)
+
+    return cache_index
+
+
+def _cache_image(image_id: int, content_hash: str, image: bytes, cache_dir: Optional[str] = None) -> Optional[str]:
+    """Stores a downloaded image in the cache and returns its path.
+
+    Parameters
+    ----------
+    image_id: int
+        Id of the image.
+    content_hash: str
+        Content hash of the image as computed by the DWH.
+    image: bytes
+        The image file in raw bytes format.
+    cache_dir: str or None, default=None
+        Directory of the cache, IMAGE_CACHE_DIR if None.
+
+    Returns
+    -------
+    image_path: str or None
+        Path of the cached image, None if the image format is unknown or the image could not be stored.
+    """
+    with BytesIO(image) as _file:
+        ext = imghdr.what(_file)
+    if ext is None:
+        print("Skipped image due to unknown or proprietary format.")
+        return None
+
+    image_path = os.path.join(cache_dir or IMAGE_CACHE_DIR, f"{image_id}-{content_hash}.{ext}")
+    try:
+        with open(image_path + IMAGE_CACHE_TEMP_EXTENSION, "wb") as image_file:
+            image_file.write(image)
+        os.replace(image_path + IMAGE_CACHE_TEMP_EXTENSION, image_path)  # never leaves partially written images behind
+    except IOError as exception:
+        print(exception)
+        return None
+
+    return image_path
+
 
+def _iter_cached_images(city_name: str, image_ids: List[int]) -> Iterator[Tuple[Optional[str], str]]:
+    """Yields the cached image paths and current labels of the given images, downloading only uncached images.
 
-def _persist_image_and_label_files_batch(images: List[Tuple[bytes, str]], label_mapping: Dict[str, str],
+    Parameters
+    ----------
+    city_name: str
+        The name of the city the request is performed for.
+    image_ids: list[int]
+        Ids of the images to train on.
+
+    Returns
+    -------
+    cached_images: iterator[tuple[str or None, str]]
+        Cached image path (None if the image could not be cached) and labels per image.
+
+    Notes
+    -----
+    Images are addressed by their id and content hash, hence images whose file changed since the last training run
+    are downloaded again while relabelled images are served from the cache with their current labels.
+    """
+    cache_index = _read_image_cache_index()
+    labels_by_image_id, image_ids_to_download = {}, []
+    for image_id, content_hash, labels in _get_image_metadata(city_name, image_ids):
+        labels_by_image_id[image_id] = labels
+        cached_image_path = cache_index.get((image_id, content_hash))
+        if cached_image_path is None:
+            image_ids_to_download.append(image_id)
+        else:
+            yield cached_image_path, labels
+
+    print(f'{len(labels_by_image_id) - len(image_ids_to_download)} images cached, '
+          f'downloading {len(image_ids_to_download)} images...')
+    if image_ids_to_download:
+        images = _iter_prefetched(_iter_images_from_ids(image_ids_to_download),
+                                  max_prefetched_items=2 * IMAGES_FETCHED_PER_DATABASE_ROUND_TRIP)
+        for image_id, content_hash, image in images:
+            yield _cache_image(image_id, content_hash, bytes(image)), labels_by_image_id[image_id]
+
+
+def _evict_image_cache(max_cache_bytes: int) -> None:
+    """Removes the least recently used cached images until the cache fits into its size budget.
+
+    Parameters
+    ----------
+    max_cache_bytes: int
+        Size budget of all cached images in bytes.
+    """
+    cached_images = []
+    for image_path in _read_image_cache_index().values():
+        file_stats = os.stat(image_path)
+        cached_images.append((file_stats.st_mtime, file_stats.st_size, image_path))
+
+    cache_bytes = sum(file_size for _, file_size, _ in cached_images)
+    for _, file_size, image_path in sorted(cached_images):
+        if cache_bytes <= max_cache_bytes:
+            break
+        os.remove(image_path)  # hard links of the current training data stay valid
+        cache_bytes -= file_size
+
+
+def _iter_prefetched(items: Iterable, max_prefetched_items: int) -> Iterator:
+    """Consumes the passed iterable in a background thread, so that fetching the next items overlaps their processing.
+
+    Parameters
+    ----------
+    items: iterable
+        Items to prefetch, e.g. streamed from the data warehouse.
+    max_prefetched_items: int
+        Maximum number of items buffered ahead of the consumer.
+
+    Returns
+    -------
+    prefetched_items: iterator
+        The passed items in their original order.
+
+    Notes
+    -----
+    If the consumer stops early (e.g. raises), the background thread stops prefetching within
+    PREFETCH_PUT_TIMEOUT_SECONDS and closes the passed iterator, which releases e.g. its database connection.
+    """
+    buffer, end_of_items, is_stopped = Queue(maxsize=max_prefetched_items), object(), Event()
+
+    def _put(item) -> bool:
+        while not is_stopped.is_set():
+            try:
+                buffer.put(item, timeout=PREFETCH_PUT_TIMEOUT_SECONDS)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _produce():
+        item_iterator = iter(items)
+        try:
+            for item in item_iterator:
+                if not _put(item):
+                    break
+        finally:
+            if hasattr(item_iterator, "close"):
+                item_iterator.close()  # generators are closed by the thread running them
+            _put(end_of_items)
+
+    Thread(target=_produce, daemon=True).start()
+    try:
+        for item in iter(buffer.get, end_of_items):
+            yield item
+    finally:
+        is_stopped.set()
+
+
+def _persist_image_and_label_files_batch(images: Iterable[Tuple[Optional[str], str]], label_mapping: Dict[str, str],
                                          excluded_raw_labels: List[str], final_sight_list: Set[str]) -> int:
     """Persists a given batch of actual image files and their associated labels.
 
     Parameters
     ----------
-    images: list[tuple[bytes, str]]
-        List containing the images and labels.
+    images: iterable[tuple[str or None, str]]
+        Cached image paths and labels, persisted one by one as they are iterated.
     label_mapping: dict[str, str]
         Label mapping table to eliminate poor labels.
     excluded_raw_labels: list[str]
@@ -385,53 +614,66 @@ def _persist_image_and_label_files_batch(images: List[Tuple[bytes, str]], label_
     -------
     success_count: int
         How many images were persisted successfully out of the given batch.
+
+    Notes
+    -----
+    File indices are allocated from a counter and the files are written by a bounded thread pool, at most twice as
+    many images as threads are pending at a time. The written files are flushed to disk once at the end.
     """
-    success_count = 0
-    for image, bounding_boxes_encoding in images:
-        if image is None or bounding_boxes_encoding is None:
-            continue
-        label_data, file_string = parse_bounding_boxes_encoding(bounding_boxes_encoding), ""
+    success_count, pending_writes = 0, deque()
+    file_indices = count(len(glob.glob("../training_data/images/*")) + 1)  # appends to previously persisted files
 
-        for label in label_data:
-            if label[1] in excluded_raw_labels:  # excluded labels should not be considered in the model
+    with ThreadPoolExecutor(max_workers=DATASET_WRITER_THREADS) as executor:
+        for image, bounding_boxes_encoding in images:
+            if image is None or bounding_boxes_encoding is None:
                 continue
+            label_data, file_string = parse_bounding_boxes_encoding(bounding_boxes_encoding), ""
+
+            for label in label_data:
+                if label[1] in excluded_raw_labels:  # excluded labels should not be considered in the model
+                    continue
+
+                sight_name = label_mapping[label[1]]
+                file_string += label[0].replace(label[1], sight_name)
+                final_sight_list.add(sight_name)
 
-            sight_name = label_mapping[label[1]]
-            file_string += label[0].replace(label[1], sight_name)
-            final_sight_list.add(sight_name)
+            # create image and label file
+            if len(pending_writes) >= 2 * DATASET_WRITER_THREADS:
+                success_count += 1 if pending_writes.popleft().result() else 0
+            pending_writes.append(executor.submit(_persist_single_image_and_label_file, image, file_string,
+                                                  next(file_indices)))
 
-        # create image and label file
-        success_count += 1 if _persist_single_image_and_label_file(image, file_string) else 0
+        success_count += sum(1 for pending_write in pending_writes if pending_write.result())
 
+    if hasattr(os, "sync"):
+        os.sync()  # single flush instead of one fsync per file
     return success_count
 
 
-def _persist_single_image_and_label_file(image: bytes, labels_file_content: str) -> bool:
+def _persist_single_image_and_label_file(image_path: str, labels_file_content: str, index: int) -> bool:
     """Creates image and label files and returns whether both creations were successful.
 
     Parameters
     ----------
-    image: bytes
-        The image file in raw bytes format.
+    image_path: str
+        Path of the cached image, hard-linked into the training data.
     labels_file_content: str
         The content to write to the label file.
+    index: int
+        Unique index of the image within the training data, used as file name.
 
     Returns
     -------
     is_successful: bool
         Whether both creations were successful.
     """
-    index = len(glob.glob("../training_data/images/*")) + 1
-    with BytesIO(image) as _file:
-        ext = imghdr.what(_file)
-    if ext is None:
-        print("Skipped image due to unknown or proprietary format.")
-        return False
-
+    training_image_path = "../training_data/images/" + str(index) + os.path.splitext(image_path)[1]
     try:
-        image_file = open("../training_data/images/" + str(index) + "." + ext, "wb")
-        image_file.write(image)
-        image_file.close()
+        os.utime(image_path)  # mark as recently used
+        try:
+            os.link(image_path, training_image_path)
+        except OSError:  # e.g. cache and training data on different file systems
+            shutil.copyfile(image_path, training_image_path)
     except IOError as exception:
         print(exception)
         return False
@@ -594,18 +836,12 @@ def _retrieve_images_and_labels(city: str, min_number_of_images_per_label: int)
                                                                                label_mappings,
                                                                                min_number_of_images_per_label)
 
-    # retrieve and save relevant images including their labels
-    n_download_iterations = int(ceil(len(image_ids_to_load)/MAX_IMAGES_DOWNLOADED_PER_SINGLE_DATABASE_REQUEST))
-    success_count, final_sights_set = 0, set()
-
-    for current_download in range(n_download_iterations):
-        print(f'Downloading and persisting images including labels... '
-              f'[iteration {current_download+1}/{n_download_iterations}]')
-        start_idx = current_download * MAX_IMAGES_DOWNLOADED_PER_SINGLE_DATABASE_REQUEST
-        end_idx = start_idx + MAX_IMAGES_DOWNLOADED_PER_SINGLE_DATABASE_REQUEST
-        images = _load_images_from_ids(city, image_ids_to_load[start_idx:end_idx])
-        success_count += _persist_image_and_label_files_batch(images, label_mappings,
-                                                              excluded_raw_labels, final_sights_set)
+    # link cached and stream new images including their labels, receiving the next images while writing the current ones
+    print(f'Retrieving and persisting {len(image_ids_to_load)} images including labels...')
+    final_sights_set = set()
+    images = _iter_cached_images(city, image_ids_to_load)
+    success_count = _persist_image_and_label_files_batch(images, label_mappings, excluded_raw_labels, final_sights_set)
+    _evict_image_cache(IMAGE_CACHE_MAX_BYTES)
 
     # map raw to final labels
     final_sights_list = list(
@@ -616,7 +852,7 @@ def _retrieve_images_and_labels(city: str, min_number_of_images_per_label: int)
     )
     _replace_labels_in_label_files_with_index(final_sights_list)
     print(f"\nImage/label retrieval result:\n{'-'*30}\n"
-          f"Downloaded {len(image_ids_to_load)} relevant images "
+          f"Retrieved {len(image_ids_to_load)} relevant images "
           f"of which {success_count} were successfully saved "
           f"({round(success_count/len(image_ids_to_load), ndigits=3)*100:.2f}%). "
           f"Final sights list:\n{final_sights_list} ({len(final_sights_list)} classes).")
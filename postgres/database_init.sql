@@ -29,6 +29,9 @@ create table if not exists load_layer.sight_images (
 	sight_image_width INT not null,  
 	sight_image_height INT not null,  
 	sight_image_data_source VARCHAR(300) not null,
+	-- optional hex encoded SHA-256 of the image file as received by the pushing client, before any re-encoding
+	sight_image_content_hash CHAR(64),
+	sight_image_perceptual_hash BIGINT,  -- optional 64 bit difference hash, computed by the orchestrator
 	primary key (id)
 );
 
@@ -44,6 +47,7 @@ create table if not exists load_layer.trained_models (
 	city VARCHAR(100) not null,
 	trained_model bytea not null,
 	n_considered_images int not null,
+	class_names VARCHAR(100)[] not null default '{}',
 	primary key (id)
 );
 
@@ -67,6 +71,10 @@ create table if not exists integration_layer.dim_sights_images(
 	image_file BYTEA not null,
 	image_source VARCHAR(300) not null,
 	image_labels bounding_box[],
+	-- hex encoded SHA-256 of the received image file (image_file if not pushed), identical images served by several
+	-- sources are persisted only once
+	image_content_hash CHAR(64) not null,
+	image_perceptual_hash BIGINT,
 	primary key (image_id)
 );
 
@@ -90,9 +98,52 @@ create table if not exists integration_layer.dim_models_trained_models (
 	n_considered_images int not null,
 	surrogate_key INT not null,
 	version INT not null,
+	-- precomputed while loading, so that metadata requests never have to read the model itself
+	model_size BIGINT not null,
+	model_sha256 CHAR(64) not null,
+	class_names VARCHAR(100)[] not null,
 	primary key (trained_model_id)
 );
 
+-- create request counters of not yet supported cities: incremented atomically by the orchestrator via upserts
+
+create table if not exists integration_layer.city_requests (
+	city_name VARCHAR(100) not null,
+	n_requests INT not null,
+	first_requested_at timestamptz not null default now(),
+	last_requested_at timestamptz not null default now(),
+	primary key (city_name)
+);
+
+-- create crawler jobs: dispatched by any orchestrator worker, at most one queued, running or succeeded job per city
+
+create table if not exists integration_layer.crawler_jobs (
+	job_id CHAR(32) not null,
+	city_name VARCHAR(100) not null,
+	status VARCHAR(10) not null default 'queued',
+	n_attempts INT not null default 0,
+	last_error TEXT,
+	created_at timestamptz not null default now(),
+	updated_at timestamptz not null default now(),
+	primary key (job_id)
+);
+
+create unique index if not exists crawler_jobs_city_name_idx on integration_layer.crawler_jobs (city_name)
+	where status <> 'failed';
+
+-- create change logs of the data marts: written by triggers, consumed by the incremental data mart refresh
+
+create table if not exists integration_layer.dirty_sight_images (
+	city_id INT not null,
+	image_id INT not null,
+	primary key (city_id, image_id)
+);
+
+create table if not exists integration_layer.dirty_trained_models (
+	city_id INT not null,
+	primary key (city_id)
+);
+
 -- create fact tables for integration layer
 
 create table if not exists integration_layer.fact_sights(
@@ -103,6 +154,16 @@ create table if not exists integration_layer.fact_sights(
 	primary key (city_id, timestamp_id, image_id, resolution_id)
 );
 
+-- normalized bounding boxes of the labelled images: one row per box, populated by the label load job
+create table if not exists integration_layer.fact_image_labels(
+	image_id INT not null,
+	label_index INT not null,  -- position of the box in dim_sights_images.image_labels
+	normalized_label VARCHAR(100) not null,
+	raw_label VARCHAR(100) not null,
+	box bounding_box not null,
+	primary key (image_id, label_index)
+);
+
 create table if not exists integration_layer.fact_models(
 	city_id INT not null,
 	timestamp_id INT not null,
@@ -116,7 +177,10 @@ CREATE MATERIALIZED VIEW if not exists data_mart_layer.current_trained_models as
 	select models.trained_model_id as trained_model_id,
 		   cities.city_name as city_name, 
 		   models.trained_model_model as trained_model,
-		   models.version as version
+		   models.version as version,
+		   models.model_size as model_size,
+		   models.model_sha256 as model_sha256,
+		   models.class_names as class_names
 	from integration_layer.fact_models as fact_models,   
 		(select inner_facts.city_id as city_id, max(timestamp_id) as timestamp_id, max(trained_model_id) as trained_model_id
 		from integration_layer.fact_models as inner_facts
@@ -132,6 +196,13 @@ CREATE MATERIALIZED VIEW if not exists data_mart_layer.current_trained_models as
 
 drop index if exists current_trained_model_idx;
 CREATE UNIQUE INDEX current_trained_model_idx ON data_mart_layer.current_trained_models(trained_model_id);
+drop index if exists current_trained_model_city_idx;
+CREATE INDEX current_trained_model_city_idx ON data_mart_layer.current_trained_models(city_name);
+
+-- models are already compressed archives: store them uncompressed out of line so that
+-- chunked downloads via substring() only read the requested slice instead of decompressing the whole model
+alter table integration_layer.dim_models_trained_models alter column trained_model_model set storage external;
+alter materialized view data_mart_layer.current_trained_models alter column trained_model set storage external;
 
 -- integration layer: add foreign key constraints between fact and dimension tables
 ----------------------------------------------------------------------------------------------------------------
@@ -160,6 +231,13 @@ begin
 		references integration_layer.dim_sights_images (image_id);
 	end if;
 
+	if not exists (SELECT 1 FROM pg_constraint WHERE conname = 'image_labels_image_id_fk') THEN
+		alter table integration_layer.fact_image_labels
+		add constraint image_labels_image_id_fk
+		foreign key (image_id) 
+		references integration_layer.dim_sights_images (image_id);
+	end if;
+
 	if not exists (SELECT 1 FROM pg_constraint WHERE conname = 'sights_resolution_id_fk') THEN
 		alter table integration_layer.fact_sights 
 		add constraint sights_resolution_id_fk 
@@ -191,7 +269,128 @@ begin
 end;
 $$;
 ----------------------------------------------------------------------------------------------------------------
--- create automated load job for image pushes
+-- create the images data mart of a city - if not there yet: a table filled incrementally by refresh_dirty_data_marts()
+-- the mart is thin, i.e. image files are fetched by id from integration_layer.dim_sights_images at download time only
+CREATE OR REPLACE FUNCTION create_city_images_data_mart(city_key INTEGER, formatted_city VARCHAR(100))
+  RETURNS void as $$
+begin
+	EXECUTE format('CREATE TABLE IF NOT EXISTS data_mart_layer.images_%s (
+		image_id INT not null,
+		image_labels bounding_box[],
+		resolution_height INT not null,
+		resolution_width INT not null,
+		timestamp_unix BIGINT not null,
+		primary key (image_id))', LOWER(formatted_city));
+	-- covers the labelled image id lookups of the model training service via index-only scans
+	EXECUTE format('CREATE INDEX IF NOT EXISTS mart_labelled_index_%s ON data_mart_layer.images_%s(image_id)
+		WHERE image_labels IS NOT NULL', LOWER(formatted_city), LOWER(formatted_city));
+END;
+$$ 
+LANGUAGE 'plpgsql';
+
+-- log every new fact as dirty image of its city, regardless of the load job that created it
+CREATE OR REPLACE FUNCTION log_new_sight_facts()
+  RETURNS trigger as $$
+begin
+	insert into integration_layer.dirty_sight_images(city_id, image_id)
+		select distinct new_facts.city_id, new_facts.image_id from new_facts
+		on conflict do nothing;
+
+    RETURN NULL;
+END;
+$$ 
+LANGUAGE 'plpgsql';
+
+drop trigger if exists log_new_sight_facts_trigger on integration_layer.fact_sights;
+
+create trigger log_new_sight_facts_trigger
+after insert on integration_layer.fact_sights
+referencing new table as new_facts
+for each statement
+EXECUTE PROCEDURE log_new_sight_facts();
+
+-- log updated labels as dirty images of all cities showing the image
+CREATE OR REPLACE FUNCTION log_updated_sight_image()
+  RETURNS trigger as $$
+begin
+	insert into integration_layer.dirty_sight_images(city_id, image_id)
+		select distinct facts.city_id, new.image_id from integration_layer.fact_sights as facts
+		where facts.image_id = new.image_id
+		on conflict do nothing;
+
+    RETURN NULL;
+END;
+$$ 
+LANGUAGE 'plpgsql';
+
+drop trigger if exists log_updated_sight_image_trigger on integration_layer.dim_sights_images;
+
+create trigger log_updated_sight_image_trigger
+after update of image_labels on integration_layer.dim_sights_images
+for each row
+when (old.image_labels is distinct from new.image_labels)
+EXECUTE PROCEDURE log_updated_sight_image();
+
+-- incremental data mart refresh -> triggered by cron job: only the logged images of dirty cities are rewritten,
+-- hence the refresh cost scales with the number of changes instead of the size of the data warehouse
+CREATE OR REPLACE FUNCTION refresh_dirty_data_marts()
+RETURNS INT AS $$
+	declare dirty_city_keys INT[];
+	declare dirty_image_keys INT[];
+	declare dirty_city RECORD;
+	declare n_city_images INT;
+	declare n_refreshed_images INT := 0;
+
+begin
+	-- claim the logged changes, changes logged meanwhile are left for the next refresh
+	with claimed_images as (
+		delete from integration_layer.dirty_sight_images returning city_id, image_id
+	)
+	select array_agg(claimed_images.city_id), array_agg(claimed_images.image_id)
+	into dirty_city_keys, dirty_image_keys
+	from claimed_images;
+
+	for dirty_city in
+		select cities.city_id, cities.city_name, array_agg(dirty.image_id) as image_ids
+		from unnest(dirty_city_keys, dirty_image_keys) as dirty(city_id, image_id)
+		join integration_layer.dim_sights_cities as cities on cities.city_id = dirty.city_id
+		group by cities.city_id, cities.city_name
+	loop
+		perform create_city_images_data_mart(dirty_city.city_id, dirty_city.city_name);
+
+		EXECUTE format('INSERT INTO data_mart_layer.images_%s(image_id, image_labels, resolution_height, resolution_width, timestamp_unix)
+			select distinct on (images.image_id) images.image_id, images.image_labels,
+				resolutions.resolution_height, resolutions.resolution_width, timestamps.timestamp_unix
+			from integration_layer.fact_sights as facts
+			join integration_layer.dim_sights_images as images on images.image_id = facts.image_id
+			join integration_layer.dim_sights_resolutions as resolutions on resolutions.resolution_id = facts.resolution_id
+			join integration_layer.dim_sights_timestamps as timestamps on timestamps.timestamp_id = facts.timestamp_id
+			where facts.city_id = $1 and facts.image_id = any($2)
+			order by images.image_id, timestamps.timestamp_unix
+			on conflict (image_id) do update set image_labels = excluded.image_labels,
+				resolution_height = excluded.resolution_height, resolution_width = excluded.resolution_width,
+				timestamp_unix = excluded.timestamp_unix',
+			LOWER(dirty_city.city_name)) using dirty_city.city_id, dirty_city.image_ids;
+		get diagnostics n_city_images = row_count;
+		n_refreshed_images := n_refreshed_images + n_city_images;
+
+		-- images without facts of the city anymore
+		EXECUTE format('DELETE FROM data_mart_layer.images_%s as mart where mart.image_id = any($2) and not exists (
+			select 1 from integration_layer.fact_sights as facts where facts.city_id = $1 and facts.image_id = mart.image_id)',
+			LOWER(dirty_city.city_name)) using dirty_city.city_id, dirty_city.image_ids;
+	end loop;
+
+	-- the trained models data mart is tiny apart from the models, hence only refreshed as a whole once a model arrived
+	if exists (select 1 from integration_layer.dirty_trained_models) then
+		delete from integration_layer.dirty_trained_models;
+		REFRESH MATERIALIZED VIEW CONCURRENTLY data_mart_layer.current_trained_models;
+	end if;
+
+	RETURN n_refreshed_images;
+END;
+$$ LANGUAGE plpgsql;
+
+-- create automated load job for image pushes (row by row, superseded by the set-based load job below)
 CREATE OR REPLACE FUNCTION load_images_into_dwh()
   RETURNS trigger as $$
   	declare formatted_city VARCHAR(100) := NULL;
@@ -200,12 +399,13 @@ CREATE OR REPLACE FUNCTION load_images_into_dwh()
 	declare temp_fact_key INTEGER := NULL; 
 	declare temp_resolution_key INTEGER := NULL;   
 	declare temp_timestamp_key INTEGER := NULL;   
-	declare temp_city_images_data_mart_query VARCHAR(1000) := NULL;   
 	declare current_time_stamp BIGINT := (SELECT extract(epoch from now() at time zone 'utc'));
+	declare content_hash CHAR(64) := coalesce(new.sight_image_content_hash, encode(sha256(new.sight_image), 'hex'));
 
 begin	
 	-- get sights images dimension table key
-	temp_image_key := (select image_id from integration_layer.dim_sights_images where image_source = new.sight_image_data_source limit 1);
+	temp_image_key := (select image_id from integration_layer.dim_sights_images
+						where image_source = new.sight_image_data_source or image_content_hash = content_hash limit 1);
 	
 	-- avoid persisting the same image several times
 	if temp_image_key is not null then
@@ -216,7 +416,8 @@ begin
 	end if;
 	
 	-- insert image into according dimension table
-	INSERT INTO integration_layer.dim_sights_images(image_file, image_source) values (new.sight_image, new.sight_image_data_source);
+	INSERT INTO integration_layer.dim_sights_images(image_file, image_source, image_content_hash, image_perceptual_hash)
+		values (new.sight_image, new.sight_image_data_source, content_hash, new.sight_image_perceptual_hash);
 		temp_image_key := (select image_id from integration_layer.dim_sights_images where image_source = new.sight_image_data_source limit 1);
 
 	-- remove special characters from city name before insertion
@@ -260,40 +461,89 @@ begin
 	delete from load_layer.sight_images where id = new.id;
 
 	-- initialize data mart for city - if not there yet
-	temp_city_images_data_mart_query := format('select
-		image_data.image_id as image_id,
-		image_data.image_file as image_file,
-		image_data.image_labels as image_labels, 
-		image_data.resolution_height as resolution_height,
-		image_data.resolution_height as resolution_width
-		from (
-			select distinct(images.image_source) as url, 
-				images.image_id as image_id, 
-				images.image_file as image_file, 
-				images.image_labels as image_labels, 
-				resolutions.resolution_height as resolution_height, 
-				resolutions.resolution_width as resolution_width
-			from integration_layer.dim_sights_images as images, 
-				integration_layer.fact_sights AS facts, 
-				integration_layer.dim_sights_resolutions AS resolutions
-			WHERE facts.city_id = %s and resolutions.resolution_id = facts.resolution_id and 
-				images.image_id = facts.image_id) as image_data', temp_city_key);
-	
-	EXECUTE format('CREATE MATERIALIZED VIEW IF NOT EXISTS data_mart_layer.%s AS %s', 'images_' || LOWER(formatted_city), temp_city_images_data_mart_query);
-	EXECUTE format('CREATE UNIQUE INDEX IF NOT EXISTS mart_index_%s ON data_mart_layer.images_%s(image_id)', LOWER(formatted_city), LOWER(formatted_city));
+	perform create_city_images_data_mart(temp_city_key, formatted_city);
 
     RETURN NEW;
 END;
 $$ 
 LANGUAGE 'plpgsql';
 
--- create new image load trigger
+-- create set-based load job for image pushes: loads all images inserted by a single statement at once
+-- (dimensions are upserted once per batch instead of being looked up once per image)
+CREATE OR REPLACE FUNCTION load_image_batch_into_dwh()
+  RETURNS trigger as $$
+	declare current_time_stamp BIGINT := (SELECT extract(epoch from now() at time zone 'utc'));
+	declare new_city RECORD;
+
+begin
+	-- upsert dimensions once per batch, special characters are removed from city names before insertion
+	INSERT INTO integration_layer.dim_sights_cities(city_name)
+		select distinct UPPER(regexp_replace(batch.sight_city,'[^-0-9A-Za-zÖÜÄßöüä_ ]','')) from new_images as batch
+		on conflict (city_name) do nothing;
+
+	insert into integration_layer.dim_sights_timestamps(timestamp_unix) values (current_time_stamp)
+		on conflict (timestamp_unix) do nothing;
+
+	INSERT INTO integration_layer.dim_sights_resolutions(resolution_height, resolution_width)
+		select distinct batch.sight_image_height, batch.sight_image_width from new_images as batch
+		on conflict (resolution_height, resolution_width) do nothing;
+
+	-- insert images and facts in one pass, avoiding to persist the same image several times:
+	-- the first push of a data source or content wins, facts are only created for images not persisted yet
+	with unique_batch as (
+		select distinct on (batch.sight_image_data_source) batch.*,
+			coalesce(batch.sight_image_content_hash, encode(sha256(batch.sight_image), 'hex')) as content_hash
+		from new_images as batch
+		order by batch.sight_image_data_source, batch.id
+	), inserted_images as (
+		INSERT INTO integration_layer.dim_sights_images(image_file, image_source, image_content_hash, image_perceptual_hash)
+			select unique_batch.sight_image, unique_batch.sight_image_data_source, unique_batch.content_hash,
+				unique_batch.sight_image_perceptual_hash
+			from unique_batch
+			order by unique_batch.id
+			on conflict do nothing  -- both unique indexes: image source and content hash
+			returning image_id, image_source
+	)
+	insert into integration_layer.fact_sights(city_id, timestamp_id, image_id, resolution_id)
+		select cities.city_id, timestamps.timestamp_id, inserted_images.image_id, resolutions.resolution_id
+		from inserted_images
+		join unique_batch on unique_batch.sight_image_data_source = inserted_images.image_source
+		join integration_layer.dim_sights_cities as cities
+			on cities.city_name = UPPER(regexp_replace(unique_batch.sight_city,'[^-0-9A-Za-zÖÜÄßöüä_ ]',''))
+		join integration_layer.dim_sights_resolutions as resolutions
+			on resolutions.resolution_height = unique_batch.sight_image_height and
+			   resolutions.resolution_width = unique_batch.sight_image_width
+		join integration_layer.dim_sights_timestamps as timestamps
+			on timestamps.timestamp_unix = current_time_stamp
+		on conflict do nothing;
+
+	-- remove loaded entries from load layer
+	delete from load_layer.sight_images where id in (select batch.id from new_images as batch);
+
+	-- initialize data marts for cities - if not there yet
+	for new_city in
+		select distinct cities.city_id, cities.city_name
+		from new_images as batch
+		join integration_layer.dim_sights_cities as cities
+			on cities.city_name = UPPER(regexp_replace(batch.sight_city,'[^-0-9A-Za-zÖÜÄßöüä_ ]',''))
+	loop
+		perform create_city_images_data_mart(new_city.city_id, new_city.city_name);
+	end loop;
+
+    RETURN NULL;
+END;
+$$ 
+LANGUAGE 'plpgsql';
+
+-- create new image load trigger: fires once per insert statement, the inserted rows are passed as transition table
 drop trigger if exists load_images_into_dwh_trigger on load_layer.sight_images;
+drop trigger if exists load_image_batch_into_dwh_trigger on load_layer.sight_images;
 
-create trigger load_images_into_dwh_trigger
+create trigger load_image_batch_into_dwh_trigger
 after insert on load_layer.sight_images
-for each row
-EXECUTE PROCEDURE load_images_into_dwh();
+referencing new table as new_images
+for each statement
+EXECUTE PROCEDURE load_image_batch_into_dwh();
 ----------------------------------------------------------------------------------------------------------------
 -- create sequence for trained models surrogate keys: model comparison would be way too slow!
 create sequence if not exists trained_model_surrogate_key_sequuence;
@@ -326,8 +576,10 @@ begin
 
 	-- get trained models dimension table key
 	current_version := (select count(*) from integration_layer.fact_models where city_id = temp_city_key);
-	INSERT INTO integration_layer.dim_models_trained_models(trained_model_model, surrogate_key, n_considered_images, version) 
-		values (new.trained_model, temp_trained_model_surrogate_key, NEW.n_considered_images, current_version + 1);
+	INSERT INTO integration_layer.dim_models_trained_models(trained_model_model, surrogate_key, n_considered_images, version,
+															 model_size, model_sha256, class_names)
+		values (new.trained_model, temp_trained_model_surrogate_key, NEW.n_considered_images, current_version + 1,
+				octet_length(new.trained_model), encode(sha256(new.trained_model), 'hex'), new.class_names);
 	temp_trained_model_key := (select trained_model_id from integration_layer.dim_models_trained_models 
 								where surrogate_key = temp_trained_model_surrogate_key limit 1);
 
@@ -335,6 +587,9 @@ begin
 	insert into integration_layer.fact_models(city_id, timestamp_id, trained_model_id) 
 	values (temp_city_key, temp_timestamp_key, temp_trained_model_key);
 
+	-- mark trained models data mart as outdated
+	insert into integration_layer.dirty_trained_models(city_id) values (temp_city_key) on conflict do nothing;
+
 	-- remove loaded entry from load layer
 	delete from load_layer.trained_models where id = new.id;
 
@@ -351,6 +606,13 @@ after insert on load_layer.trained_models
 for each row
 EXECUTE PROCEDURE load_models_into_dwh();
 ----------------------------------------------------------------------------------------------------------------
+-- normalize a raw label the way the model training service compares labels: without blanks, backslashes, quotes
+-- and non-ASCII characters, upper case
+CREATE OR REPLACE FUNCTION normalize_sight_label(raw_label VARCHAR)
+RETURNS VARCHAR AS $$
+	select upper(regexp_replace(replace(replace(replace(raw_label, ' ', ''), '\', ''), '"', ''), '[^\x00-\x7F]+', ''));
+$$ LANGUAGE sql IMMUTABLE;
+
 -- create load job for image sight labels pushes
 CREATE OR REPLACE FUNCTION load_sight_labels_into_dwh()
   RETURNS trigger as $$
@@ -362,6 +624,14 @@ begin
 	if temp_image_key is not null then
 		-- update persisted labels for respective image in integration layer
 		update integration_layer.dim_sights_images set image_labels = new.sight_labels where image_id = temp_image_key;
+
+		-- replace the normalized labels of the image
+		delete from integration_layer.fact_image_labels where image_id = temp_image_key;
+		insert into integration_layer.fact_image_labels(image_id, label_index, normalized_label, raw_label, box)
+			select temp_image_key, boxes.label_index, normalize_sight_label(boxes.box_label), boxes.box_label,
+				(boxes.ul_x, boxes.ul_y, boxes.lr_x, boxes.lr_y, boxes.box_label)::bounding_box
+			from unnest(new.sight_labels) with ordinality as boxes(ul_x, ul_y, lr_x, lr_y, box_label, label_index)
+			where boxes.box_label is not null;
 	end if;	
 
 	-- remove loaded entry from load layer
@@ -380,16 +650,50 @@ after insert on load_layer.sight_image_labels
 for each row
 EXECUTE PROCEDURE load_sight_labels_into_dwh();
 ----------------------------------------------------------------------------------------------------------------
--- speed up load jobs even more
+-- speed up load jobs even more, the unique indexes serve as conflict targets of the set-based load job
 drop index if exists idx_image_source;
+drop index if exists idx_image_content_hash;
+drop index if exists idx_image_perceptual_hash_band_0;
+drop index if exists idx_image_perceptual_hash_band_1;
+drop index if exists idx_image_perceptual_hash_band_2;
+drop index if exists idx_image_perceptual_hash_band_3;
 drop index if exists idx_surrogate_key;
+drop index if exists idx_normalized_label;
 drop index if exists idx_version;
-
-create index idx_image_source on integration_layer.dim_sights_images (image_source);
+drop index if exists idx_city_name;
+drop index if exists idx_timestamp_unix;
+drop index if exists idx_resolution;
+
+create unique index idx_image_source on integration_layer.dim_sights_images (image_source);
+create unique index idx_image_content_hash on integration_layer.dim_sights_images (image_content_hash);
+-- near-duplicate candidates: hashes within a Hamming distance of 3 share at least one of their four 16 bit bands
+create index idx_image_perceptual_hash_band_0 on integration_layer.dim_sights_images ((image_perceptual_hash & 65535));
+create index idx_image_perceptual_hash_band_1 on integration_layer.dim_sights_images (((image_perceptual_hash >> 16) & 65535));
+create index idx_image_perceptual_hash_band_2 on integration_layer.dim_sights_images (((image_perceptual_hash >> 32) & 65535));
+create index idx_image_perceptual_hash_band_3 on integration_layer.dim_sights_images (((image_perceptual_hash >> 48) & 65535));
+create unique index idx_city_name on integration_layer.dim_sights_cities (city_name);
+create unique index idx_timestamp_unix on integration_layer.dim_sights_timestamps (timestamp_unix);
+create unique index idx_resolution on integration_layer.dim_sights_resolutions (resolution_height, resolution_width);
 create index idx_surrogate_key on integration_layer.dim_models_trained_models (surrogate_key);
+-- per label image id lookups and label frequency counts of the model training service, both index-only
+create index idx_normalized_label on integration_layer.fact_image_labels (normalized_label, image_id);
 create index idx_version on integration_layer.dim_models_trained_models (version);
 ----------------------------------------------------------------------------------------------------------------
--- refresh all materialized views at once -> triggered by cron job
+-- near-duplicate lookup of re-encoded copies: whether a persisted image is within the passed Hamming distance
+-- of the passed difference hash, exact for distances up to 3 (the band indexes only yield candidates)
+CREATE OR REPLACE FUNCTION has_near_duplicate_image(perceptual_hash BIGINT, max_distance INT DEFAULT 3)
+RETURNS BOOLEAN AS $$
+	select exists(
+		select 1 from integration_layer.dim_sights_images as images
+		where ((images.image_perceptual_hash & 65535) = (perceptual_hash & 65535) or
+			   ((images.image_perceptual_hash >> 16) & 65535) = ((perceptual_hash >> 16) & 65535) or
+			   ((images.image_perceptual_hash >> 32) & 65535) = ((perceptual_hash >> 32) & 65535) or
+			   ((images.image_perceptual_hash >> 48) & 65535) = ((perceptual_hash >> 48) & 65535)) and
+			length(replace((images.image_perceptual_hash # perceptual_hash)::bit(64)::text, '0', '')) <= max_distance
+	);
+$$ LANGUAGE sql STABLE;
+----------------------------------------------------------------------------------------------------------------
+-- refresh all materialized views at once (full recomputation, the cron job uses refresh_dirty_data_marts() instead)
 -- source: https://github.com/sorokine/RefreshAllMaterializedViews/blob/master/RefreshAllMaterializedViews.sql (12:43 AM, 14 November 2020)
 CREATE OR REPLACE FUNCTION RefreshAllMaterializedViews(schema_arg TEXT DEFAULT 'data_mart_layer')
 RETURNS INT AS $$